@@ -0,0 +1,101 @@
+"""
+Chunked, resumable backfill from the Open-Meteo archive.
+
+scripts/fetch_and_save.py splits the date range with `date_chunks`, fetches
+the `pending_chunks` concurrently with `fetch_chunk` (each finished chunk is
+checkpointed to a CSV in the chunk directory, so a rerun only fetches what
+is still missing) and writes the table with `save_chunks`, one chunk in
+memory at a time and with no hour written twice.
+"""
+import os
+import time
+import logging
+import pandas as pd
+import requests
+from pathlib import Path
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from app.weather import HOURLY_VARS, hourly_rows
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+MAX_RETRIES = 3
+BACKOFF     = 3   # seconds
+
+Chunk = Tuple[date, date]
+
+logger = logging.getLogger(__name__)
+
+
+def date_chunks(first: date, last: date, days: int) -> List[Chunk]:
+    """[first, last] as consecutive (start, end) ranges of at most `days` days."""
+    chunks = []
+    while first <= last:
+        chunk_end = min(first + timedelta(days=days - 1), last)
+        chunks.append((first, chunk_end))
+        first = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def chunk_path(chunk_dir: Path, chunk: Chunk) -> Path:
+    return chunk_dir / f"{chunk[0]}_{chunk[1]}.csv"
+
+
+def pending_chunks(chunks: List[Chunk], chunk_dir: Path) -> List[Chunk]:
+    """The chunks with no checkpoint yet."""
+    return [c for c in chunks if not chunk_path(chunk_dir, c).exists()]
+
+
+def fetch_chunk(session: requests.Session, chunk: Chunk, latitude: float, longitude: float,
+                chunk_dir: Path, url: str = ARCHIVE_URL, backoff: float = BACKOFF) -> int:
+    """Fetch one date range and checkpoint it; returns the row count."""
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": str(chunk[0]),
+        "end_date":   str(chunk[1]),
+        "hourly": HOURLY_VARS,
+        "timezone": "auto",
+    }
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            response = session.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            break
+        except Exception as exc:
+            logger.warning("Chunk %s..%s attempt %d/%d failed: %s",
+                           chunk[0], chunk[1], attempt, MAX_RETRIES, exc)
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(backoff ** attempt)
+
+    df = pd.DataFrame(hourly_rows(response.json()["hourly"]))
+    # write-then-rename: a crash never leaves a half chunk that looks done
+    path = chunk_path(chunk_dir, chunk)
+    tmp = path.with_suffix(".tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return len(df)
+
+
+def save_chunks(store, table: str, chunks: List[Chunk], chunk_dir: Path) -> int:
+    """
+    Write the checkpointed `chunks`, in order, as `table` of `store`; returns
+    the row count. Rows at or before the last hour already written (an hour
+    repeated across a chunk boundary, e.g. around a DST change) are dropped.
+    """
+    total, last = 0, None
+    for chunk in chunks:
+        df = pd.read_csv(chunk_path(chunk_dir, chunk), parse_dates=["timestamp"])
+        df = df.drop_duplicates("timestamp", keep="last").sort_values("timestamp")
+        if last is not None:
+            df = df[df["timestamp"] > last]
+        if df.empty:
+            continue
+        if last is None:
+            store.write(table, df)
+        else:
+            store.append(table, df)
+        last = df["timestamp"].iloc[-1]
+        total += len(df)
+    return total
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+# ----- TTLCache -------
+class TTLCache:
+    """
+    Small thread-safe LRU mapping whose entries also expire `ttl` seconds
+    after they were stored.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 3600.0,
+                 timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._timer  = timer
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock   = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires <= self._timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# ----- SqliteCache -------
+class SqliteCache:
+    """
+    TTLCache's get/set over one SQLite file, so several worker processes on a
+    host share entries. Keys are strings, values anything JSON-serialisable.
+    Expiry uses wall-clock time (each process has its own monotonic clock);
+    beyond `maxsize` the entries closest to expiring are pruned every
+    `prune_every` writes. Database errors (e.g. a lock held past `timeout`,
+    or a file that cannot be created) count as a miss or a skipped write,
+    never as a failed request; the file and table are only created on first
+    use, so building the cache cannot fail.
+    """
+
+    def __init__(self, path: Path, maxsize: int = 100_000, ttl: float = 3600.0,
+                 timeout: float = 0.05, prune_every: int = 1000,
+                 timer: Callable[[], float] = time.time):
+        self.path        = Path(path)
+        self.maxsize     = maxsize
+        self.ttl         = ttl
+        self.timeout     = timeout
+        self.prune_every = prune_every
+        self._timer      = timer
+        self._local      = threading.local()
+        self._writes     = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread, and a fresh one in a forked worker
+        conn, pid = getattr(self._local, "conn", (None, None))
+        if conn is None or pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")       # readers never wait for a writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                         "key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)")
+            self._local.conn = (conn, os.getpid())
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            row = self._db().execute("SELECT value FROM cache WHERE key = ? AND expires > ?",
+                                     (key, self._timer())).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Shared cache read failed: %s", e)
+            return default
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                       (key, self._timer() + self.ttl, json.dumps(value)))
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(db)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Shared cache write failed: %s", e)
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM cache WHERE expires <= ?", (self._timer(),))
+        db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                   "ORDER BY expires DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+
+    def clear(self) -> None:
+        self._db().execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM cache WHERE expires > ?",
+                                  (self._timer(),)).fetchone()[0]
@@ -0,0 +1,128 @@
+"""
+In-process live collector.
+
+`Collector` is an asyncio task that fetches the hourly forecast of a few
+sites every `interval` seconds. It keeps the rows in an `ObservationStore`,
+which /predict-live reads with no network I/O, and appends them to the
+site's LiveLog (data/.../live_log) as scripts/live_collector.py does.
+With a `table` (app.forecast_table.ForecastTable), every hour of the new
+rows is also scored right away.
+"""
+import time
+import asyncio
+import logging
+import contextlib
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.locations import Location, location_dir
+from app.metrics import COLLECTOR_POLLS
+from app.storage import LiveLog
+from app.weather import WeatherClient, history_days, hourly_rows, select_window
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+logger = logging.getLogger(__name__)
+
+
+# ----- ObservationStore -------
+class ObservationStore:
+    """Latest collected hourly rows per site; reads never wait on a fetch."""
+
+    def __init__(self, timer: Callable[[], float] = time.time):
+        self._sites: Dict[str, Tuple[float, int, List[Dict[str, Any]]]] = {}
+        self._timer = timer
+
+    def update(self, location: str, rows: List[Dict[str, Any]], past_days: int = 0) -> None:
+        # one assignment: readers see either the old rows or the new ones
+        self._sites[location] = (self._timer(), past_days, rows)
+
+    def window(self, location: str, at: Optional[datetime] = None, history: int = 0,
+               max_age: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Same as `WeatherClient.window`, from the stored rows. None when the
+        site is not collected, not with enough past days for `history`, or
+        (with `max_age`) not successfully polled in the last `max_age` seconds.
+        """
+        entry = self._sites.get(location)
+        if entry is None or entry[1] < history_days(history):
+            return None
+        if max_age is not None and self._timer() - entry[0] > max_age:
+            return None
+        return select_window(entry[2], at, history, entry[1])
+
+    def __contains__(self, location: str) -> bool:
+        return location in self._sites
+
+
+# ----- Collector -------
+class Collector:
+    """
+    Polls `locations` every `interval` seconds. `history(location)` gives the
+    hours of history the site's model needs, so enough past days are fetched.
+    A failed poll keeps the previous rows, and the next one tries again.
+    """
+
+    def __init__(self, client: WeatherClient, store: ObservationStore,
+                 locations: Sequence[Location], interval: float,
+                 history: Callable[[str], int] = lambda location: 0,
+                 data_dir: Path = DATA_DIR, write_log: bool = True, table=None):
+        self.client    = client
+        self.store     = store
+        self.locations = list(locations)
+        self.interval  = interval
+        self.history   = history
+        self.data_dir  = Path(data_dir)
+        self.write_log = write_log
+        self.table     = table
+        self._task: Optional[asyncio.Task] = None
+
+    async def collect(self, loc: Location) -> int:
+        """Fetch one site now; returns the LiveLog rows new or revised."""
+        past_days = history_days(await asyncio.to_thread(self.history, loc.name))
+        rows = hourly_rows(await self.client.fetch(loc.latitude, loc.longitude,
+                                                   past_days=past_days))
+        self.store.update(loc.name, rows, past_days)
+        if self.table is not None:
+            try:
+                await asyncio.to_thread(self.table.refresh, loc.name, rows, past_days)
+            except Exception as e:
+                # requests fall back to scoring from the stored rows
+                logger.warning("Precomputing %s failed: %s", loc.name, e)
+        if not self.write_log:
+            return 0
+        return await asyncio.to_thread(self._append, loc.name, rows)
+
+    def _append(self, location: str, rows: List[Dict[str, Any]]) -> int:
+        import pandas as pd
+        df = pd.DataFrame(rows)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        return LiveLog(location_dir(self.data_dir, location) / "live_log").append(df, update=True)
+
+    async def collect_all(self) -> None:
+        for loc in self.locations:
+            try:
+                changed = await self.collect(loc)
+            except Exception as e:
+                COLLECTOR_POLLS.labels("failed").inc()
+                logger.warning("Collecting %s failed: %s", loc.name, e)
+                continue
+            COLLECTOR_POLLS.labels("ok").inc()
+            logger.info("Collected %s, %d log rows new or revised", loc.name, changed)
+
+    async def run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await self.collect_all()
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
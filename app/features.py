@@ -0,0 +1,371 @@
+"""Feature engineering shared by the training scripts and the API.
+
+`FeatureBuilder` (app/pipeline.py) derives the model inputs at fit/predict
+time; this module builds the engineered table those inputs are trained
+from, one bounded block at a time so history never has to fit in memory.
+
+Lag and rolling-window temperature features (`LagSpec`) are computed on an
+hourly grid by one vectorised function for whole series, and by
+`window_lag_features` for the last row of a fetched forecast window.
+
+`engineer_incremental` appends only the live_log rows collected since the
+last run (its watermark) to the engineered table.
+
+pandas is imported by the functions that need it, not here: the API
+imports this module for `LagSpec` and `window_lag_features` only.
+"""
+from __future__ import annotations
+
+import os
+import json
+import numpy as np
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TIME_FEATURES = ["hour", "day", "month", "weekday"]
+BASE_COLS     = ["timestamp", "temperature", "humidity", "pressure", "wind_speed"]
+FINAL_COLS    = ["temperature", "humidity", "pressure",      # model inputs,
+                 "wind_speed", "hour", "weekday", "month"]   # before any lags
+TARGET        = "temp_next_hour"
+GROUP_COL     = "city"        # present when one table holds several sites
+
+
+def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Add calendar columns from `timestamp`, in place."""
+    ts = df["timestamp"].dt
+    df["hour"]    = ts.hour
+    df["day"]     = ts.day
+    df["month"]   = ts.month
+    df["weekday"] = ts.weekday
+    return df
+
+
+# ----- Lag and rolling-window features -------
+LAG_SOURCE = "temperature"
+ROLL_STATS = ("mean", "min", "max", "std")
+HOUR       = timedelta(hours=1)    # rows are hourly; missing hours count as gaps
+
+
+@dataclass(frozen=True)
+class LagSpec:
+    """
+    Which history features a model uses: `temp_lag_k` (temperature k hours
+    before the row) for k in `lags`, and `temp_roll_<stat>_w` over the w
+    hours ending at the row for w in `windows`. Any missing hour in that
+    span makes the feature NaN.
+    """
+    lags:    Tuple[int, ...] = ()
+    windows: Tuple[int, ...] = ()
+
+    def __post_init__(self):
+        if any(k < 1 for k in self.lags) or any(w < 2 for w in self.windows):
+            raise ValueError("lags must be >= 1 and windows >= 2")
+
+    def __bool__(self) -> bool:
+        return bool(self.lags or self.windows)
+
+    @property
+    def names(self) -> List[str]:
+        return ([f"temp_lag_{k}" for k in self.lags]
+                + [f"temp_roll_{stat}_{w}" for w in self.windows for stat in ROLL_STATS])
+
+    @property
+    def capacity(self) -> int:
+        """Hours of history, current one included, the features look at."""
+        return max([k + 1 for k in self.lags] + list(self.windows), default=0)
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> "LagSpec":
+        """The spec behind a model's feature names (other names are ignored)."""
+        lags, windows = [], []
+        for name in names:
+            if name.startswith("temp_lag_"):
+                lags.append(int(name.rsplit("_", 1)[1]))
+            elif name.startswith("temp_roll_"):
+                w = int(name.rsplit("_", 1)[1])
+                if w not in windows:
+                    windows.append(w)
+        return cls(tuple(lags), tuple(windows))
+
+    @classmethod
+    def parse(cls, lags: str = "", windows: str = "") -> "LagSpec":
+        """From comma-separated command-line values, e.g. "1,2,3" and "6,24"."""
+        ints = lambda s: tuple(int(v) for v in s.split(",") if v.strip())
+        return cls(ints(lags), ints(windows))
+
+
+def _lag_columns(grid: np.ndarray, end: np.ndarray, spec: LagSpec) -> np.ndarray:
+    """
+    Features for the rows whose current hour is `grid[end]`. `grid` holds
+    one temperature per consecutive hour (NaN where none was recorded) and
+    starts with `spec.capacity - 1` hours of padding, so every window fits.
+    """
+    cols = [grid[end - k] for k in spec.lags]
+    for w in spec.windows:
+        windows = np.lib.stride_tricks.sliding_window_view(grid, w)[end - w + 1]
+        cols += [windows.mean(axis=1), windows.min(axis=1),
+                 windows.max(axis=1), windows.std(axis=1)]
+    return np.column_stack(cols) if cols else np.empty((len(end), 0))
+
+
+def series_lag_features(timestamps, temperatures, spec: LagSpec) -> np.ndarray:
+    """
+    (n, len(spec.names)) lag features of one site's rows, vectorised: the
+    rows are placed on an hourly grid and every lag / window is one slice
+    or one reduction over that grid.
+    """
+    if not len(timestamps):
+        return np.empty((0, len(spec.names)))
+    grid, hours = _hour_grid(timestamps, temperatures, before=spec.capacity - 1)
+    return _lag_columns(grid, hours, spec)
+
+
+def _hour_grid(timestamps, temperatures, before: int = 0,
+               after: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One site's temperatures on a consecutive-hour grid (NaN where no row
+    was recorded) padded with `before` / `after` NaN hours, and each row's
+    position on it.
+    """
+    import pandas as pd
+    ts = pd.DatetimeIndex(pd.to_datetime(timestamps, format="ISO8601"))
+    hours = ((ts - ts.min()) // HOUR).to_numpy(dtype=np.int64) + before
+    grid = np.full(int(hours.max()) + 1 + after, np.nan)
+    grid[hours] = np.asarray(temperatures, dtype=np.float64)
+    return grid, hours
+
+
+def window_lag_features(rows: List[Dict], spec: LagSpec) -> Dict[str, float]:
+    """
+    Features of the last of `rows` (raw model rows, oldest first, with
+    datetime timestamps), as `series_lag_features` gives them, without
+    pandas. Only rows in the `spec.capacity` hours ending at it are read.
+    """
+    last = rows[-1]["timestamp"]
+    grid = np.full(spec.capacity, np.nan)
+    for row in rows:
+        back = (last - row["timestamp"]) // HOUR
+        if 0 <= back < spec.capacity:
+            grid[spec.capacity - 1 - back] = row[LAG_SOURCE]
+    values = _lag_columns(grid, np.array([spec.capacity - 1]), spec)[0]
+    return dict(zip(spec.names, values.tolist()))
+
+
+def add_lag_features(df: pd.DataFrame, spec: LagSpec,
+                     group_col: str = GROUP_COL) -> pd.DataFrame:
+    """Add `spec.names` columns, per site when `group_col` is present."""
+    out = np.empty((len(df), len(spec.names)))
+    if group_col in df:
+        positions = df.groupby(group_col, sort=False).indices.values()
+    else:
+        positions = [np.arange(len(df))]
+    for pos in positions:
+        out[pos] = series_lag_features(df["timestamp"].iloc[pos],
+                                       df[LAG_SOURCE].iloc[pos], spec)
+    return df.assign(**dict(zip(spec.names, out.T)))
+
+
+def horizon_targets(df: pd.DataFrame, horizon: int,
+                    group_col: str = GROUP_COL) -> np.ndarray:
+    """
+    (n, horizon) temperatures 1..`horizon` hours after each row, per site:
+    direct multi-step targets. NaN where that hour was not recorded.
+    """
+    out = np.full((len(df), horizon), np.nan)
+    if group_col in df:
+        positions = df.groupby(group_col, sort=False).indices.values()
+    else:
+        positions = [np.arange(len(df))]
+    for pos in positions:
+        if len(pos):
+            grid, hours = _hour_grid(df["timestamp"].iloc[pos], df[LAG_SOURCE].iloc[pos],
+                                     after=horizon)
+            out[pos] = grid[hours[:, None] + np.arange(1, horizon + 1)]
+    return out
+
+
+class LagStreamer:
+    """
+    `add_lag_features` for consecutive blocks of rows: the last
+    `spec.capacity` rows of each site are kept to give the next block's
+    first rows their history.
+    """
+
+    def __init__(self, spec: LagSpec, group_col: str = GROUP_COL):
+        self.spec      = spec
+        self.group_col = group_col
+        self._tail: Dict[Optional[str], pd.DataFrame] = {}
+        self.dropped  = 0             # rows without a full history
+
+    def push(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        import pandas as pd
+        if self.group_col in chunk:
+            groups = chunk.groupby(self.group_col, sort=False)
+        else:
+            groups = [(None, chunk)]
+        out = []
+        for key, rows in groups:
+            tail = self._tail.get(key)
+            both = rows if tail is None else pd.concat([tail, rows])
+            self._tail[key] = both.iloc[-self.spec.capacity:]
+            feats = series_lag_features(both["timestamp"], both[LAG_SOURCE], self.spec)
+            out.append(rows.assign(**dict(zip(self.spec.names, feats[len(both) - len(rows):].T))))
+        if not out:
+            return chunk.assign(**{name: pd.Series(dtype=float) for name in self.spec.names})
+        return pd.concat(out, ignore_index=True)
+
+    def complete(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Drop rows whose history is incomplete; the model cannot use them."""
+        kept = df.dropna(subset=self.spec.names)
+        self.dropped += len(df) - len(kept)
+        return kept
+
+
+class TargetShifter:
+    """
+    Adds `temp_next_hour` (the next row's temperature, per site) to
+    consecutive blocks of rows.
+
+    The last row of each site in a block has no next hour yet, so it is held
+    back and emitted, with its target, at the start of that site's rows in
+    the next block. Rows whose target is missing are dropped, matching the
+    whole-frame `shift(-1)` + `dropna` this replaces. With `freq`, a row
+    whose next row is not exactly `freq` later (a gap in collection) also
+    has no target.
+    """
+
+    def __init__(self, group_col: str = GROUP_COL, freq: Optional[str] = None):
+        import pandas as pd
+        self.group_col = group_col
+        self.freq      = pd.Timedelta(freq) if freq else None
+        self._pending: Dict[Optional[str], pd.DataFrame] = {}
+        self.dropped  = 0             # rows with no usable next hour
+        self.unordered = 0            # rows not after their site's previous row
+
+    def push(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        import pandas as pd
+        if self.group_col in chunk:
+            groups = chunk.groupby(self.group_col, sort=False)
+        else:
+            groups = [(None, chunk)]
+
+        out = []
+        for key, rows in groups:
+            held = self._pending.pop(key, None)
+            if held is not None:
+                rows = pd.concat([held, rows])
+            target = rows["temperature"].shift(-1)
+            if self.freq is not None:
+                target = target.where(rows["timestamp"].shift(-1)
+                                      == rows["timestamp"] + self.freq)
+            rows = rows.assign(**{TARGET: target})
+            self.unordered += int((rows["timestamp"].diff() <= pd.Timedelta(0)).sum())
+            self._pending[key] = rows.iloc[-1:].drop(columns=TARGET)
+            out.append(rows.iloc[:-1])
+
+        if not out:
+            return chunk.iloc[:0].assign(**{TARGET: pd.Series(dtype=float)})
+        ready = pd.concat(out, ignore_index=True)
+        kept = ready.dropna(subset=[TARGET])
+        self.dropped += len(ready) - len(kept)
+        return kept
+
+    def finish(self) -> None:
+        """Account for the rows still waiting for a next hour that never came."""
+        self.dropped += sum(len(rows) for rows in self._pending.values())
+        self._pending.clear()
+
+
+def engineer_chunks(chunks: Iterable[pd.DataFrame],
+                    shifter: Optional[TargetShifter] = None,
+                    lagger: Optional[LagStreamer] = None) -> Iterator[pd.DataFrame]:
+    """
+    Time features + target (+ lag features, with `lagger`) for a stream of
+    raw blocks, in bounded memory. Lags are taken before any row is dropped
+    for its target, so a row's history matches what the API sees.
+    """
+    shifter = shifter or TargetShifter()
+    for chunk in chunks:
+        chunk = add_time_features(chunk)
+        if lagger is None:
+            yield shifter.push(chunk)
+        else:
+            yield lagger.complete(shifter.push(lagger.push(chunk)))
+    shifter.finish()
+
+
+# ----- Watermark for incremental runs -------
+def read_watermark(path: Path) -> Optional[pd.Timestamp]:
+    """Timestamp of the last engineered row, or None before the first run."""
+    if not path.exists():
+        return None
+    import pandas as pd
+    return pd.Timestamp(json.loads(path.read_text(encoding="utf-8"))["timestamp"])
+
+def write_watermark(path: Path, timestamp: pd.Timestamp) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"timestamp": timestamp.isoformat()}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+@dataclass(frozen=True)
+class IncrementalRun:
+    watermark: Optional[pd.Timestamp]       # last engineered row before the run
+    collected: int                          # live_log rows read
+    written: pd.DataFrame                   # rows appended (empty: none)
+    dropped: int                            # rows held back or without a target
+
+
+def engineer_incremental(store, table: str, live_log, watermark_path: Path,
+                         spec: LagSpec = LagSpec(), timezone: str = "UTC",
+                         chunksize: int = 200_000, now=None) -> IncrementalRun:
+    """
+    Engineer the rows of `live_log` (an app.storage.LiveLog) after the
+    watermark and append them to `table` of `store`, then move the watermark.
+
+    Without a watermark file, a table written by a full run is continued
+    after its last row. Rows are read from the day partitions that still
+    hold the history `spec` needs. Hours after `now` (default: the current
+    time) at the site are forecasts, not observations, and are left for a
+    later run; so is the newest hour, which has no target yet.
+    """
+    import pandas as pd
+    watermark = read_watermark(watermark_path)
+    if watermark is None and store.exists(table):
+        # first incremental run after a full one: continue from its last row
+        for chunk in store.iter_chunks(table, chunksize, columns=["timestamp"]):
+            if len(chunk):
+                watermark = chunk["timestamp"].iloc[-1]
+
+    # lag features need the hours before the watermark as history
+    since = None if watermark is None else (
+        watermark - pd.Timedelta(hours=spec.capacity)).strftime("%Y-%m-%d")
+    new = live_log.read(since=since)
+    if new.empty:
+        return IncrementalRun(watermark, 0, new, 0)
+    # the collector tags site-local wall-clock times as UTC; keep them local
+    new["timestamp"] = new["timestamp"].dt.tz_localize(None)
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    cutoff = now.tz_convert(timezone).tz_localize(None).floor("h")
+    new = new[new["timestamp"] <= cutoff]
+
+    # freq: a gap in collection must not pair two hours that are not adjacent
+    shifter = TargetShifter(freq="1h")
+    lagger = LagStreamer(spec) if spec else None
+    df = pd.concat(list(engineer_chunks([new], shifter, lagger)), ignore_index=True)
+    if watermark is not None:
+        df = df[df["timestamp"] > watermark]
+    if df.empty:
+        return IncrementalRun(watermark, len(new), df, shifter.dropped)
+
+    if store.exists(table):
+        store.append(table, df)
+    else:
+        store.write(table, df)
+    write_watermark(watermark_path, df["timestamp"].iloc[-1])
+    return IncrementalRun(watermark, len(new), df, shifter.dropped)
@@ -0,0 +1,121 @@
+"""
+Precomputed predictions for every hour of each collected forecast.
+
+When the collector stores new rows for a site, `ForecastTable.refresh`
+scores all of them in one `predict_rows` call. It then swaps in a new
+read-only {hour: prediction} mapping, tagged with the version of the model
+that made it, so /predict-live is a dictionary lookup. Each refresh is also
+written to <data dir>/<site>/forecast_table.json, which a starting worker
+loads before its first poll.
+"""
+import os
+import json
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from app.locations import location_dir
+from app.model import load_estimator, predict_rows
+from app.weather import select_window
+
+DATA_DIR      = Path(__file__).resolve().parents[1] / "data"
+SNAPSHOT_NAME = "forecast_table.json"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Forecast:
+    version: Optional[str]                  # model version that made it
+    default: datetime                       # hour served when no `at` is given
+    predictions: Mapping[datetime, float]
+    made_at: float                          # time.time() of the refresh
+
+
+class ForecastTable:
+    def __init__(self, data_dir: Path = DATA_DIR, snapshot: bool = True,
+                 timer: Callable[[], float] = time.time):
+        self.data_dir = Path(data_dir)
+        self.snapshot = snapshot
+        self._forecasts: Dict[str, Forecast] = {}
+        self._timer = timer
+
+    def snapshot_path(self, location: str) -> Path:
+        return location_dir(self.data_dir, location) / SNAPSHOT_NAME
+
+    def refresh(self, location: str, rows: List[Dict[str, Any]],
+                past_days: int = 0) -> Forecast:
+        """Score every hour of `rows` (as collected, oldest first) and publish them."""
+        est = load_estimator(location)
+        preds = predict_rows(rows, location, est=est)
+        forecast = Forecast(
+            version=getattr(est, "model_version", None),
+            default=select_window(rows, None, 0, past_days)[-1]["timestamp"],
+            # hours without enough history for a lag model are left out
+            predictions=MappingProxyType({row["timestamp"]: pred for row, pred
+                                          in zip(rows, preds) if pred is not None}),
+            made_at=self._timer())
+        self._forecasts[location] = forecast
+        if self.snapshot:
+            self._save(location, forecast)
+        return forecast
+
+    def lookup(self, location: str, at: Optional[datetime], version: Optional[str],
+               max_age: Optional[float] = None) -> Optional[Tuple[datetime, float]]:
+        """
+        (hour, prediction) for `at` (site-local time) or the default hour;
+        None when the hour is not in the table, the table was made by a
+        model version other than `version`, or (with `max_age`) it is more
+        than `max_age` seconds old. A missing version never matches: an
+        unversioned model cannot tell its own table from an older one's.
+        """
+        forecast = self._forecasts.get(location)
+        if forecast is None or forecast.version is None or forecast.version != version:
+            return None
+        if max_age is not None and self._timer() - forecast.made_at > max_age:
+            return None
+        if at is not None and at.tzinfo is not None:
+            raise ValueError("`at` must be naive site-local time (see Location.local_time)")
+        hour = (forecast.default if at is None
+                else at.replace(minute=0, second=0, microsecond=0))
+        pred = forecast.predictions.get(hour)
+        return None if pred is None else (hour, pred)
+
+    def _save(self, location: str, forecast: Forecast) -> None:
+        path = self.snapshot_path(location)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "version":     forecast.version,
+            "default":     forecast.default.isoformat(),
+            "made_at":     forecast.made_at,
+            "predictions": [[ts.isoformat(), pred]
+                            for ts, pred in forecast.predictions.items()],
+        }), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def load_snapshots(self, locations: Iterable[str], max_age: float) -> List[str]:
+        """Load the snapshots made in the last `max_age` seconds; returns their sites."""
+        loaded = []
+        for location in locations:
+            try:
+                snap = json.loads(self.snapshot_path(location).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if self._timer() - snap["made_at"] > max_age:
+                continue
+            self._forecasts[location] = Forecast(
+                version=snap["version"],
+                default=datetime.fromisoformat(snap["default"]),
+                predictions=MappingProxyType({datetime.fromisoformat(ts): pred
+                                              for ts, pred in snap["predictions"]}),
+                made_at=snap["made_at"])
+            loaded.append(location)
+        return loaded
+
+    def __contains__(self, location: str) -> bool:
+        return location in self._forecasts
@@ -0,0 +1,85 @@
+import os
+import json
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+ROOT_DIR       = Path(__file__).resolve().parents[1]
+LOCATIONS_FILE = Path(os.environ.get("WEATHER_LOCATIONS_FILE",
+                                     ROOT_DIR / "config" / "locations.json"))
+
+# --- The project started with Hyderabad only; it keeps the top-level ---
+# --- data/ and model/ paths, every other site gets its own subfolder ---
+DEFAULT_LOCATION = "hyderabad"
+MAX_DISTANCE_KM  = 100.0     # lat/lon lookups further than this from any site fail
+
+
+@dataclass(frozen=True)
+class Location:
+    name: str
+    latitude: float
+    longitude: float
+    code: str = ""           # short tag used in data file names
+    timezone: str = "UTC"    # IANA name; Open-Meteo timestamps are site-local
+
+    def __post_init__(self):
+        if not self.code:
+            object.__setattr__(self, "code", self.name)
+
+    def local_time(self, at: datetime) -> datetime:
+        """`at` as naive site-local time; a naive `at` is taken as site-local already."""
+        if at.tzinfo is None:
+            return at
+        return at.astimezone(ZoneInfo(self.timezone)).replace(tzinfo=None)
+
+
+_BUILTIN = {DEFAULT_LOCATION: Location(DEFAULT_LOCATION, 17.3850, 78.4867, "hyd",
+                                       "Asia/Kolkata")}
+
+
+@lru_cache(maxsize=1)
+def load_locations() -> Dict[str, Location]:
+    """Registered sites by name: the built-in default plus LOCATIONS_FILE."""
+    locations = dict(_BUILTIN)
+    if LOCATIONS_FILE.exists():
+        for entry in json.loads(LOCATIONS_FILE.read_text(encoding="utf-8")):
+            loc = Location(**entry)
+            locations[loc.name] = loc
+    return locations
+
+
+def get_location(name: str) -> Location:
+    try:
+        return load_locations()[name.lower()]
+    except KeyError:
+        raise KeyError(f"Unknown location: {name}") from None
+
+
+def _distance_km(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def nearest_location(latitude: float, longitude: float,
+                     max_km: float = MAX_DISTANCE_KM) -> Location:
+    """The registered site closest to a coordinate; KeyError if none is within `max_km`."""
+    best: Optional[Location] = None
+    best_km = max_km
+    for loc in load_locations().values():
+        km = _distance_km(latitude, longitude, loc.latitude, loc.longitude)
+        if km <= best_km:
+            best, best_km = loc, km
+    if best is None:
+        raise KeyError(f"No location within {max_km:.0f} km of ({latitude}, {longitude})")
+    return best
+
+
+def location_dir(base: Path, name: str) -> Path:
+    """Per-site subfolder of `base`; the default site uses `base` itself."""
+    return base if name == DEFAULT_LOCATION else base / name
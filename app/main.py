@@ -1,12 +1,112 @@
 #---- Importing Necessary Libararies---------------
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()      # reported as weather_startup_seconds
+
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from pathlib import Path
-import requests
-import pandas as pd
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+import os
+import json
+import asyncio
 import logging
-from app.model import predict_row
+from app.collector import Collector, ObservationStore
+from app.features import LagSpec, window_lag_features
+from app.forecast_table import ForecastTable
+from app.model import (MODEL_POLL_SECONDS, ModelWatcher,
+                       feature_names, load_estimator, predict_row_fast,
+                       predict_row_horizon, predict_row_quantiles, predict_rows,
+                       registry, with_lag_features)
+from app.metrics import (FEATURE_SECONDS, PREDICTION_CACHE, PREDICTIONS,
+                         REGISTRY, STARTUP_SECONDS, MetricsMiddleware)
+from app.weather import REFRESH_SECONDS, ForecastWindowError, WeatherClient
+from app.locations import (DEFAULT_LOCATION, Location, get_location,
+                           nearest_location)
+
+# One pooled, caching Open-Meteo client per worker process
+weather_client = WeatherClient()
+# Rows from the in-process collector, when it runs (WEATHER_COLLECT_S), and
+# every hour of them already scored
+observations = ObservationStore()
+forecasts = ForecastTable()
+_table_hits = PREDICTION_CACHE.labels("table")
+
+# --- Models loaded before the worker takes traffic (comma-separated sites) ---
+PRELOAD = [c for c in os.environ.get("WEATHER_PRELOAD", DEFAULT_LOCATION).split(",") if c]
+# --- In-process collector: poll interval in seconds (0: off) and its sites ---
+COLLECT_SECONDS = float(os.environ.get("WEATHER_COLLECT_S", "0"))
+COLLECT = [c for c in os.environ.get("WEATHER_COLLECT", ",".join(PRELOAD)).split(",") if c]
+# --- Collected rows and precomputed predictions older than this (seconds) ---
+# --- are not served: requests go upstream once polls have been failing ---
+COLLECTED_MAX_AGE = float(os.environ.get("WEATHER_COLLECTED_MAX_AGE_S",
+                                         3 * max(COLLECT_SECONDS, REFRESH_SECONDS)))
+# --- When set, POST /admin/reload needs this value in X-Admin-Token ---
+ADMIN_TOKEN = os.environ.get("WEATHER_ADMIN_TOKEN")
+
+
+def preload_models() -> None:
+    for city in PRELOAD:
+        try:
+            load_estimator(get_location(city).name)
+        except (KeyError, FileNotFoundError):
+            logger.warning("No model to preload for %s", city)
+
+
+async def site_estimator(location: str):
+    """
+    The site's model. A loaded one is a dictionary lookup; a cold load, or
+    waiting on another request's, runs in a thread so the event loop (and
+    every other in-flight request) is not held up.
+    """
+    if location in registry:
+        return load_estimator(location)
+    return await asyncio.to_thread(load_estimator, location)
+
+
+def history_hours(location: str) -> int:
+    """Hours of history before the predicted one that the site's model needs."""
+    try:
+        spec = LagSpec.from_names(feature_names(load_estimator(location)))
+    except FileNotFoundError:
+        return 0
+    return spec.capacity - 1 if spec else 0
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # unpickling / compiling happens here, not on the first request
+    started = time.perf_counter()
+    await asyncio.to_thread(preload_models)
+    STARTUP_SECONDS.labels("preload").set(time.perf_counter() - started)
+    logger.info("Startup: imports %.2fs, model preload %.2fs",
+                STARTUP_SECONDS.labels("import").value,
+                STARTUP_SECONDS.labels("preload").value)
+    watcher = collector = None
+    if MODEL_POLL_SECONDS > 0:
+        watcher = ModelWatcher(registry)
+        watcher.start()
+    if COLLECT_SECONDS > 0:
+        sites = [get_location(c) for c in COLLECT]
+        # answer from the last worker's table until the first poll lands
+        loaded = forecasts.load_snapshots([loc.name for loc in sites],
+                                          max_age=max(COLLECT_SECONDS, REFRESH_SECONDS))
+        if loaded:
+            logger.info("Loaded forecast snapshots for %s", ", ".join(loaded))
+        collector = Collector(weather_client, observations, sites, COLLECT_SECONDS,
+                              history=history_hours, table=forecasts)
+        collector.start()
+    yield
+    if collector is not None:
+        await collector.stop()
+    if watcher is not None:
+        watcher.stop()
+    await weather_client.aclose()
 
-app = FastAPI(title="Weather Prediction API", version="1.0")
+
+app = FastAPI(title="Weather Prediction API", version="1.0", lifespan=lifespan)
 
 # --- Logging Setup -----------
 ROOT_DIR = Path(__file__).resolve().parents[1]
@@ -21,50 +121,244 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# --- Defining the  Constants ----
-# --- As I've trained the model to predict about one city [Hyderrabad] ---
-# --- This Project can be scaled by introducing more Cities ---
-LAT = 17.3850
-LON = 78.4867
-URL = "https://api.open-meteo.com/v1/forecast"
-PARAMS = {
-    "latitude": LAT,
-    "longitude": LON,
-    "hourly": "temperature_2m,relative_humidity_2m,pressure_msl,wind_speed_10m",
-    "timezone": "auto",
-    "forecast_days": 1
-}
+# --- Locations ----
+# --- Sites live in config/locations.json (see app/locations.py); each one ---
+# --- has its own model, loaded on first use by app.model.registry ---
+def resolve_location(city: Optional[str], lat: Optional[float],
+                     lon: Optional[float]) -> Tuple[Location, float, float]:
+    """Pick the site whose model to use and the coordinates to fetch weather for."""
+    try:
+        if city is not None:
+            loc = get_location(city)
+            return loc, loc.latitude, loc.longitude
+        if lat is None and lon is None:
+            loc = get_location(DEFAULT_LOCATION)
+            return loc, loc.latitude, loc.longitude
+        if lat is None or lon is None:
+            raise HTTPException(status_code=422, detail="Pass both lat and lon")
+        return nearest_location(lat, lon), lat, lon
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+# --- History features ----
+# --- A model trained with lag / rolling features (train_model.py --lags) ---
+# --- gets them from the forecast window fetched for the request, so they ---
+# --- always come from the requested coordinates and the latest payload ---
+def lag_features(spec: LagSpec, rows: List[dict]) -> Dict[str, float]:
+    """History features for the last of `rows` (oldest first)."""
+    features = window_lag_features(rows, spec)
+    if any(v != v for v in features.values()):          # NaN: hours missing
+        raise ForecastWindowError(f"Not enough history before {rows[-1]['timestamp']}")
+    return features
+
+
+async def live_row(loc: Location, est, latitude: float, longitude: float,
+                   at: Optional[datetime]) -> dict:
+    """The forecast row for `at` (or its first hour), with any history features."""
+    spec = LagSpec.from_names(feature_names(est))
+    history = spec.capacity - 1 if spec else 0
+    rows = None
+    if (latitude, longitude) == (loc.latitude, loc.longitude):
+        # collected in the background: no upstream call on this request
+        rows = observations.window(loc.name, at, history, max_age=COLLECTED_MAX_AGE)
+    if rows is None:
+        # one cached upstream payload serves every hour in its window
+        rows = await weather_client.window(latitude, longitude, at, history=history)
+    row = rows[-1]
+    if spec:
+        t0 = time.perf_counter()
+        row = {**row, **lag_features(spec, rows)}
+        FEATURE_SECONDS.labels("lags").observe(time.perf_counter() - t0)
+    return row
+
+# --- Batch scoring ----
+# --- Rows are scored in blocks so the response can start streaming before ---
+# --- a very large batch is finished, while each block stays vectorised ---
+BATCH_CHUNK = 4096
+
+
+class Observation(BaseModel):
+    timestamp: datetime           # parsed here, so bad input is a 422 up front
+    temperature: float
+    humidity: float
+    pressure: float
+    wind_speed: float
+
+
+class BatchRequest(BaseModel):
+    observations: List[Observation] = Field(..., min_length=1)
+    city: str = DEFAULT_LOCATION
+
+    @field_validator("observations")
+    @classmethod
+    def one_kind_of_timestamp(cls, observations: List[Observation]) -> List[Observation]:
+        # one series cannot mix local times with timezone-aware ones
+        if len({obs.timestamp.tzinfo is None for obs in observations}) > 1:
+            raise ValueError("Timestamps must be all timezone-aware or all naive")
+        return observations
+
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
-@app.get("/predict-live")
-def predict_live():
-    try:
-        response = requests.get(URL, params=PARAMS, timeout=10)
-        response.raise_for_status()
-        data = response.json()["hourly"]
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """This worker's counters and latency histograms, Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
 
-        df = pd.DataFrame({
-            "timestamp": data["time"],
-            "temperature": data["temperature_2m"],
-            "humidity": data["relative_humidity_2m"],
-            "pressure": data["pressure_msl"],
-            "wind_speed": data["wind_speed_10m"]
-        })
+@app.post("/admin/reload")
+def reload_model(city: str = DEFAULT_LOCATION,
+                 x_admin_token: Optional[str] = Header(None)):
+    """Load the site's currently published model version and swap it in."""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Bad admin token")
+    loc, _, _ = resolve_location(city, None, None)
+    try:
+        registry.reload(loc.name)        # runs in the threadpool, off the event loop
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No model for location: {loc.name}")
+    logger.info("Reloaded model for %s: version %s", loc.name, registry.version(loc.name))
+    return {"city": loc.name, "version": registry.version(loc.name)}
 
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        next_row = df.iloc[0:1]  # just the first/recent hour
+@app.get("/predict-live")
+async def predict_live(city: Optional[str] = None,
+                       lat: Optional[float] = Query(None, ge=-90, le=90),
+                       lon: Optional[float] = Query(None, ge=-180, le=180),
+                       at: Optional[datetime] = None,
+                       quantiles: bool = False):
+    """
+    Predict from the live forecast: its first hour, or the hour `at`
+    (site-local time, or converted to it when it has an offset) anywhere in
+    the cached forecast window. With `quantiles`, the model's quantile
+    heads are returned too.
+    """
+    loc, latitude, longitude = resolve_location(city, lat, lon)
+    at = None if at is None else loc.local_time(at)
+    collected = (latitude, longitude) == (loc.latitude, loc.longitude)
+    if collected and not quantiles and loc.name in registry:
+        # precomputed when the collector polled, by the model loaded now:
+        # a dictionary lookup
+        hit = forecasts.lookup(loc.name, at, registry.version(loc.name),
+                               max_age=COLLECTED_MAX_AGE)
+        if hit is not None:
+            PREDICTIONS.labels("predict_live").inc()
+            _table_hits.inc()
+            return {"predicted_temp": round(hit[1], 2), "timestamp_used": str(hit[0])}
+    try:
+        est = await site_estimator(loc.name)
+        row = await live_row(loc, est, latitude, longitude, at)
 
-        prediction = predict_row(next_row.iloc[0].to_dict())
-        logger.info("Predicted %.2f from live weather input", prediction)
+        if quantiles:
+            prediction, bands = predict_row_quantiles(row, loc.name, est=est)
+            if bands is None:
+                raise HTTPException(status_code=404,
+                                    detail=f"No quantile heads for location: {loc.name}")
+        else:
+            prediction = predict_row_fast(row, loc.name, est=est)
+        PREDICTIONS.labels("predict_live").inc()
+        logger.info("Predicted %.2f from live weather input for %s", prediction, loc.name)
 
-        return {
+        body = {
             "predicted_temp": round(prediction, 2),
-            "timestamp_used": str(next_row.iloc[0]['timestamp'])
+            "timestamp_used": str(row["timestamp"])
         }
+        if quantiles:
+            body["quantiles"] = {name: round(v, 2) for name, v in bands.items()}
+        return body
 
+    except FileNotFoundError:
+        logger.error("No model trained for %s", loc.name)
+        raise HTTPException(status_code=404, detail=f"No model for location: {loc.name}")
+    except ForecastWindowError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Live prediction failed")
         raise HTTPException(status_code=500, detail="Prediction failed")
+
+
+@app.get("/predict-horizon")
+async def predict_horizon(city: Optional[str] = None,
+                          lat: Optional[float] = Query(None, ge=-90, le=90),
+                          lon: Optional[float] = Query(None, ge=-180, le=180),
+                          at: Optional[datetime] = None):
+    """
+    Predict the temperature each hour after the live forecast row (as
+    /predict-live picks it), from that one row: needs a model trained with
+    train_model.py --horizon.
+    """
+    loc, latitude, longitude = resolve_location(city, lat, lon)
+    at = None if at is None else loc.local_time(at)
+    try:
+        est = await site_estimator(loc.name)
+        row = await live_row(loc, est, latitude, longitude, at)
+        preds = predict_row_horizon(row, loc.name, est=est)
+        if preds is None:
+            raise HTTPException(status_code=404,
+                                detail=f"No horizon model for location: {loc.name}")
+        PREDICTIONS.labels("predict_horizon").inc()
+        logger.info("Predicted %d hours ahead from live weather input for %s",
+                    len(preds), loc.name)
+        return {
+            "timestamp_used": str(row["timestamp"]),
+            "horizon": [{"timestamp": str(row["timestamp"] + timedelta(hours=h)),
+                         "predicted_temp": round(pred, 2)}
+                        for h, pred in enumerate(preds, start=1)]
+        }
+
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No model for location: {loc.name}")
+    except ForecastWindowError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Horizon prediction failed")
+        raise HTTPException(status_code=500, detail="Prediction failed")
+
+
+@app.post("/predict-batch")
+def predict_batch(req: BatchRequest):
+    loc, _, _ = resolve_location(req.city, None, None)
+    rows = [obs.model_dump() for obs in req.observations]
+    try:
+        # One estimator for the whole response: a reload mid-stream must not
+        # mix versions, or score lags built for another model's features.
+        est = load_estimator(loc.name)
+        # History features come from the whole batch (taken as one hourly
+        # series), not from each block on its own.
+        rows = with_lag_features(rows, feature_names(est))
+        # Score the first block up front so bad input surfaces as a 500
+        # instead of a half-written stream.
+        first = predict_rows(rows[:BATCH_CHUNK], loc.name, est=est)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No model for location: {loc.name}")
+    except Exception:
+        logger.exception("Batch prediction failed")
+        raise HTTPException(status_code=500, detail="Prediction failed")
+
+    def stream():
+        preds = first
+        for start in range(0, len(rows), BATCH_CHUNK):
+            block = rows[start:start + BATCH_CHUNK]
+            if start:
+                preds = predict_rows(block, loc.name, est=est)
+            PREDICTIONS.labels("predict_batch").inc(sum(p is not None for p in preds))
+            for row, pred in zip(block, preds):
+                yield json.dumps({
+                    "timestamp": row["timestamp"].isoformat(),
+                    "predicted_temp": None if pred is None else round(pred, 2)
+                }) + "\n"
+        logger.info("Predicted %d rows from batch input", len(rows))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# --- Total request time per route; added last so it wraps everything ---
+app.add_middleware(MetricsMiddleware,
+                   routes=[route.path for route in app.routes if hasattr(route, "methods")])
+
+STARTUP_SECONDS.labels("import").set(time.perf_counter() - _import_started)
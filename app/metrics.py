@@ -0,0 +1,218 @@
+"""
+Minimal Prometheus-style metrics (text exposition format 0.0.4) without a
+client library: counters and histograms with optional labels, and an ASGI
+middleware timing every request. Values are per worker process; scrape each
+worker, as with prometheus_client's default registry.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# --- Request / stage latencies: 100µs .. 10s ---
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock      = threading.Lock()
+
+    def labels(self, *values: str):
+        """The child for one combination of label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_labels(labelnames, values)} {self.value:g}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts  = [0] * (len(buckets) + 1)      # last one is +Inf
+        self.sum     = 0.0
+        self._lock   = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)          # first bucket with le >= value
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        lines, total = [], 0
+        for le, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            le = 'le="+Inf"' if le == float("inf") else f'le="{le:g}"'
+            lines.append(f"{name}_bucket{_labels(labelnames, values, le)} {total}")
+        lines.append(f"{name}_sum{_labels(labelnames, values)} {self.sum:g}")
+        lines.append(f"{name}_count{_labels(labelnames, values)} {total}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # modules may be re-imported (e.g. by tests); keep the first instance
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ----- The API's metrics -------
+STARTUP_SECONDS = REGISTRY.gauge(
+    "weather_startup_seconds", "Worker startup time by phase (import, preload)",
+    ["phase"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "weather_api_request_seconds", "Total request time, by route and status",
+    ["route", "status"])
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "weather_upstream_fetch_seconds", "Open-Meteo forecast fetch time")
+UPSTREAM_FAILURES = REGISTRY.counter(
+    "weather_upstream_failures_total", "Open-Meteo fetches that failed")
+FORECAST_CACHE = REGISTRY.counter(
+    "weather_forecast_cache_total", "Forecast lookups by result (hit, miss, coalesced)",
+    ["result"])
+FEATURE_SECONDS = REGISTRY.histogram(
+    "weather_feature_build_seconds", "Time to build a feature matrix, by path",
+    ["path"])
+PREDICT_SECONDS = REGISTRY.histogram(
+    "weather_model_predict_seconds", "Time spent in the model's predict, by path",
+    ["path"])
+COLLECTOR_POLLS = REGISTRY.counter(
+    "weather_collector_polls_total", "In-process collector fetches by result (ok, failed)",
+    ["result"])
+PREDICTION_CACHE = REGISTRY.counter(
+    "weather_prediction_cache_total", "Live predictions by source (table, local, shared, miss)",
+    ["result"])
+PREDICTIONS = REGISTRY.counter(
+    "weather_predictions_total", "Predictions served, by endpoint", ["endpoint"])
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording REQUEST_SECONDS. Routes outside `routes`
+    are reported as "other" so unknown paths cannot blow up label cardinality.
+    """
+
+    def __init__(self, app, routes: Optional[Sequence[str]] = None):
+        self.app    = app
+        self.routes = set(routes or ())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope["path"] if scope["path"] in self.routes else "other"
+            REQUEST_SECONDS.labels(route, str(status[0])).observe(
+                time.perf_counter() - started)
@@ -1,44 +1,799 @@
-import pandas as pd
-from pathlib import Path              
-import joblib                         
-from sklearn.base import BaseEstimator, TransformerMixin
-from typing import Dict, Any
-
-# ----- FeatureBuilder-------
-class FeatureBuilder(BaseEstimator, TransformerMixin):
-    base_cols  = ["timestamp", "temperature", "humidity",
-                  "pressure", "wind_speed"]
-    final_cols = ["temperature", "humidity", "pressure",
-                  "wind_speed", "hour", "weekday", "month"]
-
-    def fit(self, X, y=None):
-        return self
-
-    def transform(self, X):
-        df = pd.DataFrame(X, columns=self.base_cols).copy()
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df["hour"]      = df["timestamp"].dt.hour
-        df["weekday"]   = df["timestamp"].dt.weekday
-        df["month"]     = df["timestamp"].dt.month
-        return df[self.final_cols]
+import os
+import copy
+import json
+import shutil
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from app.features import FINAL_COLS, LagSpec, series_lag_features
+from app.locations import DEFAULT_LOCATION, location_dir
+from app.cache import SqliteCache, TTLCache
+from app.metrics import FEATURE_SECONDS, PREDICT_SECONDS, PREDICTION_CACHE
+
+# label children bound once, off the per-request path
+_feature_row, _feature_batch = FEATURE_SECONDS.labels("row"), FEATURE_SECONDS.labels("batch")
+_predict_row, _predict_batch = PREDICT_SECONDS.labels("row"), PREDICT_SECONDS.labels("batch")
+_predict_quantiles, _predict_horizon = (PREDICT_SECONDS.labels(p)
+                                        for p in ("quantiles", "horizon"))
+_cache_local, _cache_shared, _cache_miss = (PREDICTION_CACHE.labels(r)
+                                            for r in ("local", "shared", "miss"))
+
+def __getattr__(name):
+    # FeatureBuilder, and the sklearn it subclasses, are only imported when
+    # asked for (training, unpickling a pipeline); pickles name it app.model.
+    if name == "FeatureBuilder":
+        from app.pipeline import FeatureBuilder
+        return FeatureBuilder
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 ROOT_DIR   = Path(__file__).resolve().parents[1]
-MODEL_PATH = ROOT_DIR / "model" / "weather_pipeline.pkl"
+MODEL_DIR  = ROOT_DIR / "model"
+MODEL_PATH = MODEL_DIR / "weather_pipeline.pkl"
+FLAT_MODEL_PATH = MODEL_DIR / "weather_trees"       # FlatEnsemble directory
+LEGACY_FLAT_NAME = "weather_trees.npz"
+META_NAME  = "weather_pipeline.json"
+QUANTILES_NAME = "weather_quantiles"       # stacked FlatEnsemble of quantile heads
+QUANTILES_PKL  = "weather_quantiles.pkl"   # the sklearn heads, for --retrain
+HORIZON_NAME   = "weather_horizon"         # stacked FlatEnsemble, one head per hour ahead
+HORIZON_PKL    = "weather_horizon.pkl"     # the sklearn t+2.. models, for --retrain
+
+# --- Upper bound on the estimators kept in memory across all locations ---
+MODEL_CACHE_BYTES = int(os.environ.get("WEATHER_MODEL_CACHE_MB", "512")) * 2**20
+# --- How often the API checks for a newly published model version (0: never) ---
+MODEL_POLL_SECONDS = float(os.environ.get("WEATHER_MODEL_POLL_S", "30"))
+# --- Single-row predictions remembered per loaded model (0: no cache), and ---
+# --- an optional SQLite file through which workers share them ---
+PREDICTION_CACHE_SIZE = int(os.environ.get("WEATHER_PREDICTION_CACHE", "4096"))
+PREDICTION_CACHE_TTL  = float(os.environ.get("WEATHER_PREDICTION_CACHE_TTL_S", "3600"))
+PREDICTION_CACHE_DB   = os.environ.get("WEATHER_PREDICTION_CACHE_DB")
 
-_pipeline = None  #
+logger = logging.getLogger(__name__)
+
+_pipeline = None  # (version, pipeline, monotonic time CURRENT was last read)
+_buffers = threading.local()   # per-thread (1, n_features) scratch rows
+_shared_predictions = (SqliteCache(PREDICTION_CACHE_DB, ttl=PREDICTION_CACHE_TTL)
+                       if PREDICTION_CACHE_DB else None)
 
 def load_pipeline():
-    """Load and cache the persisted scikit‑learn pipeline."""
+    """
+    Load and cache the current version of the persisted scikit‑learn pipeline.
+    CURRENT is re-read at most every MODEL_POLL_SECONDS (only once when 0),
+    the interval ModelWatcher uses, so most calls never touch the disk.
+    """
     global _pipeline
-    if _pipeline is None:
-        _pipeline = joblib.load(MODEL_PATH)
-    return _pipeline
+    now = time.monotonic()
+    if _pipeline is not None and (MODEL_POLL_SECONDS <= 0
+                                  or now - _pipeline[2] < MODEL_POLL_SECONDS):
+        return _pipeline[1]
+    version = current_version(DEFAULT_LOCATION)
+    if _pipeline is None or _pipeline[0] != version:
+        import joblib
+        path = artifact_dir(DEFAULT_LOCATION, version) / MODEL_PATH.name
+        _pipeline = (version, joblib.load(path), now)
+    else:
+        _pipeline = (version, _pipeline[1], now)
+    return _pipeline[1]
 
 def predict_row(row: Dict[str, Any]) -> float:
     """
     Accept a raw JSON‑style dict and return the next‑hour temperature prediction.
     """
+    import pandas as pd          # the sklearn pipeline path only
     pipe = load_pipeline()
     df = pd.DataFrame([row])
     return float(pipe.predict(df)[0])
+
+def predict_rows(rows: Iterable[Dict[str, Any]],
+                 location: str = DEFAULT_LOCATION, est=None) -> List[float]:
+    """
+    Score many raw observations with one feature matrix and one vectorised
+    model call, instead of one `predict_row` per observation. With a lag
+    model the rows are one hourly series, and the first rows (no history
+    yet) score None. `est` overrides the location's current estimator.
+    """
+    if est is None:
+        est = load_estimator(location)
+    t0 = time.perf_counter()
+    X = build_features(rows, feature_names(est))
+    t1 = time.perf_counter()
+    _feature_batch.observe(t1 - t0)
+    if not len(X):
+        return []
+    # rows without the history a lag model needs get None, not a guess
+    ok = ~np.isnan(X).any(axis=1)
+    if ok.all():
+        preds = est.predict(X).tolist()
+    else:
+        preds = [None] * len(X)
+        for i, pred in zip(np.flatnonzero(ok), est.predict(X[ok]) if ok.any() else []):
+            preds[i] = float(pred)
+    _predict_batch.observe(time.perf_counter() - t1)
+    return preds
+
+
+# ----- Pandas-free inference path -------
+def _as_datetime(ts) -> datetime:
+    if isinstance(ts, datetime):     # also covers pd.Timestamp
+        return ts
+    return datetime.fromisoformat(str(ts))
+
+def feature_names(est) -> List[str]:
+    """Input columns an estimator from `load_estimator` expects, in order."""
+    return getattr(est, "feature_names", None) or FINAL_COLS
+
+def row_features(row: Dict[str, Any], out: np.ndarray = None,
+                 names: List[str] = FINAL_COLS) -> np.ndarray:
+    """
+    Fill `out` with the `names` values of one raw row, deriving
+    hour/weekday/month straight from the timestamp; any other name
+    (e.g. a lag feature) is read from the row as is.
+    """
+    if out is None:
+        out = np.empty(len(names))
+    ts = _as_datetime(row["timestamp"])
+    calendar = {"hour": ts.hour, "weekday": ts.weekday(), "month": ts.month}
+    for j, name in enumerate(names):
+        out[j] = calendar[name] if name in calendar else row[name]
+    return out
+
+def with_lag_features(rows: List[Dict[str, Any]],
+                      names: List[str]) -> List[Dict[str, Any]]:
+    """
+    Add the lag features among `names` that the rows do not carry,
+    computed from the rows themselves as one site's hourly series (like
+    `FeatureBuilder`); they are NaN for rows without enough history.
+    """
+    spec = LagSpec.from_names(names)
+    if not spec or not rows or all(name in rows[0] for name in spec.names):
+        return rows
+    lagged = series_lag_features([r["timestamp"] for r in rows],
+                                 [r["temperature"] for r in rows], spec)
+    return [{**row, **dict(zip(spec.names, values))}
+            for row, values in zip(rows, lagged.tolist())]
+
+def build_features(rows: Iterable[Dict[str, Any]],
+                   names: List[str] = FINAL_COLS) -> np.ndarray:
+    """Stack `row_features` for many rows into one (n, n_features) matrix."""
+    rows = with_lag_features(list(rows), names)
+    X = np.empty((len(rows), len(names)))
+    for i, row in enumerate(rows):
+        row_features(row, X[i], names)
+    return X
+
+# ----- Versioned artifacts -------
+# --- train_model.py writes each model to <model dir>/versions/<version>/ and ---
+# --- publishes it by replacing the one-line CURRENT file, so a reader sees ---
+# --- either the old or the new version, never a mix. The top-level pickle ---
+# --- and metadata are hard links to the current version for tools that use ---
+# --- fixed paths; the flat export is only read from its version directory ---
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+ARTIFACTS    = (MODEL_PATH.name, META_NAME)
+
+def current_version(location: str = DEFAULT_LOCATION) -> Optional[str]:
+    """Published version of a location's model; None for an unversioned model dir."""
+    try:
+        return (location_dir(MODEL_DIR, location) / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+def artifact_dir(location: str = DEFAULT_LOCATION,
+                 version: Optional[str] = None) -> Path:
+    """Directory holding one version of a location's model (None: unversioned)."""
+    loc_dir = location_dir(MODEL_DIR, location)
+    return loc_dir if version is None else loc_dir / VERSIONS_DIR / version
+
+def model_paths(location: str = DEFAULT_LOCATION,
+                version: Optional[str] = None) -> Tuple[Path, Path]:
+    """Pickle and flat-export paths of one location's model (current version by default)."""
+    loc_dir = artifact_dir(location, version or current_version(location))
+    flat = loc_dir / FLAT_MODEL_PATH.name
+    if not flat.exists() and (loc_dir / LEGACY_FLAT_NAME).exists():
+        flat = loc_dir / LEGACY_FLAT_NAME        # written before the directory format
+    return loc_dir / MODEL_PATH.name, flat
+
+def new_version_dir(location: str = DEFAULT_LOCATION) -> Tuple[str, Path]:
+    """Create an empty directory for a model about to be trained."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    version, n = stamp, 1
+    while artifact_dir(location, version).exists():
+        n += 1
+        version = f"{stamp}-{n}"
+    path = artifact_dir(location, version)
+    path.mkdir(parents=True)
+    return version, path
+
+def publish_version(location: str, version: str, keep: int = 5) -> None:
+    """Make `version` current, then drop all but the newest `keep` versions."""
+    loc_dir, src = location_dir(MODEL_DIR, location), artifact_dir(location, version)
+    for name in ARTIFACTS:
+        if not (src / name).exists():
+            continue
+        tmp = loc_dir / f".{name}.tmp"
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(src / name, tmp)
+        except OSError:                      # no hard links here: copy instead
+            shutil.copy2(src / name, tmp)
+        os.replace(tmp, loc_dir / name)
+
+    tmp = loc_dir / f".{CURRENT_FILE}.tmp"
+    tmp.write_text(version + "\n")
+    os.replace(tmp, loc_dir / CURRENT_FILE)
+
+    versions = sorted(p.name for p in (loc_dir / VERSIONS_DIR).iterdir() if p.is_dir())
+    for old in versions[:-keep] if keep else []:
+        if old != version:
+            shutil.rmtree(artifact_dir(location, old), ignore_errors=True)
+
+def _flat_model_is_current(pkl_path: Path, flat_path: Path) -> bool:
+    if not flat_path.exists():
+        return False
+    # An export older than the pickle belongs to a previous training run.
+    return (not pkl_path.exists()
+            or flat_path.stat().st_mtime >= pkl_path.stat().st_mtime)
+
+def _load_estimator(location: str) -> Tuple[Any, int]:
+    """
+    Load the current version of one location's estimator and estimate its
+    size in bytes; the version is kept on it as `model_version`.
+    """
+    version = current_version(location)
+    pkl_path, flat_path = model_paths(location, version)
+    if _flat_model_is_current(pkl_path, flat_path):
+        est = FlatEnsemble.load(flat_path)
+        nbytes = est.nbytes
+    else:
+        import joblib                        # only without a current flat export
+        est = copy.copy(joblib.load(pkl_path).named_steps["model"])
+        # It was fitted on FeatureBuilder's DataFrame; without the stored
+        # column names sklearn accepts a bare ndarray without warning.
+        names = est.__dict__.pop("feature_names_in_", None)
+        est.feature_names = None if names is None else list(names)
+        nbytes = pkl_path.stat().st_size
+    est.model_version = version
+    # optional stacked heads, each scored in one pass: quantiles
+    # (train_model.py --quantiles) and hours ahead (--horizon)
+    for attr, name in (("quantiles", QUANTILES_NAME), ("horizon", HORIZON_NAME)):
+        path = pkl_path.parent / name
+        heads = FlatEnsemble.load(path) if path.exists() else None
+        setattr(est, attr, heads)
+        if heads is not None:
+            nbytes += heads.nbytes
+    # a fresh cache per loaded model: a swapped-in version starts empty
+    est.prediction_cache = (TTLCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+                            if PREDICTION_CACHE_SIZE > 0 else None)
+    return est, nbytes
+
+
+# ----- ModelRegistry -------
+class ModelRegistry:
+    """
+    Per-location estimators, loaded on first use and kept in an LRU whose
+    total estimated size stays under `max_bytes` (the most recently used
+    model is always kept, even if it alone is larger).
+    """
+
+    def __init__(self, max_bytes: int = MODEL_CACHE_BYTES, loader=_load_estimator):
+        self.max_bytes = max_bytes
+        self._loader   = loader
+        self._models: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock     = threading.Lock()
+
+    def get(self, location: str = DEFAULT_LOCATION):
+        with self._lock:
+            if location in self._models:
+                self._models.move_to_end(location)
+                return self._models[location][0]
+            load_lock = self._loading.setdefault(location, threading.Lock())
+
+        # one thread loads a given location; others wait for its result
+        with load_lock:
+            with self._lock:
+                if location in self._models:
+                    return self._models[location][0]
+            try:
+                est, nbytes = self._loader(location)
+                with self._lock:
+                    # published before the lock is dropped, so a request
+                    # arriving now finds the model instead of loading it again
+                    self._models[location] = (est, nbytes)
+                    self._evict()
+            finally:
+                with self._lock:
+                    self._loading.pop(location, None)
+        return est
+
+    def reload(self, location: str = DEFAULT_LOCATION):
+        """
+        Load `location` again (its newly published version) and swap it in.
+        Requests keep using the old estimator until the swap, which is one
+        dict assignment under the lock.
+        """
+        est, nbytes = self._loader(location)
+        with self._lock:
+            self._models[location] = (est, nbytes)
+            self._models.move_to_end(location)
+            self._evict()
+        return est
+
+    def version(self, location: str) -> Optional[str]:
+        """Version of the loaded estimator for `location`, if any."""
+        with self._lock:
+            entry = self._models.get(location)
+        return None if entry is None else getattr(entry[0], "model_version", None)
+
+    def locations(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+    def _evict(self) -> None:
+        total = sum(n for _, n in self._models.values())
+        while total > self.max_bytes and len(self._models) > 1:
+            _, (_, nbytes) = self._models.popitem(last=False)
+            total -= nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(n for _, n in self._models.values())
+
+    def __contains__(self, location: str) -> bool:
+        with self._lock:
+            return location in self._models
+
+
+registry = ModelRegistry()
+
+
+class ModelWatcher(threading.Thread):
+    """
+    Background thread that reloads every loaded location whose published
+    version changed, so new models go live without a restart and without a
+    request paying for the load.
+    """
+
+    def __init__(self, registry: ModelRegistry, interval: float = MODEL_POLL_SECONDS):
+        super().__init__(name="model-watcher", daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._halt    = threading.Event()
+
+    def check(self) -> List[str]:
+        """Reload stale locations once; returns the ones reloaded."""
+        reloaded = []
+        for location in self.registry.locations():
+            version = current_version(location)
+            if version == self.registry.version(location):
+                continue
+            try:
+                self.registry.reload(location)
+                reloaded.append(location)
+                logger.info("Reloaded model for %s: version %s", location, version)
+            except Exception:
+                # keep serving the loaded version; the next check retries
+                logger.exception("Reloading model for %s failed", location)
+        return reloaded
+
+    def run(self) -> None:
+        while not self._halt.wait(self.interval):
+            self.check()
+
+    def stop(self) -> None:
+        self._halt.set()
+
+def load_estimator(location: str = DEFAULT_LOCATION):
+    """
+    Return something with `.predict(ndarray)` for rows of its
+    `feature_names`: the location's flat tree export when train_model.py
+    wrote one, otherwise its pipeline's fitted regressor.
+    """
+    return registry.get(location)
+
+def predict_row_fast(row: Dict[str, Any],
+                     location: str = DEFAULT_LOCATION, est=None) -> float:
+    """
+    Same result as `predict_row`, but skips pandas: the row is written into a
+    preallocated array and handed to the estimator directly. `est` overrides
+    the location's current estimator.
+    """
+    if est is None:
+        est = load_estimator(location)
+    names = feature_names(est)
+    buf = getattr(_buffers, "row", None)
+    if buf is None or buf.shape[1] != len(names):
+        buf = _buffers.row = np.empty((1, len(names)))
+    t0 = time.perf_counter()
+    row_features(row, buf[0], names)
+    _feature_row.observe(time.perf_counter() - t0)
+    return _predict_one(est, location, buf)
+
+def predict_row_quantiles(row: Dict[str, Any], location: str = DEFAULT_LOCATION,
+                          est=None) -> Tuple[float, Optional[Dict[str, float]]]:
+    """
+    `predict_row_fast` plus the model's quantile heads (e.g. {"p10": ..,
+    "p50": .., "p90": ..}, None without heads), from one feature row and one
+    pass over the heads' trees. Heads are fitted separately and can cross,
+    so their values are sorted to keep the bands ordered.
+    """
+    if est is None:
+        est = load_estimator(location)
+    X = _feature_matrix(est, row)
+    point = _predict_one(est, location, X)
+    heads = getattr(est, "quantiles", None)
+    if heads is None:
+        return point, None
+    t0 = time.perf_counter()
+    values = np.sort(heads.predict_heads(X)[0])
+    _predict_quantiles.observe(time.perf_counter() - t0)
+    return point, dict(zip(heads.head_names, values.tolist()))
+
+def predict_row_horizon(row: Dict[str, Any], location: str = DEFAULT_LOCATION,
+                        est=None) -> Optional[List[float]]:
+    """
+    The temperature 1, 2, .. hours after `row` (train_model.py --horizon),
+    from one feature row and one pass over every hour's trees: direct
+    models, so no step is fed back in as the next one's input. None when
+    the model has no horizon heads.
+    """
+    if est is None:
+        est = load_estimator(location)
+    heads = getattr(est, "horizon", None)
+    if heads is None:
+        return None
+    X = _feature_matrix(est, row)
+    t0 = time.perf_counter()
+    values = heads.predict_heads(X)[0]
+    _predict_horizon.observe(time.perf_counter() - t0)
+    return values.tolist()
+
+def _feature_matrix(est, row: Dict[str, Any]) -> np.ndarray:
+    """A (1, n_features) matrix of `row`, its own array (not the shared buffer)."""
+    names = feature_names(est)
+    X = np.empty((1, len(names)))
+    t0 = time.perf_counter()
+    row_features(row, X[0], names)
+    _feature_row.observe(time.perf_counter() - t0)
+    return X
+
+def _predict_one(est, location: str, X: np.ndarray) -> float:
+    """
+    `est.predict` of one feature row, remembered per model in
+    `est.prediction_cache` (keyed on the row's exact float64 bytes) and, when
+    WEATHER_PREDICTION_CACHE_DB is set, in the file shared by all workers
+    (keyed on location, model version and row; unversioned models skip it).
+    """
+    cache = getattr(est, "prediction_cache", None)
+    key = shared_key = None
+    if cache is not None:
+        key = X.tobytes()
+        pred = cache.get(key)
+        if pred is not None:
+            _cache_local.inc()
+            return pred
+        version = getattr(est, "model_version", None)
+        if _shared_predictions is not None and version is not None:
+            shared_key = f"{location}/{version}/{key.hex()}"
+            pred = _shared_predictions.get(shared_key)
+            if pred is not None:
+                _cache_shared.inc()
+                cache.set(key, pred)
+                return pred
+        _cache_miss.inc()
+
+    t0 = time.perf_counter()
+    pred = float(est.predict(X)[0])
+    _predict_row.observe(time.perf_counter() - t0)
+    if key is not None:
+        cache.set(key, pred)
+    if shared_key is not None:
+        _shared_predictions.set(shared_key, pred)
+    return pred
+
+
+# ----- Flattened tree ensemble -------
+class FlatEnsemble:
+    """
+    A fitted GradientBoostingRegressor (or HistGradientBoostingRegressor)
+    flattened into contiguous (n_trees, max_nodes) node arrays, sklearn
+    conventions kept (-1 children mark a leaf). Learning rate is folded into
+    `value`. `float32_inputs` mirrors DecisionTree's cast of X to float32;
+    histogram trees compare float64 values directly.
+
+    On load the nodes are compiled into per-feature bitvector tables
+    (QuickScorer-style): each tree's leaves are numbered left to right, and a
+    node whose test fails (x > threshold) clears the leaves of its left
+    subtree. For one feature the failed nodes are a prefix of that feature's
+    sorted thresholds, so a row's surviving-leaf masks for all trees are one
+    `searchsorted` plus one table row per feature; the exit leaf is the
+    lowest surviving bit. No per-node branching or gathers remain.
+
+    `stack` puts several ensembles over the same features (e.g. quantile
+    heads) into one, whose `predict_heads` scores all of them in that single
+    pass: only the final per-tree sum is split by head.
+    """
+    arrays = ("feature", "threshold", "left", "right", "value")
+    fills  = (-2, 0.0, -1, -1, 0.0)          # padding of unused node slots
+
+    def __init__(self, feature, threshold, left, right, value, init, n_features,
+                 feature_names=None, float32_inputs=True, compiled=None, heads=None):
+        self.feature    = feature
+        self.threshold  = threshold
+        self.left       = left
+        self.right      = right
+        self.value      = value
+        self.init       = float(init)
+        self.n_features = int(n_features)
+        self.feature_names = None if feature_names is None else [str(n) for n in feature_names]
+        self.float32_inputs = bool(float32_inputs)
+        # heads: (names, tree offsets, inits) of stacked ensembles
+        names, offsets, inits = heads or (None, [0, len(feature)], [self.init])
+        self.head_names   = None if names is None else [str(n) for n in names]
+        self.head_offsets = np.asarray(offsets, dtype=np.intp)
+        self.head_inits   = np.asarray(inits, dtype=np.float64)
+        if compiled is None:
+            self._compile()
+        else:                       # tables saved by `save` to a directory
+            self._tables, self._leaf_values, self._value_table = compiled
+
+    @classmethod
+    def from_estimator(cls, est) -> "FlatEnsemble":
+        if hasattr(est, "_predictors"):
+            return cls._from_hist(est)
+        trees = [t.tree_ for t in est.estimators_[:, 0]]
+        shape = (len(trees), max(t.node_count for t in trees))
+
+        feature   = np.full(shape, -2, dtype=np.int32)
+        threshold = np.zeros(shape, dtype=np.float64)
+        left      = np.full(shape, -1, dtype=np.int32)
+        right     = np.full(shape, -1, dtype=np.int32)
+        value     = np.zeros(shape, dtype=np.float64)
+
+        for i, t in enumerate(trees):
+            n = t.node_count
+            feature[i, :n]   = t.feature
+            threshold[i, :n] = t.threshold
+            left[i, :n]      = t.children_left
+            right[i, :n]     = t.children_right
+            value[i, :n]     = t.value[:, 0, 0] * est.learning_rate
+
+        if isinstance(est.init_, str):             # init="zero"
+            init = 0.0
+        elif hasattr(est.init_, "constant_"):      # default DummyRegressor
+            init = np.ravel(est.init_.constant_)[0]
+        else:
+            raise TypeError("Only constant init estimators can be flattened")
+
+        return cls(feature, threshold, left, right, value, init,
+                   est.n_features_in_, getattr(est, "feature_names_in_", None))
+
+    @classmethod
+    def _from_hist(cls, est) -> "FlatEnsemble":
+        # leaf values of histogram trees already include the learning rate
+        trees = [predictors[0].nodes for predictors in est._predictors]
+        if any(nodes["is_categorical"].any() for nodes in trees):
+            raise TypeError("Categorical splits cannot be flattened")
+        shape = (len(trees), max(len(nodes) for nodes in trees))
+
+        feature   = np.full(shape, -2, dtype=np.int32)
+        threshold = np.zeros(shape, dtype=np.float64)
+        left      = np.full(shape, -1, dtype=np.int32)
+        right     = np.full(shape, -1, dtype=np.int32)
+        value     = np.zeros(shape, dtype=np.float64)
+
+        for i, nodes in enumerate(trees):
+            n, leaf = len(nodes), nodes["is_leaf"].astype(bool)
+            feature[i, :n]   = np.where(leaf, -2, nodes["feature_idx"])
+            threshold[i, :n] = nodes["num_threshold"]
+            left[i, :n]      = np.where(leaf, -1, nodes["left"])
+            right[i, :n]     = np.where(leaf, -1, nodes["right"])
+            value[i, :n]     = nodes["value"]
+
+        return cls(feature, threshold, left, right, value,
+                   np.ravel(est._baseline_prediction)[0], est.n_features_in_,
+                   getattr(est, "feature_names_in_", None), float32_inputs=False)
+
+    @classmethod
+    def stack(cls, ensembles: List["FlatEnsemble"], names: List[str]) -> "FlatEnsemble":
+        """One ensemble holding `ensembles` as heads; `predict` gives the first."""
+        first = ensembles[0]
+        if any(e.n_features != first.n_features or e.float32_inputs != first.float32_inputs
+               for e in ensembles):
+            raise ValueError("Stacked ensembles must share their inputs")
+        width = max(e.feature.shape[1] for e in ensembles)
+        arrays = [np.concatenate([np.pad(getattr(e, name), ((0, 0), (0, width - e.feature.shape[1])),
+                                         constant_values=fill) for e in ensembles])
+                  for name, fill in zip(cls.arrays, cls.fills)]
+        offsets = np.cumsum([0] + [len(e.feature) for e in ensembles])
+        return cls(*arrays, init=first.init, n_features=first.n_features,
+                   feature_names=first.feature_names, float32_inputs=first.float32_inputs,
+                   heads=(names, offsets, [e.init for e in ensembles]))
+
+    # --- Artifacts: a directory of .npy files (what train_model.py writes) ---
+    # --- holds the compiled tables too, so loading is a memory map with no ---
+    # --- compile step, and every worker process on a host shares one copy of ---
+    # --- the pages through the OS page cache. A single .npz is also accepted ---
+    FORMAT = 1
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        if path.suffix == ".npz":
+            if self.head_names is not None:
+                raise ValueError("Stacked ensembles are only saved as directories")
+            extra = {}
+            if self.feature_names is not None:
+                extra["feature_names"] = np.array(self.feature_names)
+            np.savez(path, init=self.init, n_features=self.n_features,
+                     float32_inputs=self.float32_inputs, **extra,
+                     **{name: getattr(self, name) for name in self.arrays})
+            return
+
+        arrays = {name: getattr(self, name) for name in self.arrays}
+        thresholds = [t for t, _ in self._tables]
+        arrays["table_offsets"]    = np.cumsum([0] + [len(t) for t in thresholds])
+        arrays["table_thresholds"] = np.concatenate(thresholds)
+        arrays["table_masks"]      = np.concatenate([m for _, m in self._tables])
+        arrays["leaf_values"]      = self._leaf_values
+        if self._value_table is not None:
+            arrays["value_table"] = self._value_table
+        meta = {"format": self.FORMAT, "init": self.init, "n_features": self.n_features,
+                "feature_names": self.feature_names,
+                "float32_inputs": self.float32_inputs}
+        if self.head_names is not None:
+            meta["heads"] = {"names": self.head_names,
+                             "offsets": self.head_offsets.tolist(),
+                             "inits": self.head_inits.tolist()}
+
+        # write-then-rename, like the data stores
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, a in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(a))
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [getattr(self, name) for name in self.arrays]
+        arrays += [a for table in self._tables for a in table]
+        arrays.append(self._leaf_values)
+        if self._value_table is not None:
+            arrays.append(self._value_table)
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "FlatEnsemble":
+        path = Path(path)
+        if path.is_dir():
+            return cls._load_dir(path, mmap)
+        with np.load(path) as f:
+            names = f["feature_names"] if "feature_names" in f.files else None
+            float32 = bool(f["float32_inputs"]) if "float32_inputs" in f.files else True
+            return cls(*(f[name] for name in cls.arrays),
+                       init=f["init"], n_features=f["n_features"],
+                       feature_names=names, float32_inputs=float32)
+
+    @classmethod
+    def _load_dir(cls, path: Path, mmap: bool) -> "FlatEnsemble":
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        if meta["format"] != cls.FORMAT:
+            raise ValueError(f"Unsupported flat model format {meta['format']} in {path}")
+        # plain ndarray views of the mapping: np.memmap's subclass hooks
+        # cost more than the lookups themselves on single rows
+        load = lambda name: np.asarray(np.load(path / f"{name}.npy",
+                                               mmap_mode="r" if mmap else None))
+        offsets, thresholds, masks = (load("table_offsets"), load("table_thresholds"),
+                                      load("table_masks"))
+        # feature f's table has one more mask row than it has thresholds
+        tables = [(thresholds[lo:hi], masks[lo + f:hi + f + 1])
+                  for f, (lo, hi) in enumerate(zip(offsets[:-1], offsets[1:]))]
+        value_table = load("value_table") if (path / "value_table.npy").exists() else None
+        heads = meta.get("heads")
+        return cls(*(load(name) for name in cls.arrays), init=meta["init"],
+                   n_features=meta["n_features"], feature_names=meta["feature_names"],
+                   float32_inputs=meta["float32_inputs"],
+                   compiled=(tables, load("leaf_values"), value_table),
+                   heads=heads and (heads["names"], heads["offsets"], heads["inits"]))
+
+    def _compile(self) -> None:
+        n_trees = len(self.feature)
+        leaf_values = []
+        nodes = []          # (feature, threshold, tree, mask of left-subtree leaves)
+        for t in range(n_trees):
+            left, right = self.left[t], self.right[t]
+            leaves = []
+            def walk(node):
+                if left[node] == -1:
+                    leaves.append(self.value[t, node])
+                    return len(leaves) - 1, len(leaves) - 1
+                lo, mid = walk(left[node])
+                _, hi = walk(right[node])
+                nodes.append((self.feature[t, node], self.threshold[t, node],
+                              t, ((1 << (mid + 1)) - 1) ^ ((1 << lo) - 1)))
+                return lo, hi
+            walk(0)
+            leaf_values.append(leaves)
+
+        n_leaves = max(len(v) for v in leaf_values)
+        width = next((w for w in (8, 16, 32, 64) if n_leaves <= w), None)
+        if width is None:
+            raise ValueError("Trees with more than 64 leaves cannot be compiled")
+        dtype = np.dtype(f"uint{width}")
+        full = (1 << width) - 1
+
+        self._leaf_values = np.zeros((n_trees, n_leaves))
+        for t, leaves in enumerate(leaf_values):
+            self._leaf_values[t, :len(leaves)] = leaves
+
+        # per feature: sorted thresholds, and row k = masks after the first k fail
+        self._tables = []
+        for f in range(self.n_features):
+            sel = sorted((n for n in nodes if n[0] == f), key=lambda n: n[1])
+            current = np.full(n_trees, full, dtype=np.uint64)
+            masks = [current.copy()]
+            for _, _, t, mask in sel:
+                current[t] &= np.uint64(~mask & full)
+                masks.append(current.copy())
+            self._tables.append((np.array([n[1] for n in sel], dtype=np.float64),
+                                 np.array(masks).astype(dtype)))
+
+        # with <= 8 leaves, mask -> leaf value is a small direct lookup per tree
+        if width == 8:
+            masks = np.arange(256)
+            low_bit = np.log2(np.maximum(masks & -masks, 1)).astype(np.intp)
+            self._value_table = np.ascontiguousarray(
+                self._leaf_values[:, np.minimum(low_bit, n_leaves - 1)]).ravel()
+        else:
+            self._value_table = None
+
+    def _tree_values(self, X, block_size: int):
+        """Yield (start, (rows, n_trees) exit-leaf values) per block of X."""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        if self.float32_inputs:
+            X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        else:
+            X = np.asarray(X, dtype=np.float64)
+        n_trees, n_leaves = self._leaf_values.shape
+        for start in range(0, len(X), block_size):
+            Xb = X[start:start + block_size]
+            masks = None
+            for f, (thresholds, table) in enumerate(self._tables):
+                rows = table[np.searchsorted(thresholds, Xb[:, f], side="left")]
+                masks = rows if masks is None else masks & rows
+            if self._value_table is not None:
+                values = self._value_table[np.arange(n_trees) * 256 + masks]
+            else:
+                leaf = np.log2(masks & (~masks + 1)).astype(np.intp)
+                values = self._leaf_values.ravel()[np.arange(n_trees) * n_leaves + leaf]
+            yield start, values
+
+    def predict(self, X, block_size: int = 512) -> np.ndarray:
+        out = np.empty(len(X))
+        first = self.head_offsets[1]
+        for start, values in self._tree_values(X, block_size):
+            if first < values.shape[1]:
+                values = values[:, :first]
+            out[start:start + len(values)] = self.init + values.sum(axis=1)
+        return out
+
+    def predict_heads(self, X, block_size: int = 512) -> np.ndarray:
+        """(n, n_heads) predictions of every stacked head, in `head_names` order."""
+        out = np.empty((len(X), len(self.head_inits)))
+        for start, values in self._tree_values(X, block_size):
+            out[start:start + len(values)] = (
+                np.add.reduceat(values, self.head_offsets[:-1], axis=1) + self.head_inits)
+        return out
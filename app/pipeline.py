@@ -0,0 +1,59 @@
+"""
+The scikit-learn side of the model: `FeatureBuilder`, the first step of the
+trained pipeline. Kept out of app.model so that serving a flat export never
+imports sklearn; app.model still resolves the name for pickled pipelines.
+"""
+from typing import List
+
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from app.features import BASE_COLS, FINAL_COLS, LagSpec, add_lag_features
+
+
+# ----- FeatureBuilder-------
+class FeatureBuilder(BaseEstimator, TransformerMixin):
+    """
+    Current readings + calendar fields, and optionally lag / rolling-window
+    temperature features (see app.features.LagSpec). Lag columns already in
+    X are used as they are; otherwise they are computed from X's rows, taken
+    as one site's hourly series.
+    """
+    base_cols  = BASE_COLS
+    final_cols = FINAL_COLS
+    lags    = ()        # class defaults keep pipelines pickled before these
+    windows = ()        # parameters existed loadable
+
+    def __init__(self, lags=(), windows=()):
+        self.lags    = lags
+        self.windows = windows
+
+    @property
+    def lag_spec(self) -> LagSpec:
+        return LagSpec(tuple(self.lags), tuple(self.windows))
+
+    def feature_names(self) -> List[str]:
+        return self.final_cols + self.lag_spec.names
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        spec = self.lag_spec
+        have = [c for c in spec.names if isinstance(X, pd.DataFrame) and c in X]
+        if isinstance(X, pd.DataFrame):
+            df = X[self.base_cols + have].copy()   # one copy, not DataFrame() + copy()
+        else:
+            df = pd.DataFrame(X, columns=self.base_cols)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+        df["hour"]      = df["timestamp"].dt.hour
+        df["weekday"]   = df["timestamp"].dt.weekday
+        df["month"]     = df["timestamp"].dt.month
+        if spec and len(have) < len(spec.names):
+            df = add_lag_features(df, spec)
+        return df[self.feature_names()]
+
+
+# Pickles keep naming it app.model.FeatureBuilder, so artifacts load with
+# older code as well (app.model.__getattr__ resolves it lazily).
+FeatureBuilder.__module__ = "app.model"
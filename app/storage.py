@@ -0,0 +1,312 @@
+"""Table storage shared by the scripts and the API.
+
+Two interchangeable backends keyed by table name (e.g. "DATA_FRAME"):
+
+- CsvStore: ``<root>/<name>.csv``, the original layout;
+- NpyStore: ``<root>/<name>/part-NNNNN/<column>.npy``, typed binary columns
+  loaded with ``mmap_mode="r"``, so timestamps are never re-parsed and a
+  column projection only touches the files it needs. Each append adds a
+  part; ``_schema.json`` records dtypes (and the timezone of tz-aware
+  timestamps).
+
+`get_store()` picks the backend from WEATHER_STORAGE ("csv" by default).
+
+`LiveLog` is the collector's append-only log: one small CSV per day, so
+deduplicating and appending a run never touches older history.
+
+pandas is imported inside the methods that use it: the API imports this
+module (through app.collector) without reading or writing any table.
+"""
+from __future__ import annotations
+
+import os
+import json
+import shutil
+from contextlib import contextmanager
+import numpy as np
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import fcntl
+except ImportError:                       # Windows
+    fcntl = None
+    import msvcrt
+
+STORAGE_BACKEND = os.environ.get("WEATHER_STORAGE", "csv")
+TIME_COLS = ["timestamp"]
+
+
+# ----- CSV -------
+class CsvStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, name: str) -> Path:
+        return self.root / f"{name}.csv"
+
+    def exists(self, name: str) -> bool:
+        return self.path(name).exists()
+
+    def read(self, name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        import pandas as pd
+        parse = [c for c in TIME_COLS if columns is None or c in columns]
+        df = pd.read_csv(self.path(name), usecols=columns, parse_dates=parse)
+        return df if columns is None else df[columns]
+
+    def iter_chunks(self, name: str, chunksize: int,
+                    columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Yield the table in blocks of at most `chunksize` rows."""
+        import pandas as pd
+        parse = [c for c in TIME_COLS if columns is None or c in columns]
+        with pd.read_csv(self.path(name), usecols=columns, parse_dates=parse,
+                         chunksize=chunksize) as reader:
+            for df in reader:
+                yield df if columns is None else df[columns]
+
+    def write(self, name: str, df: pd.DataFrame) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        df.to_csv(self.path(name), index=False)
+
+    def append(self, name: str, df: pd.DataFrame) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.exists(name):
+            import pandas as pd
+            # rows are written positionally under the existing header
+            header = list(pd.read_csv(self.path(name), nrows=0).columns)
+            if list(df.columns) != header:
+                raise ValueError(f"Columns {list(df.columns)} do not match {name}: {header}")
+        df.to_csv(self.path(name), mode="a", header=not self.exists(name), index=False)
+
+
+# ----- NumPy columns -------
+class NpyStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    def exists(self, name: str) -> bool:
+        return (self.path(name) / "_schema.json").exists()
+
+    def _schema(self, name: str) -> Dict[str, Dict[str, str]]:
+        return json.loads((self.path(name) / "_schema.json").read_text(encoding="utf-8"))
+
+    def _parts(self, name: str) -> List[Path]:
+        return sorted(self.path(name).glob("part-*"))
+
+    def read(self, name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        if not self.exists(name):
+            raise FileNotFoundError(self.path(name))
+        schema = self._schema(name)
+        columns = list(schema) if columns is None else columns
+        missing = set(columns) - set(schema)
+        if missing:
+            raise KeyError(f"{name} has no columns {sorted(missing)}")
+
+        parts = self._parts(name)
+        data = {}
+        for col in columns:
+            arrays = [np.load(p / f"{col}.npy", mmap_mode="r") for p in parts]
+            data[col] = (np.concatenate(arrays) if arrays
+                         else np.empty(0, schema[col]["dtype"]))
+        return self._frame(data, schema)
+
+    def iter_chunks(self, name: str, chunksize: int,
+                    columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Yield the table in blocks of at most `chunksize` rows, slicing the
+        memory-mapped columns so only one block is ever materialised."""
+        if not self.exists(name):
+            raise FileNotFoundError(self.path(name))
+        schema = self._schema(name)
+        columns = list(schema) if columns is None else columns
+        for part in self._parts(name):
+            arrays = {col: np.load(part / f"{col}.npy", mmap_mode="r") for col in columns}
+            n = len(next(iter(arrays.values()))) if arrays else 0
+            for start in range(0, n, chunksize):
+                yield self._frame({col: np.array(a[start:start + chunksize])
+                                   for col, a in arrays.items()}, schema)
+
+    def _frame(self, data: Dict[str, np.ndarray], schema) -> pd.DataFrame:
+        import pandas as pd
+        for col, values in data.items():
+            tz = schema[col].get("tz")
+            if tz:
+                data[col] = pd.DatetimeIndex(values).tz_localize("UTC").tz_convert(tz)
+        return pd.DataFrame(data, columns=list(data))
+
+    def _columns(self, df: pd.DataFrame):
+        """(schema, arrays) for a DataFrame, with only fixed-width dtypes."""
+        import pandas as pd
+        schema, arrays = {}, {}
+        for col in df.columns:
+            s = df[col]
+            entry = {}
+            if isinstance(s.dtype, pd.DatetimeTZDtype):
+                entry["tz"] = str(s.dtype.tz)
+                values = s.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]")
+            elif s.dtype == object:
+                values = s.to_numpy().astype(str)      # fixed-width unicode, no pickles
+            else:
+                values = s.to_numpy()
+            entry["dtype"] = values.dtype.str
+            schema[col], arrays[col] = entry, values
+        return schema, arrays
+
+    @staticmethod
+    def _cast(where: str, values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+        """`values` as the column's `dtype`; refuses casts that would lose data."""
+        if np.can_cast(values.dtype, dtype, "same_kind"):
+            return values.astype(dtype, copy=False)
+        # whole-number floats (e.g. an int column read back from a CSV) are fine
+        if (dtype.kind in "iu" and values.dtype.kind == "f"
+                and np.isfinite(values).all() and (values == np.trunc(values)).all()):
+            return values.astype(dtype)
+        raise ValueError(f"Cannot append {values.dtype} values to {where} ({dtype}) "
+                         "without losing data")
+
+    def _write_part(self, table: Path, index: int, arrays) -> None:
+        part = table / f"part-{index:05d}"
+        part.mkdir(parents=True)
+        for col, values in arrays.items():
+            np.save(part / f"{col}.npy", np.ascontiguousarray(values), allow_pickle=False)
+
+    def write(self, name: str, df: pd.DataFrame) -> None:
+        schema, arrays = self._columns(df)
+        final = self.path(name)
+        tmp = final.with_name(final.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        self._write_part(tmp, 0, arrays)
+        (tmp / "_schema.json").write_text(json.dumps(schema), encoding="utf-8")
+
+        old = final.with_name(final.name + ".old")
+        if final.exists():
+            final.rename(old)
+        tmp.rename(final)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def append(self, name: str, df: pd.DataFrame) -> None:
+        if not self.exists(name):
+            return self.write(name, df)
+        schema, arrays = self._columns(df)
+        existing = self._schema(name)
+        if list(schema) != list(existing):
+            raise ValueError(f"Columns {list(schema)} do not match {name}: {list(existing)}")
+        for col, entry in existing.items():
+            if np.dtype(entry["dtype"]).kind == "U":
+                arrays[col] = arrays[col].astype(str)
+            else:
+                arrays[col] = self._cast(f"{name}.{col}", arrays[col], np.dtype(entry["dtype"]))
+        parts = self._parts(name)
+        index = int(parts[-1].name.split("-")[1]) + 1 if parts else 0
+        self._write_part(self.path(name), index, arrays)
+
+
+BACKENDS = {"csv": CsvStore, "npy": NpyStore}
+
+def get_store(root: Path, backend: Optional[str] = None):
+    """Store rooted at `root` for `backend` (default: WEATHER_STORAGE)."""
+    backend = backend or STORAGE_BACKEND
+    try:
+        return BACKENDS[backend](root)
+    except KeyError:
+        raise ValueError(f"Unknown storage backend {backend!r}; "
+                         f"expected one of {sorted(BACKENDS)}") from None
+
+
+# ----- Live observation log -------
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive advisory lock on `path`, held across processes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class LiveLog:
+    """
+    Hourly observations under ``<root>/YYYY-MM-DD.csv``. A write only opens
+    the day partitions its rows fall in (a day holds at most 24 rows), so a
+    run costs the same after years of collection as on day one. Writers
+    serialise on ``<root>/.lock``.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.lock_path = self.root / ".lock"
+
+    def partition(self, day: str) -> Path:
+        return self.root / f"{day}.csv"
+
+    def partitions(self) -> List[Path]:
+        return sorted(self.root.glob("????-??-??.csv"))
+
+    def _read_partition(self, path: Path) -> pd.DataFrame:
+        import pandas as pd
+        df = pd.read_csv(path, float_precision="round_trip")
+        df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+        return df
+
+    def append(self, df: pd.DataFrame, update: bool = False) -> int:
+        """
+        Append rows whose timestamp is not logged yet and return how many
+        were written. With `update`, rows for logged timestamps replace the
+        old values (forecast hours get revised on every fetch); only a day
+        whose values changed is rewritten, and that day is at most 24 rows.
+        """
+        import pandas as pd
+        days = df["timestamp"].dt.strftime("%Y-%m-%d")
+        written = 0
+        with file_lock(self.lock_path):
+            for day, rows in df.groupby(days, sort=True):
+                path = self.partition(day)
+                rows = rows.drop_duplicates(subset="timestamp", keep="last")
+                if not path.exists():
+                    rows.to_csv(path, index=False)
+                    written += len(rows)
+                    continue
+
+                logged = self._read_partition(path)
+                seen = rows["timestamp"].isin(logged["timestamp"])
+                if update and seen.any():
+                    merged = (pd.concat([logged, rows], ignore_index=True)
+                                .drop_duplicates(subset="timestamp", keep="last")
+                                .sort_values("timestamp"))
+                    changed = len(merged.merge(logged, how="left", indicator=True)
+                                        .query("_merge == 'left_only'"))
+                    if changed:
+                        tmp = path.with_suffix(".tmp")
+                        merged.to_csv(tmp, index=False)
+                        os.replace(tmp, path)
+                        written += changed
+                    continue
+                rows = rows[~seen]
+                if len(rows):
+                    rows.to_csv(path, mode="a", header=False, index=False)
+                    written += len(rows)
+        return written
+
+    def read(self, since: Optional[str] = None) -> pd.DataFrame:
+        """All logged rows, or those in partitions from day `since` on."""
+        import pandas as pd
+        parts = [p for p in self.partitions() if since is None or p.stem >= since]
+        if not parts:
+            return pd.DataFrame(columns=["timestamp"])
+        df = pd.concat([self._read_partition(p) for p in parts], ignore_index=True)
+        return df.sort_values("timestamp", ignore_index=True)
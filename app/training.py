@@ -0,0 +1,59 @@
+"""Pure helpers behind the training scripts' decisions.
+
+scripts/train_model.py and scripts/backtest.py parse their arguments and
+run on import, so the rules that decide what they do live here, where they
+can be tested on their own: which rows a warm-started retrain sees, which
+of them it holds out, whether the retrained model may replace the
+published one, and how a backtest cuts history into windows.
+"""
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+HOLDOUT = 0.2         # newest share of the new rows a retrain is judged on
+
+
+def rows_since(df: pd.DataFrame, data_until) -> pd.DataFrame:
+    """The rows strictly after `data_until`, the last timestamp a model was trained on."""
+    return df[df["timestamp"] > pd.Timestamp(data_until)]
+
+
+def holdout_split(rows: pd.DataFrame, holdout: float = HOLDOUT
+                  ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(fit, held out): time-ordered `rows` with the newest `holdout` share held out."""
+    split = int(len(rows) * (1 - holdout))
+    return rows.iloc[:split], rows.iloc[split:]
+
+
+def retrain_accepted(current_mae: float, retrained_mae: float,
+                     tolerance: float = 0.0) -> bool:
+    """Whether a retrained model's held-out MAE is no worse than `tolerance` allows."""
+    return retrained_mae <= current_mae * (1 + tolerance)
+
+
+def backtest_windows(ts: np.ndarray, train_days: int, test_days: int, step_days: int,
+                     expanding: bool = False) -> List[Tuple[int, int, int]]:
+    """
+    (train start, origin, test end) row positions of each rolling-origin
+    window over the sorted timestamps `ts`: train on [start, origin), test
+    on [origin, end). Origins are `step_days` apart, from `train_days`
+    after the first row; with `expanding`, every window trains from row 0.
+    """
+    ts = np.asarray(ts, dtype="datetime64[ns]")
+    if not len(ts):
+        return []
+    train, test = np.timedelta64(train_days, "D"), np.timedelta64(test_days, "D")
+    windows = []
+    for origin in pd.date_range(ts[0] + train, ts[-1], freq=f"{step_days}D").to_numpy():
+        start = ts[0] if expanding else origin - train
+        lo, mid, hi = np.searchsorted(ts, [start, origin, origin + test])
+        if mid > lo and hi > mid:
+            windows.append((int(lo), int(mid), int(hi)))
+    return windows
+
+
+def check_max_mae(mae: float, max_mae: float, what: str = "Backtest") -> None:
+    """Exit with status 1 (SystemExit) when `mae` is above `max_mae`."""
+    if mae > max_mae:
+        raise SystemExit(f"{what} performance unacceptable (MAE {mae:.4f} > {max_mae})")
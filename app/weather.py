@@ -0,0 +1,215 @@
+import os
+import asyncio
+import time
+import httpx
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.cache import TTLCache
+from app.metrics import FORECAST_CACHE, UPSTREAM_FAILURES, UPSTREAM_SECONDS
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+HOURLY_VARS  = "temperature_2m,relative_humidity_2m,pressure_msl,wind_speed_10m"
+
+# --- How long one forecast payload is reused. Every hour of its window is ---
+# --- served from it, so this (not the request rate) sets upstream traffic ---
+REFRESH_SECONDS = float(os.environ.get("WEATHER_FORECAST_REFRESH_S", "3600"))
+
+
+class ForecastWindowError(LookupError):
+    """The requested hour is not part of the cached forecast."""
+
+
+def hour_bucket(now: Optional[float] = None, seconds: float = 3600) -> int:
+    """Index of the `seconds`-long UTC window `now` falls in; Open-Meteo updates hourly."""
+    return int((time.time() if now is None else now) // seconds)
+
+
+def hourly_rows(hourly: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Turn Open-Meteo's column-wise `hourly` block into raw model rows."""
+    return [
+        {
+            "timestamp":   datetime.fromisoformat(ts),
+            "temperature": temp,
+            "humidity":    hum,
+            "pressure":    pres,
+            "wind_speed":  wind
+        }
+        for ts, temp, hum, pres, wind in zip(
+            hourly["time"], hourly["temperature_2m"],
+            hourly["relative_humidity_2m"], hourly["pressure_msl"],
+            hourly["wind_speed_10m"])
+    ]
+
+
+def history_days(history: int) -> int:
+    """Past days to request so that `history` hours precede today's first hour."""
+    return -(-history // 24)
+
+
+def select_window(rows: List[Dict[str, Any]], at: Optional[datetime] = None,
+                  history: int = 0, past_days: int = 0) -> List[Dict[str, Any]]:
+    """
+    The hour `at` of `rows` (a forecast fetched with `past_days`), or the
+    first hour of today, with up to `history` preceding hours, oldest first.
+    """
+    today = rows[0]["timestamp"].date() + timedelta(days=past_days)
+    if at is None:
+        # the first hour of today, as without past days
+        i = next((i for i, row in enumerate(rows)
+                  if row["timestamp"].date() >= today), 0)
+    else:
+        if at.tzinfo is not None:
+            raise ValueError("`at` must be naive site-local time (see Location.local_time)")
+        at = at.replace(minute=0, second=0, microsecond=0)
+        i = next((i for i, row in enumerate(rows) if row["timestamp"] == at), None)
+        if i is None:
+            raise ForecastWindowError(f"{at} is outside the forecast window "
+                           f"{rows[0]['timestamp']} .. {rows[-1]['timestamp']}")
+    return rows[max(i - history, 0):i + 1]
+
+
+# ----- WeatherClient -------
+class WeatherClient:
+    """
+    Async Open-Meteo forecast client.
+
+    - one pooled `httpx.AsyncClient` per event loop, so keep-alive
+      connections are reused across requests; it is closed by `aclose`, on
+      a switch to another loop, or when its loop shuts down;
+    - responses cached per (location, `refresh`-second bucket), and every
+      hour of a cached forecast can be looked up with `observation`;
+    - concurrent misses for the same key share a single upstream call.
+    """
+
+    def __init__(self, url: str = FORECAST_URL, timeout: float = 10.0,
+                 refresh: float = REFRESH_SECONDS, max_connections: int = 20,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url        = url
+        self.refresh    = refresh
+        self._timeout   = timeout
+        self._limits    = httpx.Limits(max_connections=max_connections,
+                                       max_keepalive_connections=max_connections)
+        self._transport = transport
+        self._cache     = TTLCache(maxsize=1024, ttl=refresh)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._closer: Optional[asyncio.Task] = None
+        self.upstream_calls = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Pools (and in-flight futures) belong to the loop that made them,
+            # and their connections can only be closed there.
+            self._release()
+            self._client = httpx.AsyncClient(timeout=self._timeout,
+                                             limits=self._limits,
+                                             transport=self._transport)
+            self._loop = loop
+            self._inflight = {}
+            # asyncio.run / uvicorn cancel the tasks left at shutdown
+            self._closer = loop.create_task(_close_when_cancelled(self._client))
+        return self._client
+
+    def _release(self) -> None:
+        """Have the current client closed on its own loop, if that is still open."""
+        if self._closer is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._closer.cancel)
+        self._client = self._closer = None
+
+    async def hourly(self, latitude: float, longitude: float,
+                     forecast_days: int = 1, past_days: int = 0) -> Dict[str, Any]:
+        """
+        Return the `hourly` block of the forecast for one location, starting
+        `past_days` days before today.
+        """
+        key = (latitude, longitude, forecast_days, past_days,
+               hour_bucket(seconds=self.refresh))
+        cached = self._cache.get(key)
+        if cached is not None:
+            FORECAST_CACHE.labels("hit").inc()
+            return cached
+
+        http = self._http()
+        task = self._inflight.get(key)
+        if task is None:
+            FORECAST_CACHE.labels("miss").inc()
+            task = asyncio.ensure_future(self._fetch(http, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            FORECAST_CACHE.labels("coalesced").inc()
+        # shield: one caller giving up must not cancel everyone's fetch
+        return await asyncio.shield(task)
+
+    async def observation(self, latitude: float, longitude: float,
+                          at: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        One raw model row from the cached forecast: the hour `at` (site-local
+        time, as Open-Meteo returns it) or, by default, the first hour.
+        Raises ForecastWindowError when `at` is outside the forecast window.
+        """
+        return (await self.window(latitude, longitude, at))[-1]
+
+    async def window(self, latitude: float, longitude: float,
+                     at: Optional[datetime] = None,
+                     history: int = 0) -> List[Dict[str, Any]]:
+        """
+        Like `observation`, but returned together with up to `history`
+        preceding hours (oldest first); past days are requested from
+        Open-Meteo when today's forecast does not reach back far enough.
+        """
+        past_days = history_days(history)
+        rows = hourly_rows(await self.hourly(latitude, longitude, past_days=past_days))
+        return select_window(rows, at, history, past_days)
+
+    async def fetch(self, latitude: float, longitude: float,
+                    forecast_days: int = 1, past_days: int = 0) -> Dict[str, Any]:
+        """Like `hourly`, but always fetched from upstream (the cache is updated)."""
+        key = (latitude, longitude, forecast_days, past_days,
+               hour_bucket(seconds=self.refresh))
+        return await self._fetch(self._http(), key)
+
+    async def _fetch(self, http: httpx.AsyncClient, key: tuple) -> Dict[str, Any]:
+        latitude, longitude, forecast_days, past_days, _ = key
+        self.upstream_calls += 1
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "hourly": HOURLY_VARS,
+            "timezone": "auto",
+            "forecast_days": forecast_days
+        }
+        if past_days:
+            params["past_days"] = past_days
+        started = time.perf_counter()
+        try:
+            resp = await http.get(self.url, params=params)
+            resp.raise_for_status()
+            hourly = resp.json()["hourly"]
+        except Exception:
+            UPSTREAM_FAILURES.inc()
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started)
+        self._cache.set(key, hourly)
+        return hourly
+
+    async def aclose(self) -> None:
+        if self._client is None:
+            return
+        if self._loop is not asyncio.get_running_loop():
+            return self._release()
+        client, closer = self._client, self._closer
+        self._client = self._closer = None
+        closer.cancel()
+        await client.aclose()
+
+
+async def _close_when_cancelled(client: httpx.AsyncClient) -> None:
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.aclose()            # a no-op when already closed
@@ -0,0 +1,66 @@
+"""`/predict-live` end to end, in process, with Open-Meteo stubbed out."""
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+import app.main as main_mod
+from app.weather import WeatherClient
+from benchmarks.common import benchmark, prediction_cache, result
+
+HOURLY = {
+    "time":                 [f"2025-07-03T{h:02d}:00" for h in range(24)],
+    "temperature_2m":       [25 + h / 4 for h in range(24)],
+    "relative_humidity_2m": [70] * 24,
+    "pressure_msl":         [1010] * 24,
+    "wind_speed_10m":       [12] * 24,
+}
+
+
+async def _load(requests: int, concurrency: int, upstream_delay: float):
+    async def open_meteo(request):
+        if upstream_delay:
+            await asyncio.sleep(upstream_delay)
+        return httpx.Response(200, json={"hourly": HOURLY})
+
+    main_mod.weather_client = WeatherClient(transport=httpx.MockTransport(open_meteo))
+    latencies = []
+    transport = httpx.ASGITransport(app=main_mod.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                resp = await client.get("/predict-live",
+                                        params={"at": f"2025-07-03T{i % 24:02d}:00"})
+                latencies.append(time.perf_counter() - t0)
+                resp.raise_for_status()
+
+        await one(0)                             # model load, first upstream call
+        latencies.clear()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - t0
+    await main_mod.weather_client.aclose()
+    return np.array(latencies), wall
+
+
+@benchmark("predict_live")
+def bench_predict_live(quick: bool):
+    original = main_mod.weather_client
+    out = []
+    try:
+        for concurrency in (1, 16) if quick else (1, 16, 64):
+            requests = 200 if quick else 1000
+            # 24 distinct hours: with the cache on this would time its hits
+            with prediction_cache(False):
+                latencies, wall = asyncio.run(_load(requests, concurrency,
+                                                    upstream_delay=0.05))
+            record = result("predict_live", latencies, concurrency=concurrency)
+            record["requests_per_s"] = requests / wall
+            out.append(record)
+    finally:
+        main_mod.weather_client = original
+    return out
@@ -0,0 +1,60 @@
+"""Data pipeline: loading the raw table and feature engineering, at 1x/10x/100x."""
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.features import TargetShifter, engineer_chunks
+from app.storage import get_store
+from benchmarks.common import benchmark, measure, result
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+RAW_CSV  = ROOT_DIR / "data" / "historical_weather_hyd.csv"
+
+
+def base_table() -> pd.DataFrame:
+    """The real history when it is there, otherwise two years of synthetic hours."""
+    if RAW_CSV.exists():
+        return pd.read_csv(RAW_CSV, parse_dates=["timestamp"])
+    n = 2 * 365 * 24
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "timestamp":   pd.date_range("2023-05-01", periods=n, freq="h"),
+        "temperature": rng.normal(26, 4, n).round(1),
+        "humidity":    rng.integers(20, 100, n),
+        "pressure":    rng.normal(1008, 4, n).round(1),
+        "wind_speed":  rng.uniform(0, 30, n).round(1),
+    })
+
+
+def scaled(df: pd.DataFrame, factor: int) -> pd.DataFrame:
+    """`factor` copies of the table, one after another in time."""
+    span = df["timestamp"].iloc[-1] - df["timestamp"].iloc[0] + pd.Timedelta("1h")
+    return pd.concat([df.assign(timestamp=df["timestamp"] + i * span)
+                      for i in range(factor)], ignore_index=True)
+
+
+@benchmark("data")
+def bench_data(quick: bool):
+    base = base_table()
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in (1, 10) if quick else (1, 10, 100):
+            df = scaled(base, factor)
+            repeat = 5 if factor < 100 else 2
+            for backend in ("csv", "npy"):
+                store = get_store(Path(tmp) / backend, backend)
+                store.write("raw", df)
+                out.append(result("load", measure(lambda: store.read("raw"),
+                                                  repeat=repeat, number=1),
+                                  rows=len(df), backend=backend, scale=factor))
+
+            store = get_store(Path(tmp) / "csv", "csv")
+            def engineer():
+                chunks = store.iter_chunks("raw", 200_000)
+                for i, block in enumerate(engineer_chunks(chunks, TargetShifter())):
+                    (store.write if i == 0 else store.append)("engineered", block)
+            out.append(result("feature_engineer", measure(engineer, repeat=repeat, number=1),
+                              rows=len(df), scale=factor))
+    return out
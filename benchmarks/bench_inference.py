@@ -0,0 +1,52 @@
+"""Model-side hot paths: single rows, batches and FeatureBuilder."""
+import numpy as np
+import pandas as pd
+
+from app.model import (FeatureBuilder, load_estimator, predict_row, predict_row_fast,
+                       predict_rows)
+from benchmarks.common import benchmark, measure, prediction_cache, result
+
+
+def make_rows(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range("2025-01-01", periods=n, freq="h")
+    return [{"timestamp": ts.isoformat(), "temperature": float(t), "humidity": float(h),
+             "pressure": float(p), "wind_speed": float(w)}
+            for ts, t, h, p, w in zip(stamps, rng.normal(26, 4, n), rng.uniform(20, 100, n),
+                                      rng.normal(1008, 4, n), rng.uniform(0, 30, n))]
+
+
+@benchmark("predict_row")
+def bench_single_row(quick: bool):
+    row = make_rows(1)[0]
+    load_estimator()                         # not part of the measurement
+    with prediction_cache(False):
+        out = [
+            result("predict_row", measure(lambda: predict_row(row)), path="pipeline"),
+            result("predict_row", measure(lambda: predict_row_fast(row)), path="fast"),
+        ]
+    with prediction_cache(True):             # the same row again: a cache hit
+        out.append(result("predict_row", measure(lambda: predict_row_fast(row)),
+                          path="fast_cached"))
+    return out
+
+
+@benchmark("predict_rows")
+def bench_batches(quick: bool):
+    out = []
+    for n in (1, 64, 1024) if quick else (1, 64, 1024, 16384):
+        rows = make_rows(n)
+        out.append(result("predict_rows", measure(lambda: predict_rows(rows)),
+                          rows=n, n=n))
+    return out
+
+
+@benchmark("feature_builder")
+def bench_feature_builder(quick: bool):
+    out = []
+    for n in (1, 100, 10_000) if quick else (1, 100, 10_000, 100_000):
+        df = pd.DataFrame(make_rows(n))
+        builder = FeatureBuilder()
+        out.append(result("FeatureBuilder.transform",
+                          measure(lambda: builder.transform(df)), rows=n, n=n))
+    return out
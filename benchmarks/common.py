@@ -0,0 +1,116 @@
+"""Shared timing helpers and the benchmark registry used by run.py."""
+import gc
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """Register `fn(quick) -> list of result dicts` under `name`."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def measure(fn: Callable[[], object], repeat: int = 7, number: Optional[int] = None,
+            budget: float = 0.2) -> np.ndarray:
+    """
+    Seconds per call of `fn`: `repeat` samples of `number` calls each, where
+    `number` (if not given) is grown until one sample takes ~`budget` seconds.
+    Garbage collection is off while timing, as in `timeit`.
+    """
+    fn()                                          # warm caches / lazy loads
+    if number is None:
+        number = 1
+        while True:
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - t0 >= budget / 10 or number >= 1 << 20:
+                break
+            number *= 2
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - t0) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return np.array(samples)
+
+
+@contextmanager
+def prediction_cache(enabled: bool):
+    """
+    Run with the default site's single-row prediction cache on or off.
+    Repeating one row would otherwise time cache hits, not inference. The
+    cross-worker SQLite cache is off either way.
+    """
+    import app.model as model_mod
+    from app.cache import TTLCache
+    est = model_mod.load_estimator()
+    saved = est.prediction_cache, model_mod._shared_predictions
+    est.prediction_cache = (saved[0] or TTLCache(4096)) if enabled else None
+    model_mod._shared_predictions = None
+    try:
+        yield
+    finally:
+        est.prediction_cache, model_mod._shared_predictions = saved
+
+
+def result(name: str, seconds: np.ndarray, unit: str = "s", rows: int = 1,
+           **params) -> dict:
+    """
+    One record for the results file. `value` is the median seconds per call
+    (the number compared across commits); with `rows`, throughput is added.
+    """
+    seconds = np.asarray(seconds, dtype=float)
+    median = float(np.median(seconds))
+    record = {
+        "name":   name,
+        "params": params,
+        "unit":   unit,
+        "value":  median,
+        "min":    float(seconds.min()),
+        "p95":    float(np.percentile(seconds, 95)),
+        "samples": len(seconds),
+    }
+    if rows > 1:
+        record["rows_per_s"] = rows / median
+    return record
+
+
+def key(record: dict) -> str:
+    """Stable identifier of a record across runs, e.g. `predict_rows[n=1024]`."""
+    params = ",".join(f"{k}={v}" for k, v in sorted(record["params"].items()))
+    return f"{record['name']}[{params}]" if params else record["name"]
+
+
+def format_seconds(s: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if s >= scale:
+            return f"{s / scale:.3g} {unit}"
+    return f"{s / 1e-9:.3g} ns"
+
+
+def table(records: List[dict]) -> str:
+    lines = []
+    for r in records:
+        extra = ""
+        if "rows_per_s" in r:
+            extra = f"  ({r['rows_per_s']:,.0f} rows/s)"
+        elif "requests_per_s" in r:
+            extra = f"  ({r['requests_per_s']:,.0f} requests/s)"
+        lines.append(f"{key(r):<48} {format_seconds(r['value']):>10}  "
+                     f"p95 {format_seconds(r['p95']):>10}{extra}")
+    return "\n".join(lines)
@@ -0,0 +1,122 @@
+"""Run the benchmark suite and store the results for the current commit.
+
+Results go to benchmarks/results/<commit>.json (with a "-dirty" suffix when
+the tree has uncommitted changes). `--compare <commit or file>` prints the
+change against an earlier run and exits 1 when anything got slower than
+`--threshold` times its old median.
+
+    python benchmarks/run.py                    # everything
+    python benchmarks/run.py --quick -k predict # smaller sizes, a subset
+    python benchmarks/run.py --compare 939be3e
+"""
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))              # for app.* and benchmarks.*
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks.common import BENCHMARKS, format_seconds, key, table
+import benchmarks.bench_inference  # noqa: F401  (registers benchmarks)
+import benchmarks.bench_api        # noqa: F401
+import benchmarks.bench_data       # noqa: F401
+
+RESULTS_DIR = ROOT_DIR / "benchmarks" / "results"
+
+
+def git(*cmd: str) -> str:
+    try:
+        return subprocess.run(["git", *cmd], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def commit_id() -> str:
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    # untracked local artifacts (data/, model/, logs/) do not count as changes
+    dirty = git("status", "--porcelain", "--untracked-files=no")
+    return f"{commit}-dirty" if dirty else commit
+
+
+def load_results(ref: str) -> dict:
+    path = Path(ref)
+    if not path.exists():
+        path = RESULTS_DIR / f"{ref}.json"
+    if not path.exists():
+        path = RESULTS_DIR / f"{git('rev-parse', '--short', ref) or ref}.json"
+    if not path.exists():
+        raise SystemExit(f"No stored results for {ref} in {RESULTS_DIR}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """Print old vs new medians; True when nothing regressed past `threshold`."""
+    before = {key(r): r for r in old["results"]}
+    ok = True
+    print(f"\nCompared with {old['commit']}:")
+    for r in new["results"]:
+        prev = before.get(key(r))
+        if prev is None:
+            continue
+        ratio = r["value"] / prev["value"]
+        flag = ""
+        if ratio > threshold:
+            flag, ok = "  <-- slower", False
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(f"{key(r):<48} {format_seconds(prev['value']):>10} -> "
+              f"{format_seconds(r['value']):>10}  x{ratio:.2f}{flag}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="select", default="",
+                        help="only benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, fewer requests")
+    parser.add_argument("--compare", help="commit or results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slowdown ratio that counts as a regression")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    records = []
+    for name, fn in BENCHMARKS.items():
+        if args.select in name:
+            print(f"--- {name}", flush=True)
+            got = fn(args.quick)
+            print(table(got), flush=True)
+            records.extend(got)
+
+    run = {
+        "commit":  commit_id(),
+        "date":    datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "quick":   args.quick,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor(), "numpy": np.__version__,
+                    "pandas": pd.__version__, "sklearn": sklearn.__version__},
+        "results": records,
+    }
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{run['commit']}.json"
+        path.write_text(json.dumps(run, indent=2), encoding="utf-8")
+        print(f"\nSaved {len(records)} results to {path}")
+
+    if args.compare:
+        return 0 if compare(load_results(args.compare), run, args.threshold) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
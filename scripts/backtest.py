@@ -0,0 +1,154 @@
+"""Rolling-origin backtest of the published model's configuration.
+
+History is cut into windows: train on the `--train-days` before an origin,
+predict the `--test-days` after it, move the origin by `--step-days`. Every
+window refits a fresh clone of the current pipeline (same backend,
+hyperparameters and history features), windows run in parallel worker
+processes, and the out-of-sample errors of all windows are aggregated in one
+vectorised pass per window, hour of day and month.
+"""
+
+import sys
+import argparse
+import logging
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from joblib import Parallel, delayed
+from sklearn.base import clone
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))            # for app.model
+
+from app.features import add_lag_features
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.model import current_version, model_paths
+from app.storage import get_store
+from app.training import backtest_windows, check_max_mae
+
+parser = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+parser.add_argument("--train-days", type=int, default=365)
+parser.add_argument("--test-days", type=int, default=30)
+parser.add_argument("--step-days", type=int, default=30)
+parser.add_argument("--expanding", action="store_true",
+                    help="train on all history before each origin, not a fixed span")
+parser.add_argument("--jobs", type=int, default=-1,
+                    help="worker processes, one window each at a time (-1: all cores)")
+parser.add_argument("--max-mae", type=float, default=0.6,
+                    help="fail (exit 1) when the overall out-of-sample MAE is above this")
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+
+DATA_DIR   = location_dir(ROOT_DIR / "data", LOCATION.name)
+REPORT_DIR = ROOT_DIR / "reports" / LOCATION.name
+LOG_DIR    = ROOT_DIR / "logs"
+LOG_FILE   = LOG_DIR / "backtest.log"
+DATA_TABLE = "DATA_FRAME"
+RAW_COLS   = ["timestamp", "temperature", "humidity", "pressure", "wind_speed"]
+TARGET     = "temp_next_hour"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+REPORT_DIR.mkdir(parents=True, exist_ok=True)
+
+logging.basicConfig(
+    filename=str(LOG_FILE),
+    filemode="a",
+    level=logging.INFO,
+    encoding="utf-8",
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
+logger.info("Starting backtest.py for %s", LOCATION.name)
+
+
+# --- Model and data ---
+MODEL_PATH, _ = model_paths(LOCATION.name)
+template = joblib.load(MODEL_PATH)
+spec = template.named_steps["feat"].lag_spec
+
+df = get_store(DATA_DIR).read(DATA_TABLE, columns=RAW_COLS + [TARGET])
+if spec:
+    # computed once over the whole history, so each window's first rows have theirs
+    df = add_lag_features(df, spec).dropna(subset=spec.names)
+cols = RAW_COLS + spec.names
+logger.info("Backtesting %s (version %s) on %d rows",
+            type(template.named_steps["model"]).__name__,
+            current_version(LOCATION.name), len(df))
+
+
+# --- Windows: (train start, origin, test end) as row positions ---
+ts = df["timestamp"].to_numpy()
+windows = backtest_windows(ts, args.train_days, args.test_days, args.step_days,
+                           expanding=args.expanding)
+if not windows:
+    raise SystemExit("History too short for one window; lower --train-days")
+
+
+def run_window(train: pd.DataFrame, test: pd.DataFrame) -> np.ndarray:
+    """Fit a fresh clone on one window and return its test predictions."""
+    model = clone(template)
+    model.fit(train[cols], train[TARGET])
+    return model.predict(test[cols])
+
+
+started = time.perf_counter()
+preds = Parallel(n_jobs=args.jobs)(
+    delayed(run_window)(df.iloc[lo:mid], df.iloc[mid:hi]) for lo, mid, hi in windows)
+elapsed = time.perf_counter() - started
+
+
+# --- Vectorised aggregation ---
+# --- All out-of-sample rows go into flat arrays once; each breakdown is ---
+# --- then a handful of bincounts over integer keys, not a Python loop ---
+test_pos = np.concatenate([np.arange(mid, hi) for _, mid, hi in windows])
+window_id = np.repeat(np.arange(len(windows)), [hi - mid for _, mid, hi in windows])
+err = np.concatenate(preds) - df[TARGET].to_numpy()[test_pos]
+stamps = pd.DatetimeIndex(ts[test_pos])
+
+def error_table(keys: np.ndarray, labels) -> pd.DataFrame:
+    n = np.bincount(keys, minlength=len(labels))
+    seen = n > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table = pd.DataFrame({
+            "rows": n,
+            "MAE":  np.bincount(keys, np.abs(err), len(labels)) / n,
+            "RMSE": np.sqrt(np.bincount(keys, err ** 2, len(labels)) / n),
+            "bias": np.bincount(keys, err, len(labels)) / n,
+        }, index=pd.Index(labels, name=None))
+    return table[seen]
+
+by_window = error_table(window_id, [str(pd.Timestamp(ts[mid]).date()) for _, mid, _ in windows])
+by_window.index.name = "origin"
+by_hour = error_table(stamps.hour.to_numpy(), list(range(24)))
+by_hour.index.name = "hour"
+by_month = error_table(stamps.month.to_numpy() - 1, list(range(1, 13)))
+by_month.index.name = "month"
+
+overall_mae  = float(np.abs(err).mean())
+overall_rmse = float(np.sqrt((err ** 2).mean()))
+
+for name, table in (("windows", by_window), ("hours", by_hour), ("months", by_month)):
+    table.to_csv(REPORT_DIR / f"backtest_{name}.csv")
+
+logger.info("%d windows, %d out-of-sample rows in %.1fs: MAE %.4f, RMSE %.4f",
+            len(windows), len(err), elapsed, overall_mae, overall_rmse)
+logger.info("Worst window %s (MAE %.4f), worst hour %s, worst month %s",
+            by_window["MAE"].idxmax(), by_window["MAE"].max(),
+            by_hour["MAE"].idxmax(), by_month["MAE"].idxmax())
+
+print(by_window.round(4).to_string())
+print()
+print(f"Windows: {len(windows)}  rows: {len(err)}  time: {elapsed:.1f}s")
+print(f"MAE  : {overall_mae:.4f}")
+print(f"RMSE : {overall_rmse:.4f}")
+print(f"Reports written to {REPORT_DIR}")
+
+# ---------- Acceptance guardrail (like evaluate_model.py) -------------
+if overall_mae > args.max_mae:
+    logger.error("Backtest MAE too high (%.4f) — model rejected", overall_mae)
+check_max_mae(overall_mae, args.max_mae)
+logger.info("Backtest passed")
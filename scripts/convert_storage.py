@@ -0,0 +1,52 @@
+"""Copy every table in a location's data folder from one storage backend
+to another, e.g. the existing CSV files into typed .npy columns:
+
+    python scripts/convert_storage.py --to npy
+    WEATHER_STORAGE=npy python scripts/train_model.py
+"""
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))            # for app.storage
+
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import BACKENDS, get_store
+
+parser = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+parser.add_argument("--from", dest="source", default="csv", choices=sorted(BACKENDS))
+parser.add_argument("--to", dest="target", default="npy", choices=sorted(BACKENDS))
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+
+DATA_DIR = location_dir(ROOT_DIR / "data", LOCATION.name)
+TABLES   = [f"historical_weather_{LOCATION.code}", "DATA_FRAME"]
+LOG_DIR  = ROOT_DIR / "logs"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+logging.basicConfig(
+    filename=str(LOG_DIR / "convert_storage.log"),
+    filemode="a",
+    level=logging.INFO,
+    encoding="utf-8",
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+source = get_store(DATA_DIR, args.source)
+target = get_store(DATA_DIR, args.target)
+
+for table in TABLES:
+    if not source.exists(table):
+        logger.info("Skipping %s: not in %s storage", table, args.source)
+        continue
+    df = source.read(table)
+    target.write(table, df)
+    logger.info("Converted %s (%d rows) to %s", table, len(df), target.path(table))
+    print(f"{table}: {len(df)} rows ----> {target.path(table)}")
@@ -1,10 +1,10 @@
 
 import sys
+import argparse
 import logging
 from pathlib import Path
 
 import joblib
-import pandas as pd
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error, r2_score
 
 
@@ -12,9 +12,21 @@ from sklearn.metrics import mean_absolute_error, root_mean_squared_error, r2_sco
 ROOT_DIR = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT_DIR))            # for app.model.FeatureBuilder
 
+from app.features import add_lag_features
+from app.model import model_paths
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import get_store
 
-DATA_FILE  = ROOT_DIR / "data"  / "DATA_FRAME.csv"
-MODEL_PATH = ROOT_DIR / "model" / "weather_pipeline.pkl"
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+
+
+DATA_DIR   = location_dir(ROOT_DIR / "data", LOCATION.name)
+DATA_TABLE = "DATA_FRAME"
+MODEL_PATH, _ = model_paths(LOCATION.name)     # the published version
 LOG_DIR    = ROOT_DIR / "logs"
 LOG_FILE   = LOG_DIR  / "evaluate_model.log"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -28,19 +40,26 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 logger = logging.getLogger(__name__)
-logger.info("Starting evaluate_model.py")
+logger.info("Starting evaluate_model.py for %s", LOCATION.name)
 
 
 try:
     model = joblib.load(MODEL_PATH)
-    df    = pd.read_csv(DATA_FILE, parse_dates=["timestamp"])
+    df    = get_store(DATA_DIR).read(DATA_TABLE, columns=[
+        "timestamp", "temperature", "humidity", "pressure", "wind_speed",
+        "temp_next_hour"])
     logger.info("Model and data loaded successfully")
 except Exception as e:
     logger.exception("Failed to load model or data")
     raise
 
 
-raw_cols = ["timestamp", "temperature", "humidity", "pressure", "wind_speed"]
+# models trained with history features are scored where the history is complete
+spec = model.named_steps["feat"].lag_spec
+if spec:
+    df = add_lag_features(df, spec).dropna(subset=spec.names)
+
+raw_cols = ["timestamp", "temperature", "humidity", "pressure", "wind_speed"] + spec.names
 X = df[raw_cols]
 y_true = df["temp_next_hour"]
 
@@ -1,14 +1,39 @@
 #---- Importing necessary libraries ----
-import pandas as pd
+import sys
+import argparse
 import logging
 from pathlib import Path
 
 # --- Paths ------
 ROOT_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT_DIR / "data"
+sys.path.append(str(ROOT_DIR))            # for app.locations
+
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import LiveLog, get_store
+from app.features import (LagSpec, LagStreamer, TargetShifter, engineer_chunks,
+                          engineer_incremental, write_watermark)
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+parser.add_argument("--chunksize", type=int, default=200_000,
+                    help="rows held in memory at a time")
+parser.add_argument("--incremental", action="store_true",
+                    help="only engineer live_log rows collected since the last run")
+parser.add_argument("--lags", default="",
+                    help="also add temperature lags, in hours, e.g. 1,2,3,24")
+parser.add_argument("--windows", default="",
+                    help="also add rolling mean/min/max/std over these hours, e.g. 6,24")
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+LAG_SPEC = LagSpec.parse(args.lags, args.windows)
+
+DATA_DIR = location_dir(ROOT_DIR / "data", LOCATION.name)
 LOG_DIR = ROOT_DIR / "logs"
-DATA_FILE = DATA_DIR / "historical_weather_hyd.csv"
-OUTPUT_FILE = DATA_DIR / "DATA_FRAME.csv"
+RAW_TABLE = f"historical_weather_{LOCATION.code}"
+OUTPUT_TABLE = "DATA_FRAME"
+LIVE_LOG = DATA_DIR / "live_log"
+WATERMARK_FILE = DATA_DIR / f"{OUTPUT_TABLE}.watermark.json"
 LOG_FILE = LOG_DIR / "feature_engineer.log"
 
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -24,41 +49,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ---- Loading the Data ----------
-logger.info("Starting feature_engineer.py")
-try:
-    df = pd.read_csv(DATA_FILE, parse_dates=["timestamp"])
-    logger.info("Loaded DataFrame shape: %s", df.shape)
-except Exception as e:
-    logger.exception("Failed to load CSV: %s", e)
-    raise
+# ---- Incremental run: only rows collected since the watermark ----------
+# --- The watermark is the timestamp of the last engineered row; see ---
+# --- app.features.engineer_incremental for which rows a run appends. ---
 
-# ------ Feature Engineering --------
+def run_incremental():
+    logger.info("Starting incremental feature_engineer.py for %s", LOCATION.name)
+    run = engineer_incremental(store, OUTPUT_TABLE, LiveLog(LIVE_LOG), WATERMARK_FILE,
+                               LAG_SPEC, LOCATION.timezone, args.chunksize)
+    if not run.collected:
+        logger.info("No collected rows since %s", run.watermark)
+    elif run.written.empty:
+        logger.info("No new complete hours after %s (%d rows waiting)",
+                    run.watermark, run.collected)
+    else:
+        logger.info("Appended %d rows (%s .. %s) to %s, %d held back or dropped",
+                    len(run.written), run.written["timestamp"].iloc[0],
+                    run.written["timestamp"].iloc[-1], store.path(OUTPUT_TABLE), run.dropped)
 
-logger.info("Creating time-based features...")
-df["hour"] = df["timestamp"].dt.hour
-df["day"] = df["timestamp"].dt.day
-df["month"] = df["timestamp"].dt.month
-df["weekday"] = df["timestamp"].dt.weekday
 
-logger.info("Created time-based features: %s", df.columns.tolist())
+store = get_store(DATA_DIR)
+if args.incremental:
+    run_incremental()
+    sys.exit(0)
+
+# ---- Loading the Data ----------
+logger.info("Starting feature_engineer.py for %s", LOCATION.name)
+if not store.exists(RAW_TABLE):
+    logger.error("Data file %s not found — run fetch_and_save.py first", store.path(RAW_TABLE))
+    raise FileNotFoundError(store.path(RAW_TABLE))
+
+# ------ Feature Engineering --------
+# --- Blocks of --chunksize rows are read, given time features and the ---
+# --- shifted target, and written out before the next block is loaded. ---
+# --- TargetShifter carries each site's last row across block boundaries. ---
 
-# ---- Target Varible -----------
+logger.info("Creating time-based features and target in blocks of %d rows...", args.chunksize)
+shifter = TargetShifter()
+lagger = LagStreamer(LAG_SPEC) if LAG_SPEC else None
+if lagger is not None:
+    logger.info("Adding history features: %s", LAG_SPEC.names)
+rows_out = 0
+last_ts = None
+chunks = store.iter_chunks(RAW_TABLE, args.chunksize)
+for i, df in enumerate(engineer_chunks(chunks, shifter, lagger)):
+    if i == 0:
+        store.write(OUTPUT_TABLE, df)
+        logger.info("Created time-based features: %s", df.columns.tolist())
+    else:
+        store.append(OUTPUT_TABLE, df)
+    rows_out += len(df)
+    if len(df):
+        last_ts = df["timestamp"].iloc[-1]
 
-df["temp_next_hour"] = df["temperature"].shift(-1)
-initial_len = len(df)
-df.dropna(subset=["temp_next_hour"], inplace=True)
-logger.info("Dropped %d rows due to target shift (final shape: %s)", initial_len - len(df), df.shape)
+logger.info("Dropped %d rows due to target shift (final rows: %d)", shifter.dropped, rows_out)
+if lagger is not None:
+    logger.info("Dropped %d rows without a full %d-hour history", lagger.dropped, LAG_SPEC.capacity)
 
 # ---- Inspection of Duplicates -----
 
-duplicates = df.duplicated().sum()
-if duplicates > 0:
-    logger.warning("DataFrame contains %d duplicate rows", duplicates)
+if shifter.unordered > 0:
+    logger.warning("Data contains %d duplicate or out-of-order timestamps", shifter.unordered)
 else:
     logger.info("No duplicate rows detected")
 
 # --- Saving the output DataFrame
 
-df.to_csv(OUTPUT_FILE, index=False)
-logger.info("Engineered DataFrame saved to %s", OUTPUT_FILE)
+if last_ts is not None:
+    # a later --incremental run continues after the last full-run row
+    write_watermark(WATERMARK_FILE, last_ts)
+logger.info("Engineered DataFrame saved to %s", store.path(OUTPUT_TABLE))
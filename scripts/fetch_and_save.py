@@ -1,26 +1,55 @@
+"""Backfill hourly history for one site from the Open-Meteo archive.
+
+The date range is split into chunks that are fetched concurrently. Each
+finished chunk is checkpointed to data/.../backfill_<code>/, so a rerun only
+fetches what is still missing, and the output table is then written one
+chunk at a time instead of from one huge response.
+"""
+
 #  Importing the necessary libraries
-import pandas as pd
+import sys
+import argparse
+import threading
 import requests
 import logging
 from pathlib import Path
-from datetime import datetime
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 #  Config / constants
 
-latitude  = 17.3850 # Latitude of the city Hyderabad
-longitude = 78.4867 # Longitude of the city Hyderabad
-start_date = "2023-05-01"
-end_date   = "2025-06-28" #--- Almost morethan 2 years of data will be fetched
-
 ROOT_DIR = Path(__file__).resolve().parents[1]      # weather-predictor/
+sys.path.append(str(ROOT_DIR))                      # for app.locations
+
+from app.backfill import date_chunks, fetch_chunk, pending_chunks, save_chunks
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import get_store
+
+parser = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+parser.add_argument("--start", default="2023-05-01", help="first day, YYYY-MM-DD")
+parser.add_argument("--end", default="2025-06-28", help="last day, YYYY-MM-DD")
+parser.add_argument("--chunk-days", type=int, default=90)
+parser.add_argument("--workers", type=int, default=4)
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+
+latitude  = LOCATION.latitude
+longitude = LOCATION.longitude
+start_date = args.start
+end_date   = args.end     #--- Defaults: a little more than 2 years of data
+
 LOG_DIR  = ROOT_DIR / "logs"
-DATA_DIR = ROOT_DIR / "data"
+DATA_DIR = location_dir(ROOT_DIR / "data", LOCATION.name)
+CHUNK_DIR = DATA_DIR / f"backfill_{LOCATION.code}"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+CHUNK_DIR.mkdir(parents=True, exist_ok=True)
 
 LOG_FILE   = LOG_DIR / "fetch_and_save.log"
-OUTPUT_CSV = DATA_DIR / "historical_weather_hyd.csv"
+OUTPUT_TABLE = f"historical_weather_{LOCATION.code}"
 
 
 #  Logging setup
@@ -34,47 +63,54 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 logger.info("Starting fetch_and_save.py")
-logger.info("Logger is working. This should appear at the top.")
+
+
+#  Splitting the range into chunks
+
+chunks = date_chunks(date.fromisoformat(start_date), date.fromisoformat(end_date),
+                     args.chunk_days)
 
 
 #  API calling
 
-url = "https://archive-api.open-meteo.com/v1/archive"
-params = {
-    "latitude": latitude,
-    "longitude": longitude,
-    "start_date": start_date,
-    "end_date":   end_date,
-    "hourly": "temperature_2m,relative_humidity_2m,pressure_msl,wind_speed_10m",
-    "timezone": "auto",
-}
-
-try:
-    logger.info(
-        "Fetching weather data for Hyderabad (%.4f, %.4f) from %s to %s",
-        latitude, longitude, start_date, end_date
-    )
-
-    response = requests.get(url, params=params, timeout=10)
-    response.raise_for_status()
-    data = response.json() 
-
-    df = pd.DataFrame({
-        "timestamp":   data["hourly"]["time"],
-        "temperature": data["hourly"]["temperature_2m"],
-        "humidity":    data["hourly"]["relative_humidity_2m"],
-        "pressure":    data["hourly"]["pressure_msl"],
-        "wind_speed":  data["hourly"]["wind_speed_10m"],
-    })
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-
-    
-    #  Saving to the CSV file
-    
-    df.to_csv(OUTPUT_CSV, index=False)
-    logger.info("Saved %d rows to %s", len(df), OUTPUT_CSV)
-    print(f"Saved {len(df)} rows to {OUTPUT_CSV}")
-
-except Exception as e:
-    logger.exception("Failed to fetch or save weather data")
-    print("Error occurred:", str(e))
+_sessions = threading.local()     # one pooled session per worker thread
+
+def fetch(chunk) -> int:
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    return fetch_chunk(session, chunk, latitude, longitude, CHUNK_DIR)
+
+
+pending = pending_chunks(chunks, CHUNK_DIR)
+logger.info(
+    "Fetching weather data for %s (%.4f, %.4f) from %s to %s: %d chunks, %d already done",
+    LOCATION.name, latitude, longitude, start_date, end_date,
+    len(chunks), len(chunks) - len(pending)
+)
+
+failed = []
+with ThreadPoolExecutor(max_workers=args.workers) as pool:
+    futures = {pool.submit(fetch, c): c for c in pending}
+    for future in as_completed(futures):
+        chunk = futures[future]
+        try:
+            logger.info("Saved chunk %s..%s (%d rows)", chunk[0], chunk[1], future.result())
+        except Exception:
+            logger.exception("Chunk %s..%s failed", chunk[0], chunk[1])
+            failed.append(chunk)
+
+if failed:
+    logger.error("%d of %d chunks failed; rerun to resume", len(failed), len(chunks))
+    print(f"Error occurred: {len(failed)} chunks failed, rerun to resume")
+    sys.exit(1)
+
+
+#  Saving to the data store (CSV unless WEATHER_STORAGE says otherwise),
+#  one chunk in memory at a time, each hour once
+
+store = get_store(DATA_DIR)
+total = save_chunks(store, OUTPUT_TABLE, chunks, CHUNK_DIR)
+
+logger.info("Saved %d rows to %s", total, store.path(OUTPUT_TABLE))
+print(f"Saved {total} rows to {store.path(OUTPUT_TABLE)}")
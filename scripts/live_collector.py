@@ -1,24 +1,38 @@
 
 """Fetch the latest hourly weather data from Open‑Meteo and append
-it to data/live_weather.csv. No ML inference happens here.
+it to the day-partitioned log in data/live_log/. No ML inference happens here.
 
-This script is idempotent and safe to schedule (cron / apscheduler).
-The FastAPI service will later consume live_weather.csv ⇢ predict.
+This script is idempotent and safe to schedule (cron / apscheduler), also
+as several concurrent jobs: writers take a file lock, and each run only
+reads the day partition it appends to.
 """
 
 import sys
 import time
+import argparse
 import logging
 import requests
 import pandas as pd
 from pathlib import Path
-from datetime import datetime, timezone
 
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = ROOT_DIR / "data"
+sys.path.append(str(ROOT_DIR))            # for app.locations
+
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import LiveLog, get_store
+from app.weather import hourly_rows
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+
+DATA_DIR = location_dir(ROOT_DIR / "data", LOCATION.name)
 LOG_DIR  = ROOT_DIR / "logs"
-CSV_FILE = DATA_DIR / "live_weather.csv"
+LIVE_LOG = DATA_DIR / "live_log"
+LEGACY_TABLE = "live_weather"      # single-file log written by older versions
 LOG_FILE = LOG_DIR  / "live_collector.log"
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -36,8 +50,8 @@ logger = logging.getLogger(__name__)
 logger.info("⏳ live_collector.py start")
 
 
-LATITUDE  = 17.3850
-LONGITUDE = 78.4867
+LATITUDE  = LOCATION.latitude
+LONGITUDE = LOCATION.longitude
 API_URL   = "https://api.open-meteo.com/v1/forecast"
 API_PARAMS = {
     "latitude": LATITUDE,
@@ -65,28 +79,26 @@ for attempt in range(1, MAX_RETRIES + 1):
         time.sleep(BACKOFF ** attempt)
 
 
-row = {
-    "timestamp":  payload["hourly"]["time"][0],                 # first hour row
-    "temperature": payload["hourly"]["temperature_2m"][0],
-    "humidity":    payload["hourly"]["relative_humidity_2m"][0],
-    "pressure":    payload["hourly"]["pressure_msl"][0],
-    "wind_speed":  payload["hourly"]["wind_speed_10m"][0]
-}
-df_new = pd.DataFrame([row])
+# Keep every hour of the forecast, not just the first one; later runs
+# overwrite an hour's values as its forecast gets revised.
+df_new = pd.DataFrame(hourly_rows(payload["hourly"]))
 df_new["timestamp"] = pd.to_datetime(df_new["timestamp"], utc=True)
 
 
-header_needed = not CSV_FILE.exists()
-df_new.to_csv(CSV_FILE, mode="a", header=header_needed, index=False)
+log = LiveLog(LIVE_LOG)
 
+# One-off move of the old single-file log into day partitions; that log was
+# always a CSV, whatever WEATHER_STORAGE says now
+store = get_store(DATA_DIR, "csv")
+if store.exists(LEGACY_TABLE):
+    migrated = log.append(store.read(LEGACY_TABLE))
+    legacy = store.path(LEGACY_TABLE)
+    legacy.rename(legacy.with_name(legacy.name + ".migrated"))
+    logger.info("Migrated %d rows from %s into %s", migrated, legacy, LIVE_LOG)
 
-df_all = pd.read_csv(CSV_FILE, parse_dates=["timestamp"])
-before = len(df_all)
-df_all.drop_duplicates(subset="timestamp", inplace=True)
-after = len(df_all)
-if after < before:
-    df_all.to_csv(CSV_FILE, index=False)
-    logger.info("Removed %d duplicate rows", before - after)
 
-logger.info("Collected row for %s", df_new["timestamp"].iloc[0])
-print(f"Collected row ----> {CSV_FILE}")
+changed = log.append(df_new, update=True)
+logger.info("Collected %d hours for %s (%s .. %s), %d new or revised",
+            len(df_new), LOCATION.name, df_new["timestamp"].iloc[0],
+            df_new["timestamp"].iloc[-1], changed)
+print(f"Collected {len(df_new)} rows ----> {LIVE_LOG}")
@@ -1,5 +1,6 @@
 #  Importing the necessary  libraries
-import pandas as pd
+import sys
+import argparse
 import logging
 from pathlib import Path
 
@@ -7,13 +8,24 @@ from pathlib import Path
 #---  Naming Necessary Project paths ---------
 
 ROOT_DIR = Path(__file__).resolve().parents[1]      # weather-predictor/
+sys.path.append(str(ROOT_DIR))                      # for app.locations
+
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import get_store
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+
 LOG_DIR  = ROOT_DIR / "logs"
-DATA_DIR = ROOT_DIR / "data"
+DATA_DIR = location_dir(ROOT_DIR / "data", LOCATION.name)
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 LOG_FILE  = LOG_DIR / "load_data.log"
-DATA_FILE = DATA_DIR / "historical_weather_hyd.csv"
+DATA_TABLE = f"historical_weather_{LOCATION.code}"
 
 
 #------  Logging setup-----------
@@ -28,14 +40,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-#----------  Load CSV created by fetch_and_save.py into DataFrame---------------
+#----------  Load data created by fetch_and_save.py into DataFrame---------------
 
-if not DATA_FILE.exists():
-    logger.error("Data file %s not found — run fetch_and_save.py first", DATA_FILE)
-    raise FileNotFoundError(DATA_FILE)
+store = get_store(DATA_DIR)
+if not store.exists(DATA_TABLE):
+    logger.error("Data file %s not found — run fetch_and_save.py first", store.path(DATA_TABLE))
+    raise FileNotFoundError(store.path(DATA_TABLE))
 
-df = pd.read_csv(DATA_FILE, parse_dates=["timestamp"])
-logger.info("CSV loaded — shape: %s", df.shape)
+df = store.read(DATA_TABLE)
+logger.info("Data loaded — shape: %s", df.shape)
 
 
 #--------  Performing Necessary  validation-----------------
@@ -1,29 +1,87 @@
 # scripts/train_model.py
 
 import sys
+import copy
+import json
+import argparse
 import logging
 import joblib
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from datetime import datetime, timezone
 
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.model_selection import cross_val_score
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.model_selection import GridSearchCV, TimeSeriesSplit, cross_val_score
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import mean_absolute_error, root_mean_squared_error, r2_score
+from sklearn.metrics import (mean_absolute_error, mean_pinball_loss,
+                             root_mean_squared_error, r2_score)
 
 # --- Setup project root in path (for app.model import) ---
 ROOT_DIR = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT_DIR))
 
-from app.model import FeatureBuilder  
+from app.model import (FLAT_MODEL_PATH, HORIZON_NAME, HORIZON_PKL, META_NAME,
+                       QUANTILES_NAME, QUANTILES_PKL, FeatureBuilder, FlatEnsemble,
+                       model_paths, new_version_dir, publish_version)
+from app.features import LagSpec, add_lag_features, horizon_targets
+from app.locations import DEFAULT_LOCATION, get_location, location_dir
+from app.storage import get_store
+from app.training import holdout_split, retrain_accepted, rows_since
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--city", default=DEFAULT_LOCATION,
+                    help="site name from config/locations.json")
+parser.add_argument("--lags", default="",
+                    help="temperature lags to train on, in hours, e.g. 1,2,3,24")
+parser.add_argument("--windows", default="",
+                    help="rolling mean/min/max/std windows to train on, in hours")
+parser.add_argument("--model", choices=["gbr", "hgb"], default="gbr",
+                    help="gbr: GradientBoostingRegressor, hgb: the histogram-based, "
+                         "multi-threaded HistGradientBoostingRegressor")
+parser.add_argument("--quantiles", default="",
+                    help="also fit quantile heads, e.g. 0.1,0.5,0.9 (served by "
+                         "/predict-live?quantiles=true)")
+parser.add_argument("--horizon", type=int, default=0,
+                    help="also fit one model per hour up to this many ahead, e.g. 24 "
+                         "(served by /predict-horizon)")
+parser.add_argument("--search", action="store_true",
+                    help="grid-search hyperparameters instead of using the defaults")
+parser.add_argument("--folds", type=int, default=5,
+                    help="time-ordered CV folds (each validates on later data)")
+parser.add_argument("--jobs", type=int, default=-1,
+                    help="worker processes for CV folds / grid candidates (-1: all cores)")
+parser.add_argument("--retrain", action="store_true",
+                    help="add trees to the saved model using only rows newer than "
+                         "the data it was trained on, and keep it only if it is "
+                         "no worse on the newest of those rows")
+parser.add_argument("--add-trees", type=int, default=50,
+                    help="trees (boosting iterations) added by --retrain")
+parser.add_argument("--min-rows", type=int, default=48,
+                    help="new rows needed before --retrain does anything")
+parser.add_argument("--tolerance", type=float, default=0.0,
+                    help="relative MAE increase --retrain still accepts")
+parser.add_argument("--keep-versions", type=int, default=5,
+                    help="model versions kept under model/versions/ for rollback")
+args = parser.parse_args()
+LOCATION = get_location(args.city)
+LAG_SPEC = LagSpec.parse(args.lags, args.windows)
+QUANTILES = sorted(float(q) for q in args.quantiles.split(",") if q.strip())
+if any(not 0 < q < 1 for q in QUANTILES):
+    parser.error("--quantiles must be between 0 and 1")
+if args.horizon == 1 or args.horizon < 0:
+    parser.error("--horizon must be at least 2 (the point model is the first hour)")
 
 # --- Paths ---
-DATA_DIR   = ROOT_DIR / "data"
+DATA_DIR   = location_dir(ROOT_DIR / "data", LOCATION.name)
 LOG_DIR    = ROOT_DIR / "logs"
-MODEL_DIR  = ROOT_DIR / "model"
+MODEL_DIR  = location_dir(ROOT_DIR / "model", LOCATION.name)
 LOG_FILE   = LOG_DIR / "train_model.log"
-DATA_FILE  = DATA_DIR / "DATA_FRAME.csv"
-MODEL_PATH = MODEL_DIR / "weather_pipeline.pkl"
+DATA_TABLE = "DATA_FRAME"
+MODEL_PATH, _ = model_paths(LOCATION.name)      # current version, if any
+META_PATH  = MODEL_PATH.parent / META_NAME
 
 # --- Ensure required directories exist ---
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -38,19 +96,219 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 logger = logging.getLogger(__name__)
-logger.info("Starting train_model.py")
+logger.info("Starting train_model.py for %s", LOCATION.name)
 
 # --- Load Data ---
 try:
-    df = pd.read_csv(DATA_FILE, parse_dates=["timestamp"])
+    df = get_store(DATA_DIR).read(DATA_TABLE, columns=[
+        "timestamp", "temperature", "humidity", "pressure", "wind_speed",
+        "temp_next_hour"])
     logger.info("Data loaded successfully with shape %s", df.shape)
 except Exception as e:
     logger.exception("Failed to load data")
     raise
 
-# --- Prepare Feature Matrix and Target ---
 raw_cols   = ["timestamp", "temperature", "humidity", "pressure", "wind_speed"]
 target_col = "temp_next_hour"
+
+# --- Metrics ---
+def rmse(y_true, y_pred):
+    return root_mean_squared_error(y_true, y_pred)
+
+def score(y_true, y_pred) -> dict:
+    return {
+        "MAE":  mean_absolute_error(y_true, y_pred),
+        "RMSE": rmse(y_true, y_pred),
+        "R2":   r2_score(y_true, y_pred)
+    }
+
+# --- Saving: a new version directory gets the pickle, the flat export ---
+# --- (newer, so app.model sees it as current) and metadata describing what ---
+# --- the model has seen; publishing it then switches the API over ---
+def save_model(pipeline: Pipeline, meta: dict, heads: dict = None,
+               horizon: dict = None) -> None:
+    version, out = new_version_dir(LOCATION.name)
+    joblib.dump(pipeline, out / MODEL_PATH.name)
+    logger.info("Pipeline saved to %s", out / MODEL_PATH.name)
+
+    # memory-mapped by every API worker, so one copy per host
+    flat = FlatEnsemble.from_estimator(pipeline.named_steps["model"])
+    flat.save(out / FLAT_MODEL_PATH.name)
+    logger.info("Flat tree export saved to %s", out / FLAT_MODEL_PATH.name)
+
+    if heads:
+        # one stacked export, so the API scores every head in one pass
+        joblib.dump(heads, out / QUANTILES_PKL)
+        FlatEnsemble.stack([FlatEnsemble.from_estimator(h) for h in heads.values()],
+                           list(heads)).save(out / QUANTILES_NAME)
+        logger.info("Quantile heads %s saved to %s", list(heads), out / QUANTILES_NAME)
+
+    if horizon:
+        # the point model is the first hour ahead; the API gets every hour
+        # from one feature row and one pass over the stacked trees
+        joblib.dump(horizon, out / HORIZON_PKL)
+        FlatEnsemble.stack([flat] + [FlatEnsemble.from_estimator(m) for m in horizon.values()],
+                           ["t+1"] + list(horizon)).save(out / HORIZON_NAME)
+        logger.info("Horizon models t+1..%s saved to %s", list(horizon)[-1], out / HORIZON_NAME)
+
+    model = pipeline.named_steps["model"]
+    meta = {
+        "version":    version,
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "estimator":  type(model).__name__,
+        "n_trees":    len(getattr(model, "_predictors", None) or model.estimators_),
+        "features":   pipeline.named_steps["feat"].feature_names(),
+        **meta,
+    }
+    (out / META_NAME).write_text(json.dumps(meta, indent=2, default=str), encoding="utf-8")
+
+    publish_version(LOCATION.name, version, keep=args.keep_versions)
+    logger.info("Published model version %s in %s", version, MODEL_DIR)
+    print("Published model version", version)
+
+# --- Quantile heads: the point model's estimator refit with a quantile ---
+# --- loss per level, in parallel, on one shared feature matrix ---
+def head_name(q: float) -> str:
+    return f"p{q * 100:g}"
+
+def quantile_estimator(model, q: float):
+    head = clone(model)
+    if isinstance(head, HistGradientBoostingRegressor):
+        return head.set_params(loss="quantile", quantile=q)
+    return head.set_params(loss="quantile", alpha=q)
+
+def fit_heads(heads: dict, X, y) -> dict:
+    """
+    Fit every head in parallel, on `y`, or with `y` a DataFrame on its
+    column of the head's name (rows whose target is missing are skipped).
+    """
+    if isinstance(y, pd.DataFrame):
+        known = {name: y[name].notna().to_numpy() for name in heads}
+        jobs = (delayed(h.fit)(X[known[name]], y[name][known[name]])
+                for name, h in heads.items())
+    else:
+        jobs = (delayed(h.fit)(X, y) for h in heads.values())
+    fitted = Parallel(n_jobs=args.jobs)(jobs)
+    return dict(zip(heads, fitted))
+
+def grow_heads(heads: dict) -> dict:
+    """Set up saved heads to add --add-trees trees on their next fit."""
+    for head in heads.values():
+        head.set_params(warm_start=True, n_estimators=head.n_estimators + args.add_trees)
+    return heads
+
+def head_metrics(heads: dict, X, y) -> dict:
+    """Pinball loss, and the share of rows below each head (ideally its level)."""
+    out = {}
+    for name, head in heads.items():
+        pred = head.predict(X)
+        out[name] = {"pinball": mean_pinball_loss(y, pred, alpha=float(name[1:]) / 100),
+                     "coverage": float(np.mean(y <= pred))}
+    return out
+
+# --- Multi-hour horizon: direct models, one per hour ahead (t+2 .. t+N; ---
+# --- the point model is t+1), each fitted on the same feature matrix to ---
+# --- the temperature that many hours later, so serving never feeds a ---
+# --- prediction back in as the next hour's input ---
+def horizon_frame(df: pd.DataFrame, hours: int) -> pd.DataFrame:
+    """Targets t+2 .. t+`hours` for each row of `df` (NaN where not recorded)."""
+    Y = horizon_targets(df, hours)[:, 1:]
+    return pd.DataFrame(Y, index=df.index, columns=[f"t+{h}" for h in range(2, hours + 1)])
+
+def horizon_mae(models: dict, X, Y: pd.DataFrame) -> dict:
+    out = {}
+    for name, model in models.items():
+        known = Y[name].notna().to_numpy()
+        out[name] = mean_absolute_error(Y[name][known], model.predict(X[known]))
+    return out
+
+# --- Warm-started retrain (GradientBoostingRegressor models) ---
+# --- Only rows after the saved model's `data_until` are used: the newest ---
+# --- fifth is held out, the rest grow the ensemble by --add-trees, and the ---
+# --- result replaces the saved model only if its MAE on the held-out rows ---
+# --- is no worse (within --tolerance) than the current model's ---
+def run_retrain(df: pd.DataFrame) -> None:
+    if not META_PATH.exists():
+        raise SystemExit(f"No metadata at {META_PATH}; run a full training first")
+    meta = json.loads(META_PATH.read_text(encoding="utf-8"))
+    current = joblib.load(MODEL_PATH)
+
+    horizon_path = MODEL_PATH.parent / HORIZON_PKL
+    horizon = joblib.load(horizon_path) if horizon_path.exists() else None
+    if horizon:
+        # from the whole history, so the newest rows' targets are known
+        df = df.join(horizon_frame(df, len(horizon) + 1))
+
+    spec = current.named_steps["feat"].lag_spec
+    if spec:
+        df = add_lag_features(df, spec).dropna(subset=spec.names)
+    new = rows_since(df, meta["data_until"])
+    if len(new) < args.min_rows:
+        logger.info("Only %d rows since %s, nothing to retrain", len(new), meta["data_until"])
+        print(f"Only {len(new)} new rows, nothing to retrain")
+        return
+
+    cols = raw_cols + spec.names
+    fit_rows, hold_rows = holdout_split(new)
+
+    candidate = copy.deepcopy(current)
+    model = candidate.named_steps["model"]
+    if not isinstance(model, GradientBoostingRegressor):
+        # HGB re-bins X on every fit, so its old trees would be scored
+        # against the new rows' bins: warm start only works on the same data
+        raise SystemExit(f"{type(model).__name__} cannot be warm-started on new "
+                         "rows; retrain it in full (--model hgb is fast)")
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + args.add_trees)
+    candidate.fit(fit_rows[cols], fit_rows[target_col])
+
+    before = score(hold_rows[target_col], current.predict(hold_rows[cols]))
+    after  = score(hold_rows[target_col], candidate.predict(hold_rows[cols]))
+    print("Current  :", before)
+    print("Retrained:", after)
+    logger.info("Retrain on %d rows (%d held out): current %s, retrained %s",
+                len(fit_rows), len(hold_rows), before, after)
+
+    if not retrain_accepted(before["MAE"], after["MAE"], args.tolerance):
+        logger.error("Retrained model is worse (MAE %.4f > %.4f) — kept the current one",
+                     after["MAE"], before["MAE"])
+        raise SystemExit("Retrained model rejected")
+
+    X_fit = candidate.named_steps["feat"].transform(fit_rows[cols])
+    heads = None
+    heads_path = MODEL_PATH.parent / QUANTILES_PKL
+    if heads_path.exists():
+        # grown on the same rows, so the bands keep up with the point model
+        heads = fit_heads(grow_heads(joblib.load(heads_path)), X_fit, fit_rows[target_col])
+    if horizon:
+        horizon = fit_heads(grow_heads(horizon), X_fit, fit_rows[list(horizon)])
+
+    save_model(candidate, {
+        "mode":       "warm_start",
+        "data_until": fit_rows["timestamp"].iloc[-1],
+        "rows":       meta.get("rows", 0) + len(fit_rows),
+        "retrains":   meta.get("retrains", 0) + 1,
+        "holdout_metrics": after,
+        **{k: meta[k] for k in ("data_from", "test_metrics", "quantiles", "horizon")
+           if k in meta},
+    }, heads, horizon)
+
+
+if args.retrain:
+    run_retrain(df)
+    sys.exit(0)
+
+# --- Horizon targets, from the whole history before rows are dropped ---
+if args.horizon:
+    df = df.join(horizon_frame(df, args.horizon))
+
+# --- History features: same code as feature_engineer.py and the API, ---
+# --- rows without a full history are left out of training ---
+if LAG_SPEC:
+    df = add_lag_features(df, LAG_SPEC).dropna(subset=LAG_SPEC.names)
+    logger.info("History features %s, %d rows with a full history", LAG_SPEC.names, len(df))
+
+# --- Prepare Feature Matrix and Target ---
+raw_cols   = raw_cols + LAG_SPEC.names
 split_idx  = int(len(df) * 0.8)
 
 X_train_raw = df[raw_cols].iloc[:split_idx]
@@ -59,39 +317,59 @@ y_train     = df[target_col].iloc[:split_idx]
 y_test      = df[target_col].iloc[split_idx:]
 
 # --- Pipeline ---
+# --- Both backends are flattened by FlatEnsemble for the API. The grids ---
+# --- are small on purpose: every candidate is refit once per fold ---
+MODELS = {
+    "gbr": (GradientBoostingRegressor(
+                n_estimators=300,
+                learning_rate=0.05,
+                max_depth=3,
+                random_state=42
+            ),
+            {"n_estimators": [200, 300, 500],
+             "learning_rate": [0.05, 0.1],
+             "max_depth": [3, 4]}),
+    # early stopping would hold out a random (not time-ordered) 10%
+    "hgb": (HistGradientBoostingRegressor(
+                max_iter=300,
+                learning_rate=0.05,
+                early_stopping=False,
+                random_state=42
+            ),
+            {"max_iter": [300, 600],
+             "learning_rate": [0.05, 0.1],
+             "max_leaf_nodes": [15, 31]}),
+}
+estimator, grid = MODELS[args.model]
+
 pipeline = Pipeline([
-    ("feat", FeatureBuilder()),
-    ("model", GradientBoostingRegressor(
-        n_estimators=300,
-        learning_rate=0.05,
-        max_depth=3,
-        random_state=42
-    ))
+    ("feat", FeatureBuilder(lags=LAG_SPEC.lags, windows=LAG_SPEC.windows)),
+    ("model", estimator)
 ])
+cv = TimeSeriesSplit(n_splits=args.folds)
 
 # --- Train ---
-pipeline.fit(X_train_raw, y_train)
-logger.info("Model pipeline trained successfully")
+if args.search:
+    search = GridSearchCV(pipeline, {f"model__{k}": v for k, v in grid.items()},
+                          cv=cv, scoring="r2", n_jobs=args.jobs)
+    search.fit(X_train_raw, y_train)
+    pipeline = search.best_estimator_
+    cv_score = search.best_score_
+    logger.info("Grid search over %d candidates, best %s (CV R² %.5f)",
+                len(search.cv_results_["params"]), search.best_params_, cv_score)
+else:
+    cv_score = cross_val_score(pipeline, X_train_raw, y_train, cv=cv,
+                               scoring="r2", n_jobs=args.jobs).mean()
+    pipeline.fit(X_train_raw, y_train)
+logger.info("Model pipeline (%s) trained successfully", args.model)
 
 # --- Predict ---
 y_train_pred = pipeline.predict(X_train_raw)
 y_test_pred  = pipeline.predict(X_test_raw)
 
 # --- Metrics ---
-def rmse(y_true, y_pred):
-    return root_mean_squared_error(y_true, y_pred)
-
-train_metrics = {
-    "MAE":  mean_absolute_error(y_train, y_train_pred),
-    "RMSE": rmse(y_train, y_train_pred),
-    "R2":   r2_score(y_train, y_train_pred)
-}
-test_metrics = {
-    "MAE":  mean_absolute_error(y_test, y_test_pred),
-    "RMSE": rmse(y_test, y_test_pred),
-    "R2":   r2_score(y_test, y_test_pred)
-}
-cv_score = cross_val_score(pipeline, X_train_raw, y_train, cv=5, scoring="r2").mean()
+train_metrics = score(y_train, y_train_pred)
+test_metrics  = score(y_test, y_test_pred)
 
 # --- Output ---
 print("Train:", train_metrics)
@@ -102,6 +380,39 @@ logger.info("Train Metrics: %s", train_metrics)
 logger.info("Test Metrics: %s", test_metrics)
 logger.info("Cross-validated R²: %.5f", cv_score)
 
+# --- Quantile heads and horizon models share the point model's features ---
+if QUANTILES or args.horizon:
+    feat = pipeline.named_steps["feat"]
+    X_train_feat, X_test_feat = feat.transform(X_train_raw), feat.transform(X_test_raw)
+
+heads = None
+if QUANTILES:
+    heads = fit_heads({head_name(q): quantile_estimator(pipeline.named_steps["model"], q)
+                       for q in QUANTILES}, X_train_feat, y_train)
+    quantile_metrics = head_metrics(heads, X_test_feat, y_test)
+    print("Quantiles:", quantile_metrics)
+    logger.info("Quantile heads on the test split: %s", quantile_metrics)
+
+# --- Horizon models ---
+horizon = None
+if args.horizon:
+    names = [f"t+{h}" for h in range(2, args.horizon + 1)]
+    horizon = fit_heads({name: clone(pipeline.named_steps["model"]) for name in names},
+                        X_train_feat, df[names].iloc[:split_idx])
+    horizon_metrics = {"t+1": test_metrics["MAE"],
+                       **horizon_mae(horizon, X_test_feat, df[names].iloc[split_idx:])}
+    print("Horizon MAE:", {k: round(v, 4) for k, v in horizon_metrics.items()})
+    logger.info("Horizon models' MAE on the test split: %s", horizon_metrics)
+
 # --- Save Model ---
-joblib.dump(pipeline, MODEL_PATH)
-logger.info("Pipeline saved to %s", MODEL_PATH)
+save_model(pipeline, {
+    "mode":       "full",
+    "data_from":  X_train_raw["timestamp"].iloc[0],
+    "data_until": X_train_raw["timestamp"].iloc[-1],
+    "rows":       len(X_train_raw),
+    "retrains":   0,
+    "test_metrics": test_metrics,
+    "cv_r2":      cv_score,
+    **({"quantiles": quantile_metrics} if heads else {}),
+    **({"horizon": horizon_metrics} if horizon else {}),
+}, heads, horizon)
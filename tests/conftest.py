@@ -0,0 +1,21 @@
+import pytest
+
+@pytest.fixture
+def versioned_model(monkeypatch):
+    """
+    A fresh registry that loads the published models tagged as version
+    "v1", in place of app.model.registry (the checked-in model is
+    unversioned, and the forecast table only serves versioned ones).
+    """
+    import app.main as main_mod
+    import app.model as model_mod
+
+    def loader(location):
+        est, nbytes = model_mod._load_estimator(location)
+        est.model_version = "v1"
+        return est, nbytes
+
+    registry = model_mod.ModelRegistry(loader=loader)
+    monkeypatch.setattr(model_mod, "registry", registry)
+    monkeypatch.setattr(main_mod, "registry", registry)
+    return registry
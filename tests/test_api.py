@@ -1,6 +1,9 @@
 from fastapi.testclient import TestClient
+import httpx
+import json
 import pytest
 from app.main import app
+from app.weather import WeatherClient
 
 client = TestClient(app)
 
@@ -11,27 +14,25 @@ def test_health_endpoint():
     assert resp.json() == {"status": "ok"}
 
 # --- predict‑live ----
-def fake_open_meteo_ok(*_args, **_kwargs):
+OPEN_METEO_OK = {
+    "hourly": {
+        "time":               ["2025-07-03T00:00:00"],  # ASCII hyphens
+        "temperature_2m":     [28],
+        "relative_humidity_2m":[70],
+        "pressure_msl":       [1010],
+        "wind_speed_10m":     [12],
+    }
+}
+
+def fake_open_meteo_ok(request):
     """Mock Open‑Meteo response with one hourly row."""
-    class _Resp:
-        status_code = 200
-        def raise_for_status(self): pass
-        def json(self):
-            return {
-                "hourly": {
-                    "time":               ["2025-07-03T00:00:00"],  # ASCII hyphens
-                    "temperature_2m":     [28],
-                    "relative_humidity_2m":[70],
-                    "pressure_msl":       [1010],
-                    "wind_speed_10m":     [12],
-                }
-            }
-    return _Resp()
+    return httpx.Response(200, json=OPEN_METEO_OK)
 
 def test_predict_live(monkeypatch):
-    # Patch requests.get only for this test
+    # Swap in a client whose transport never leaves the process
     import app.main as main_mod
-    monkeypatch.setattr(main_mod.requests, "get", fake_open_meteo_ok)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
 
     resp = client.get("/predict-live")
     assert resp.status_code == 200
@@ -39,3 +40,439 @@ def test_predict_live(monkeypatch):
     body = resp.json()
     assert set(body) == {"predicted_temp", "timestamp_used"}
     assert isinstance(body["predicted_temp"], (int, float))
+
+def test_predict_live_upstream_failure(monkeypatch):
+    import app.main as main_mod
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(503))))
+
+    resp = client.get("/predict-live")
+    assert resp.status_code == 500
+
+def test_predict_live_from_collected_rows(monkeypatch):
+    # collected in the background: upstream being down does not matter
+    import app.main as main_mod
+    from app.collector import ObservationStore
+    from app.weather import hourly_rows
+    store = ObservationStore()
+    store.update("hyderabad", hourly_rows(OPEN_METEO_OK["hourly"]))
+    monkeypatch.setattr(main_mod, "observations", store)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(503))))
+
+    resp = client.get("/predict-live")
+    assert resp.status_code == 200
+    assert resp.json()["timestamp_used"] == "2025-07-03 00:00:00"
+    assert client.get("/predict-live", params={"lat": 28.6, "lon": 77.2}).status_code != 200
+
+def test_stale_collected_rows_go_upstream(monkeypatch, tmp_path, versioned_model):
+    # polls failing for longer than COLLECTED_MAX_AGE: neither the stored
+    # rows nor the precomputed table answer any more
+    import app.main as main_mod
+    from app.collector import ObservationStore
+    from app.forecast_table import ForecastTable
+    from app.weather import hourly_rows
+    now = [0.0]
+    stale = dict(OPEN_METEO_OK["hourly"], temperature_2m=[-40.0] * 24)
+    store = ObservationStore(timer=lambda: now[0])
+    store.update("hyderabad", hourly_rows(stale))
+    table = ForecastTable(tmp_path, snapshot=False, timer=lambda: now[0])
+    table.refresh("hyderabad", hourly_rows(stale))
+    monkeypatch.setattr(main_mod, "observations", store)
+    monkeypatch.setattr(main_mod, "forecasts", table)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
+    from_store = client.get("/predict-live").json()["predicted_temp"]
+
+    now[0] = main_mod.COLLECTED_MAX_AGE + 1
+    live = client.get("/predict-live").json()["predicted_temp"]
+    assert live != from_store
+    monkeypatch.setattr(main_mod, "observations", ObservationStore())
+    monkeypatch.setattr(main_mod, "forecasts", ForecastTable(tmp_path, snapshot=False))
+    assert client.get("/predict-live").json()["predicted_temp"] == live
+
+def test_predict_live_from_forecast_table(monkeypatch, tmp_path, versioned_model):
+    import app.main as main_mod
+    from app.forecast_table import ForecastTable
+    from app.weather import hourly_rows
+    table = ForecastTable(tmp_path, snapshot=False)
+    table.refresh("hyderabad", hourly_rows(OPEN_METEO_OK["hourly"]))
+    monkeypatch.setattr(main_mod, "forecasts", table)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(503))))
+
+    resp = client.get("/predict-live")
+    assert resp.status_code == 200
+    assert resp.json()["timestamp_used"] == "2025-07-03 00:00:00"
+
+    # the site's model evicted: the table may be from a since-replaced one
+    versioned_model.clear()
+    assert client.get("/predict-live").status_code != 200
+
+def test_forecast_table_of_an_unversioned_model_is_not_served(monkeypatch, tmp_path):
+    import app.main as main_mod
+    from app.forecast_table import ForecastTable
+    from app.weather import hourly_rows
+    table = ForecastTable(tmp_path, snapshot=False)
+    table.refresh("hyderabad", hourly_rows(OPEN_METEO_OK["hourly"]))
+    monkeypatch.setattr(main_mod, "forecasts", table)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(503))))
+    assert main_mod.registry.version("hyderabad") is None
+    assert client.get("/predict-live").status_code != 200
+
+# --- metrics ----
+def sample(text, line_start):
+    """Value of the exposition line starting with `line_start` (0 if absent)."""
+    for line in text.splitlines():
+        if line.startswith(line_start + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_metrics_count_live_predictions(monkeypatch):
+    import app.main as main_mod
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
+    before = client.get("/metrics").text
+    client.get("/predict-live")
+    client.get("/predict-live")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    after = resp.text
+
+    def delta(name):
+        return sample(after, name) - sample(before, name)
+
+    assert delta('weather_predictions_total{endpoint="predict_live"}') == 2
+    assert delta('weather_forecast_cache_total{result="miss"}') == 1
+    assert delta('weather_forecast_cache_total{result="hit"}') == 1
+    assert delta("weather_upstream_fetch_seconds_count") == 1
+    # the same hour twice: the model runs at most once, the rest is cached
+    assert delta('weather_model_predict_seconds_count{path="row"}') <= 1
+    assert delta('weather_prediction_cache_total{result="local"}') >= 1
+    assert delta('weather_api_request_seconds_count{route="/predict-live",status="200"}') == 2
+    assert 'weather_api_request_seconds_bucket{route="/predict-live",status="200",le="+Inf"}' in after
+
+# --- predict-batch ----
+def test_predict_batch_matches_single_row():
+    from app.model import predict_row
+    observations = [
+        {"timestamp": f"2025-07-03T{h:02d}:00:00", "temperature": 25 + h,
+         "humidity": 70, "pressure": 1010, "wind_speed": 12}
+        for h in range(3)
+    ]
+    resp = client.post("/predict-batch", json={"observations": observations})
+    assert resp.status_code == 200
+
+    import json
+    lines = [json.loads(l) for l in resp.text.splitlines()]
+    assert [l["timestamp"] for l in lines] == [o["timestamp"] for o in observations]
+    for line, obs in zip(lines, observations):
+        assert line["predicted_temp"] == round(predict_row(obs), 2)
+
+def test_predict_batch_rejects_empty():
+    resp = client.post("/predict-batch", json={"observations": []})
+    assert resp.status_code == 422
+
+def test_predict_batch_rejects_bad_timestamps_up_front(monkeypatch):
+    import app.main as main_mod
+    from datetime import datetime, timedelta
+    start = datetime(2025, 7, 3)
+    observations = [{"timestamp": (start + timedelta(hours=h)).isoformat(), "temperature": 28,
+                     "humidity": 70, "pressure": 1010, "wind_speed": 12}
+                    for h in range(main_mod.BATCH_CHUNK + 10)]
+    observations[main_mod.BATCH_CHUNK + 5]["timestamp"] = "not a time"    # second block
+    resp = client.post("/predict-batch", json={"observations": observations})
+    assert resp.status_code == 422
+
+    observations[main_mod.BATCH_CHUNK + 5]["timestamp"] = "2025-07-10T00:00:00Z"
+    assert client.post("/predict-batch", json={"observations": observations}).status_code == 422
+
+def test_predict_batch_uses_one_model_for_the_whole_stream(monkeypatch):
+    # a reload landing mid-stream must not change the model for later blocks
+    import json
+    import numpy as np
+    import app.main as main_mod
+    import app.model as model_mod
+
+    class Constant:
+        def __init__(self, value):
+            self.value = value
+        def predict(self, X):
+            return np.full(len(X), self.value)
+
+    published = iter([Constant(1.0)])
+    current = lambda location="hyderabad": next(published, Constant(2.0))
+    monkeypatch.setattr(model_mod, "load_estimator", current)
+    monkeypatch.setattr(main_mod, "load_estimator", current)
+    monkeypatch.setattr(main_mod, "BATCH_CHUNK", 2)
+    observations = [{"timestamp": f"2025-07-03T{h:02d}:00:00", "temperature": 28,
+                     "humidity": 70, "pressure": 1010, "wind_speed": 12} for h in range(5)]
+    resp = client.post("/predict-batch", json={"observations": observations})
+    assert [json.loads(l)["predicted_temp"] for l in resp.text.splitlines()] == [1.0] * 5
+
+# --- locations ----
+def test_predict_live_by_coordinates(monkeypatch):
+    import app.main as main_mod
+    seen = []
+    def handler(request):
+        seen.append(request.url.params["latitude"])
+        return fake_open_meteo_ok(request)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(handler)))
+
+    resp = client.get("/predict-live", params={"lat": 17.44, "lon": 78.35})
+    assert resp.status_code == 200
+    assert seen == ["17.44"]             # weather for the requested point
+
+def test_predict_live_unknown_city():
+    assert client.get("/predict-live", params={"city": "atlantis"}).status_code == 404
+    assert client.get("/predict-live", params={"lat": 0, "lon": 0}).status_code == 404
+    assert client.get("/predict-live", params={"lat": 17.4}).status_code == 422
+
+def test_predict_live_outside_forecast_window(monkeypatch):
+    import app.main as main_mod
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
+
+    ok = client.get("/predict-live", params={"at": "2025-07-03T00:00:00"})
+    assert ok.status_code == 200
+    assert ok.json()["timestamp_used"] == "2025-07-03 00:00:00"
+    assert client.get("/predict-live", params={"at": "2025-07-05T00:00:00"}).status_code == 404
+
+def test_predict_live_converts_an_aware_at_to_site_time(monkeypatch, tmp_path, versioned_model):
+    import app.main as main_mod
+    from app.forecast_table import ForecastTable
+    from app.weather import hourly_rows
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
+    # the forecast's only hour is 00:00 in Hyderabad (UTC+05:30)
+    ok = client.get("/predict-live", params={"at": "2025-07-02T18:30:00Z"})
+    assert ok.status_code == 200
+    assert ok.json()["timestamp_used"] == "2025-07-03 00:00:00"
+    assert client.get("/predict-live", params={"at": "2025-07-03T00:00:00+00:00"}).status_code == 404
+    assert client.get("/predict-horizon", params={"at": "2025-07-03T00:00:00Z"}).status_code == 404
+
+    table = ForecastTable(tmp_path, snapshot=False)
+    table.refresh("hyderabad", hourly_rows(OPEN_METEO_OK["hourly"]))
+    monkeypatch.setattr(main_mod, "forecasts", table)
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(503))))
+    hit = client.get("/predict-live", params={"at": "2025-07-02T20:00:00+01:30"})
+    assert hit.json()["timestamp_used"] == "2025-07-03 00:00:00"
+    assert client.get("/predict-live", params={"at": "2025-07-03T00:00:00Z"}).status_code != 200
+
+# --- history features on the live path ----
+def hourly_payload(times, temps):
+    return {"hourly": {"time": [t.isoformat() for t in times],
+                       "temperature_2m": list(temps),
+                       "relative_humidity_2m": [70] * len(times),
+                       "pressure_msl": [1010] * len(times),
+                       "wind_speed_10m": [12] * len(times)}}
+
+@pytest.fixture
+def serve(monkeypatch):
+    """serve(est): answer every site with `est` instead of its published model."""
+    import app.main as main_mod
+    import app.model as model_mod
+    def serve(est):
+        monkeypatch.setattr(model_mod, "load_estimator", lambda location="hyderabad": est)
+        monkeypatch.setattr(main_mod, "load_estimator", lambda location="hyderabad": est)
+    return serve
+
+@pytest.fixture
+def lag_model(serve):
+    """A lag / rolling-window model fitted on 48 hours, served for every site."""
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.pipeline import Pipeline
+    from app.features import add_lag_features
+    from app.model import FeatureBuilder, FlatEnsemble
+
+    times = pd.date_range("2025-07-02", periods=48, freq="h")
+    temps = 25 + 5 * np.sin(np.arange(48) / 4)
+    frame = pd.DataFrame({"timestamp": times, "temperature": temps,
+                          "humidity": 70, "pressure": 1010, "wind_speed": 12})
+    pipe = Pipeline([("feat", FeatureBuilder(lags=(1, 3), windows=(6,))),
+                     ("model", GradientBoostingRegressor(n_estimators=20, random_state=0))])
+    frame = add_lag_features(frame, pipe.named_steps["feat"].lag_spec)
+    # a target the lags decide, so serving them wrong shows in the prediction
+    pipe.fit(frame.iloc[6:], frame["temp_roll_mean_6"].iloc[6:])
+    serve(FlatEnsemble.from_estimator(pipe.named_steps["model"]))
+
+    def expected(series):
+        """The pipeline's prediction for every hour of `series` (NaN lags as 0)."""
+        frame = pd.DataFrame({"timestamp": times, "temperature": series,
+                              "humidity": 70, "pressure": 1010, "wind_speed": 12})
+        frame = add_lag_features(frame, pipe.named_steps["feat"].lag_spec)
+        return pipe.predict(frame.fillna(0))
+    return expected, times, temps
+
+def test_predict_live_with_lag_model(monkeypatch, lag_model):
+    import pandas as pd
+    import app.main as main_mod
+    expected, times, temps = lag_model
+    seen = []
+    def handler(request):
+        seen.append(request.url.params.get("past_days"))
+        return httpx.Response(200, json=hourly_payload(times, temps.tolist()))
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(handler)))
+
+    expected = expected(temps)
+    for at in ["2025-07-03T05:00:00", "2025-07-03T09:00:00", "2025-07-03T02:00:00"]:
+        resp = client.get("/predict-live", params={"at": at})
+        assert resp.status_code == 200
+        i = times.get_loc(pd.Timestamp(at))
+        assert resp.json()["predicted_temp"] == round(expected[i], 2)
+    assert seen == ["1"]                     # yesterday fetched once, for history
+
+    # the batch endpoint takes its observations as one hourly series
+    observations = [{"timestamp": t.isoformat(), "temperature": float(v), "humidity": 70,
+                     "pressure": 1010, "wind_speed": 12} for t, v in zip(times, temps)]
+    resp = client.post("/predict-batch", json={"observations": observations[10:]})
+    preds = [json.loads(line)["predicted_temp"] for line in resp.text.splitlines()]
+    assert preds == [None] * 5 + [round(p, 2) for p in expected[15:]]   # 5h to warm up
+
+def test_lags_come_from_the_requested_coordinates(monkeypatch, lag_model):
+    import pandas as pd
+    import app.main as main_mod
+    expected, times, temps = lag_model
+    # the point near the site is 3 degrees warmer than the site itself
+    def handler(request):
+        offset = 0 if request.url.params["latitude"] == "17.385" else 3
+        return httpx.Response(200, json=hourly_payload(times, (temps + offset).tolist()))
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(handler)))
+    at = "2025-07-03T12:00:00"
+    warmer = round(expected(temps + 3)[times.get_loc(pd.Timestamp(at))], 2)
+
+    # a request for the site's own hour first must not leak into the point's lags
+    assert client.get("/predict-live", params={"city": "hyderabad", "at": at}).status_code == 200
+    near = client.get("/predict-live", params={"lat": 17.44, "lon": 78.35, "at": at})
+    assert near.json()["predicted_temp"] == warmer
+
+def test_lags_follow_revised_hours(monkeypatch, lag_model):
+    import app.main as main_mod
+    _, times, temps = lag_model
+    payload = hourly_payload(times, temps.tolist())
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(200, json=payload))))
+    at = {"at": "2025-07-03T14:00:00"}
+    before = client.get("/predict-live", params=at).json()["predicted_temp"]
+
+    # the next payload revises only the hours before `at`
+    revised = temps.copy()
+    revised[24 + 14 - 3:24 + 14] -= 8
+    payload = hourly_payload(times, revised.tolist())
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(
+                            lambda request: httpx.Response(200, json=payload))))
+    assert client.get("/predict-live", params=at).json()["predicted_temp"] != before
+
+# --- extra heads (quantiles, horizon) ----
+@pytest.fixture
+def flat_fit():
+    """(X, fit): 500 random raw feature rows, and fit(y, **kw), a 30-tree
+    GradientBoostingRegressor(**kw) trained on them as a FlatEnsemble."""
+    import numpy as np
+    from sklearn.ensemble import GradientBoostingRegressor
+    from app.model import FlatEnsemble
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(15, 40, 500), rng.uniform(20, 100, 500),
+                         np.full(500, 1010.0), rng.uniform(0, 30, 500),
+                         rng.integers(0, 24, 500), rng.integers(0, 7, 500),
+                         rng.integers(1, 13, 500)])
+    fit = lambda y, **kw: FlatEnsemble.from_estimator(
+        GradientBoostingRegressor(n_estimators=30, random_state=0, **kw).fit(X, y))
+    return X, fit
+
+def test_predict_live_quantiles(monkeypatch, serve, flat_fit):
+    import numpy as np
+    import app.main as main_mod
+    from app.model import FlatEnsemble
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
+    assert client.get("/predict-live", params={"quantiles": True}).status_code == 404
+
+    X, fit = flat_fit
+    y = X[:, 0] + np.random.default_rng(0).normal(scale=1.0, size=len(X))
+    flat = fit(y)
+    flat.quantiles = FlatEnsemble.stack([fit(y, loss="quantile", alpha=q)
+                                         for q in (0.1, 0.5, 0.9)], ["p10", "p50", "p90"])
+    serve(flat)
+
+    body = client.get("/predict-live", params={"quantiles": True}).json()
+    assert list(body["quantiles"]) == ["p10", "p50", "p90"]
+    bands = list(body["quantiles"].values())
+    assert bands == sorted(bands) and bands[0] < bands[2]
+    assert body["predicted_temp"] == client.get("/predict-live").json()["predicted_temp"]
+
+def test_predict_horizon(monkeypatch, serve, flat_fit):
+    import pandas as pd
+    import app.main as main_mod
+    from app.model import FlatEnsemble
+    monkeypatch.setattr(main_mod, "weather_client",
+                        WeatherClient(transport=httpx.MockTransport(fake_open_meteo_ok)))
+    assert client.get("/predict-horizon").status_code == 404
+
+    X, fit = flat_fit
+    heads = [fit(X[:, 0] + h) for h in range(3)]
+    flat = fit(X[:, 0])
+    flat.horizon = FlatEnsemble.stack(heads, ["t+1", "t+2", "t+3"])
+    serve(flat)
+
+    body = client.get("/predict-horizon").json()
+    used = pd.Timestamp(body["timestamp_used"])
+    assert [pd.Timestamp(h["timestamp"]) - used for h in body["horizon"]] == [
+        pd.Timedelta(hours=h) for h in (1, 2, 3)]
+    temps = [h["predicted_temp"] for h in body["horizon"]]
+    assert temps[0] == client.get("/predict-live").json()["predicted_temp"]
+    assert temps[0] < temps[1] < temps[2]
+
+def test_cold_model_load_does_not_block_the_event_loop(monkeypatch):
+    import asyncio
+    import time
+    import app.main as main_mod
+    from app.model import ModelRegistry
+    def slow_load(location):
+        time.sleep(0.2)
+        return "model"
+    monkeypatch.setattr(main_mod, "registry", ModelRegistry())
+    monkeypatch.setattr(main_mod, "load_estimator", slow_load)
+
+    async def run():
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        assert await main_mod.site_estimator("hyderabad") == "model"
+        task.cancel()
+        return ticks
+    assert asyncio.run(run()) >= 5
+
+# --- admin reload ----
+def test_admin_reload(monkeypatch):
+    import app.main as main_mod
+    calls = []
+    monkeypatch.setattr(main_mod.registry, "reload", lambda location: calls.append(location))
+    assert client.post("/admin/reload", params={"city": "delhi"}).status_code == 200
+    assert client.post("/admin/reload", params={"city": "atlantis"}).status_code == 404
+    assert calls == ["delhi"]
+
+    monkeypatch.setattr(main_mod, "ADMIN_TOKEN", "s3cret")
+    assert client.post("/admin/reload").status_code == 403
+    resp = client.post("/admin/reload", headers={"X-Admin-Token": "s3cret"})
+    assert resp.status_code == 200 and resp.json()["city"] == "hyderabad"
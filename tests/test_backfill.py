@@ -0,0 +1,76 @@
+import json
+from datetime import date
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter
+
+from app.backfill import chunk_path, date_chunks, fetch_chunk, pending_chunks, save_chunks
+from app.storage import get_store
+
+class ArchiveStub(BaseAdapter):
+    """Answers archive requests with 24 hours per day; the last hour of each
+    range spills into the next day, as a DST shift would."""
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+
+    def send(self, request, **kwargs):
+        query = parse_qs(urlparse(request.url).query)
+        start, end = query["start_date"][0], query["end_date"][0]
+        self.requested.append((start, end))
+        hours = pd.date_range(start, pd.Timestamp(end) + pd.Timedelta(hours=24), freq="h")
+        hourly = {"time": [h.isoformat() for h in hours]}
+        for var in query["hourly"][0].split(","):
+            hourly[var] = [float(h.hour) for h in hours]
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"hourly": hourly}).encode()
+        response.request, response.url = request, request.url
+        return response
+
+    def close(self):
+        pass
+
+def stub_session():
+    session, stub = requests.Session(), ArchiveStub()
+    session.mount("https://", stub)
+    return session, stub
+
+def backfill(session, chunk_dir, chunks):
+    for chunk in pending_chunks(chunks, chunk_dir):
+        fetch_chunk(session, chunk, 17.385, 78.4867, chunk_dir)
+
+#---- chunked backfill ----
+def test_chunks_cover_the_range_without_gaps():
+    chunks = date_chunks(date(2025, 1, 1), date(2025, 1, 10), 4)
+    assert chunks == [(date(2025, 1, 1), date(2025, 1, 4)),
+                      (date(2025, 1, 5), date(2025, 1, 8)),
+                      (date(2025, 1, 9), date(2025, 1, 10))]
+
+def test_rerun_resumes_from_checkpoints(tmp_path):
+    chunks = date_chunks(date(2025, 1, 1), date(2025, 1, 9), 3)
+    session, stub = stub_session()
+    backfill(session, tmp_path, chunks[:1])                    # an interrupted first run
+    chunk_path(tmp_path, chunks[1]).with_suffix(".tmp").write_text("half")
+    assert stub.requested == [("2025-01-01", "2025-01-03")]
+
+    backfill(session, tmp_path, chunks)
+    assert stub.requested[1:] == [("2025-01-04", "2025-01-06"), ("2025-01-07", "2025-01-09")]
+    assert pending_chunks(chunks, tmp_path) == []
+
+    backfill(session, tmp_path, chunks)                        # nothing left to fetch
+    assert len(stub.requested) == 3
+
+def test_chunk_boundaries_are_written_once(tmp_path):
+    chunks = date_chunks(date(2025, 1, 1), date(2025, 1, 9), 3)
+    session, _ = stub_session()
+    backfill(session, tmp_path, chunks)
+    store = get_store(tmp_path / "out", "csv")
+
+    assert save_chunks(store, "history", chunks, tmp_path) == 9 * 24 + 1
+    ts = store.read("history")["timestamp"]
+    assert ts.is_unique and ts.is_monotonic_increasing
+    assert ts.iloc[0] == pd.Timestamp("2025-01-01") and ts.iloc[-1] == pd.Timestamp("2025-01-10")
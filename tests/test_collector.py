@@ -0,0 +1,57 @@
+import asyncio
+import httpx
+import pytest
+from datetime import datetime
+
+from app.collector import Collector, ObservationStore
+from app.locations import get_location
+from app.storage import LiveLog
+from app.weather import ForecastWindowError, WeatherClient
+
+HOURLY = {
+    "time":                 [f"2025-07-0{d}T{h:02d}:00" for d in (2, 3) for h in range(24)],
+    "temperature_2m":       [20 + h / 2 for h in range(48)],
+    "relative_humidity_2m": [70] * 48,
+    "pressure_msl":         [1010] * 48,
+    "wind_speed_10m":       [12] * 48,
+}
+
+def client(calls, status=200):
+    def handler(request):
+        calls.append(dict(request.url.params))
+        return httpx.Response(status, json={"hourly": HOURLY})
+    return WeatherClient(transport=httpx.MockTransport(handler))
+
+#---- one poll fills the store and the live log ----
+def test_collect_updates_store_and_live_log(tmp_path):
+    calls, store = [], ObservationStore()
+    collector = Collector(client(calls), store, [get_location("hyderabad")], 60,
+                          history=lambda location: 3, data_dir=tmp_path)
+    asyncio.run(collector.collect_all())
+    assert calls[0]["past_days"] == "1"              # 3 hours of history: one past day
+
+    rows = store.window("hyderabad", history=3)
+    assert [r["timestamp"].hour for r in rows] == [21, 22, 23, 0]   # first hour of today
+    assert store.window("hyderabad", datetime(2025, 7, 3, 5))[-1]["temperature"] == 34.5
+    assert store.window("hyderabad", history=48) is None           # needs more past days
+    assert store.window("delhi") is None
+    with pytest.raises(ForecastWindowError):
+        store.window("hyderabad", datetime(2025, 8, 1))
+
+    assert len(LiveLog(tmp_path / "live_log").read()) == 48
+    asyncio.run(collector.collect_all())             # a repeat poll revises nothing
+    assert len(calls) == 2 and len(LiveLog(tmp_path / "live_log").read()) == 48
+
+#---- a failed poll keeps the previous rows, until they are too old ----
+def test_failed_poll_keeps_store(tmp_path):
+    now = [0.0]
+    store = ObservationStore(timer=lambda: now[0])
+    store.update("hyderabad", [{"timestamp": datetime(2025, 7, 3), "temperature": 1.0}])
+    collector = Collector(client([], status=503), store, [get_location("hyderabad")],
+                          60, write_log=False)
+    now[0] = 100
+    asyncio.run(collector.collect_all())
+    assert store.window("hyderabad", max_age=180)[0]["temperature"] == 1.0
+    now[0] = 181
+    assert store.window("hyderabad", max_age=180) is None
+    assert store.window("hyderabad")[0]["temperature"] == 1.0      # no limit asked for
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.features import TARGET, TargetShifter, add_time_features, engineer_chunks
+
+def raw(city, periods, start="2025-01-01"):
+    return pd.DataFrame({
+        "timestamp":   pd.date_range(start, periods=periods, freq="h"),
+        "temperature": np.random.default_rng(len(city)).normal(25, 3, periods),
+        "humidity":    70,
+        "pressure":    1010.0,
+        "wind_speed":  5.0,
+        "city":        city,
+    })
+
+def whole_frame(df):
+    """The original in-memory version: shift(-1) per site, then dropna."""
+    df = add_time_features(df.copy())
+    df[TARGET] = df.groupby("city")["temperature"].shift(-1)
+    return df.dropna(subset=[TARGET])
+
+def canonical(df):
+    return df.sort_values(["city", "timestamp"], ignore_index=True)
+
+#---- block boundaries do not change the result ----
+@pytest.mark.parametrize("chunksize", [1, 5, 24, 1000])
+def test_streaming_matches_whole_frame(chunksize):
+    df = pd.concat([raw("hyderabad", 50), raw("delhi", 37)])
+    df = df.sort_values("timestamp", kind="stable", ignore_index=True)   # sites interleaved
+    chunks = (df.iloc[i:i + chunksize].copy() for i in range(0, len(df), chunksize))
+
+    shifter = TargetShifter()
+    out = pd.concat(list(engineer_chunks(chunks, shifter)), ignore_index=True)
+
+    pd.testing.assert_frame_equal(canonical(out), canonical(whole_frame(df)))
+    assert shifter.dropped == 2             # one final row per site
+    assert shifter.unordered == 0
+
+def test_single_site_without_city_column():
+    df = raw("hyderabad", 30).drop(columns="city")
+    out = pd.concat(engineer_chunks(df.iloc[i:i + 7].copy() for i in range(0, 30, 7)))
+    np.testing.assert_array_equal(out[TARGET].to_numpy(), df["temperature"].to_numpy()[1:])
+
+def test_out_of_order_rows_are_counted():
+    df = raw("hyderabad", 10)
+    df = pd.concat([df, df.iloc[[3]]])
+    shifter = TargetShifter()
+    list(engineer_chunks([df.iloc[:6].copy(), df.iloc[6:].copy()], shifter))
+    assert shifter.unordered == 1
+
+#---- gaps in collection ----
+def test_freq_drops_targets_across_gaps(tmp_path):
+    from app.features import read_watermark, write_watermark
+    df = raw("hyderabad", 10).drop(columns="city").drop(index=[4])
+    shifter = TargetShifter(freq="1h")
+    out = pd.concat(engineer_chunks([df.copy()], shifter))
+    assert df["timestamp"].iloc[3] not in set(out["timestamp"])     # next hour missing
+    assert (out[TARGET].to_numpy() == df.set_index("timestamp")["temperature"]
+            .reindex(out["timestamp"] + pd.Timedelta("1h")).to_numpy()).all()
+
+    path = tmp_path / "wm.json"
+    assert read_watermark(path) is None
+    write_watermark(path, out["timestamp"].iloc[-1])
+    assert read_watermark(path) == out["timestamp"].iloc[-1]
+
+#---- incremental runs from the live log ----
+def collect(log, start, hours):
+    """Log `hours` rows from `start` as the collector does (local time tagged UTC)."""
+    stamps = pd.date_range(start, periods=hours, freq="h", tz="UTC")
+    log.append(pd.DataFrame({"timestamp": stamps, "temperature": np.arange(hours) + 20.0,
+                             "humidity": 70, "pressure": 1010.0, "wind_speed": 5.0}))
+
+def test_incremental_run_holds_back_the_newest_hour(tmp_path):
+    from app.features import engineer_incremental, read_watermark
+    from app.storage import LiveLog, get_store
+    store, log = get_store(tmp_path, "csv"), LiveLog(tmp_path / "live_log")
+    (tmp_path / "live_log").mkdir()
+    watermark = tmp_path / "wm.json"
+    collect(log, "2025-07-03 00:00", 12)              # 00:00 .. 11:00, site-local
+    run = lambda now: engineer_incremental(store, "DATA_FRAME", log, watermark,
+                                           timezone="Asia/Kolkata", now=now)
+
+    # 00:30 UTC is 06:00 in Hyderabad: 07:00 on are forecasts, 06:00 has no target yet
+    first = run(pd.Timestamp("2025-07-03 00:30", tz="UTC"))
+    assert first.watermark is None and first.collected == 7
+    assert list(first.written["timestamp"].dt.hour) == [0, 1, 2, 3, 4, 5]
+    assert list(first.written[TARGET]) == [21.0, 22.0, 23.0, 24.0, 25.0, 26.0]
+    assert read_watermark(watermark) == pd.Timestamp("2025-07-03 05:00")
+
+    again = run(pd.Timestamp("2025-07-03 00:45", tz="UTC"))   # no new hour since
+    assert again.written.empty and again.watermark == pd.Timestamp("2025-07-03 05:00")
+    assert len(store.read("DATA_FRAME")) == 6
+    assert read_watermark(watermark) == pd.Timestamp("2025-07-03 05:00")
+
+    later = run(pd.Timestamp("2025-07-03 02:30", tz="UTC"))   # 08:00 site-local
+    assert list(later.written["timestamp"].dt.hour) == [6, 7]
+    assert list(store.read("DATA_FRAME")["timestamp"].dt.hour) == list(range(8))
+
+def test_incremental_run_continues_a_full_run(tmp_path):
+    from app.features import engineer_incremental
+    from app.storage import LiveLog, get_store
+    store, log = get_store(tmp_path, "csv"), LiveLog(tmp_path / "live_log")
+    (tmp_path / "live_log").mkdir()
+    collect(log, "2025-07-03 00:00", 6)
+    full = pd.DataFrame({"timestamp": pd.date_range("2025-07-02 20:00", periods=6, freq="h")})
+    full = add_time_features(full.assign(temperature=1.0, humidity=70, pressure=1010.0,
+                                         wind_speed=5.0, **{TARGET: 1.0}))
+    store.write("DATA_FRAME", full[["timestamp", "temperature", "humidity", "pressure",
+                                    "wind_speed", "hour", "day", "month", "weekday", TARGET]])
+    run = engineer_incremental(store, "DATA_FRAME", log, tmp_path / "wm.json",
+                               now=pd.Timestamp("2025-07-04", tz="UTC"))
+    # no watermark file: the table's last row (01:00) is the watermark
+    assert run.watermark == pd.Timestamp("2025-07-03 01:00")
+    assert list(run.written["timestamp"].dt.hour) == [2, 3, 4]
+
+#---- lag / rolling features: vectorised, per-window and streamed agree ----
+SPEC_KW = dict(lags=(1, 2, 5), windows=(3, 24))
+
+def test_lag_spec_names_round_trip():
+    from app.features import LagSpec
+    spec = LagSpec(**SPEC_KW)
+    assert LagSpec.from_names(["temperature", "hour"] + spec.names) == spec
+    assert spec.capacity == 24
+    assert not LagSpec() and LagSpec.parse("1,2,5", "3,24") == spec
+
+@pytest.mark.parametrize("chunksize", [1, 7, 1000])
+def test_streamed_lags_match_feature_builder(chunksize):
+    from app.features import LagSpec, LagStreamer
+    from app.model import FeatureBuilder
+    spec = LagSpec(**SPEC_KW)
+    df = pd.concat([raw("hyderabad", 60), raw("delhi", 45)])
+    df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+    chunks = (df.iloc[i:i + chunksize].copy() for i in range(0, len(df), chunksize))
+
+    lagger = LagStreamer(spec)
+    out = canonical(pd.concat(list(engineer_chunks(chunks, lagger=lagger)), ignore_index=True))
+    assert lagger.dropped == 2 * 23                 # first 23 hours per site
+    assert len(out) == 60 + 45 - 2 - lagger.dropped
+
+    builder = FeatureBuilder(**SPEC_KW)
+    for city, rows in df.groupby("city"):
+        expected = builder.transform(rows.drop(columns="city")).iloc[23:-1]
+        got = builder.transform(out[out["city"] == city])
+        np.testing.assert_array_equal(got.to_numpy(), expected.to_numpy())
+
+def test_horizon_targets_per_site_with_gaps():
+    from app.features import horizon_targets
+    df = pd.concat([raw("hyderabad", 10).drop(index=[4]), raw("delhi", 5)],
+                   ignore_index=True)
+    Y = horizon_targets(df, 3)
+    temps = df["temperature"].to_numpy()
+    assert Y.shape == (len(df), 3)
+    np.testing.assert_array_equal(Y[0], temps[1:4])
+    assert np.isnan(Y[2, 1]) and Y[2, 2] == temps[4]        # hour 4 was not recorded
+    assert np.isnan(Y[8]).all()                             # hyderabad's last hour
+    np.testing.assert_array_equal(Y[9, :2], temps[10:12])   # delhi starts over
+    assert np.isnan(Y[-2, 1:]).all()
+
+def test_window_lag_features_match_vectorised():
+    from app.features import LagSpec, series_lag_features, window_lag_features
+    spec = LagSpec(**SPEC_KW)
+    df = raw("hyderabad", 40).drop(index=[30, 35])               # gaps inside the window
+    rows = [{"timestamp": ts.to_pydatetime(), "temperature": t}
+            for ts, t in zip(df["timestamp"], df["temperature"])]
+    expected = series_lag_features(df["timestamp"], df["temperature"], spec)
+    for end in (25, len(rows)):
+        got = window_lag_features(rows[:end], spec)
+        np.testing.assert_array_equal(list(got.values()), expected[end - 1])
@@ -0,0 +1,64 @@
+import json
+import pytest
+from datetime import datetime
+
+from app.forecast_table import ForecastTable
+from app.model import predict_row_fast
+from app.weather import hourly_rows
+
+HOURLY = {
+    "time":                 [f"2025-07-03T{h:02d}:00" for h in range(24)],
+    "temperature_2m":       [24 + h / 3 for h in range(24)],
+    "relative_humidity_2m": [60 + h for h in range(24)],
+    "pressure_msl":         [1008] * 24,
+    "wind_speed_10m":       [10] * 24,
+}
+
+#---- one batch covers every hour, same values as per-row scoring ----
+def test_refresh_scores_every_hour(tmp_path, versioned_model):
+    rows = hourly_rows(HOURLY)
+    table = ForecastTable(tmp_path)
+    forecast = table.refresh("hyderabad", rows)
+    assert len(forecast.predictions) == 24 and forecast.default == rows[0]["timestamp"]
+
+    version = versioned_model.version("hyderabad")
+    assert version == "v1"
+    for row in rows:
+        hour, pred = table.lookup("hyderabad", row["timestamp"].replace(minute=20), version)
+        assert hour == row["timestamp"]
+        assert pred == pytest.approx(predict_row_fast(row), abs=1e-9)
+    assert table.lookup("hyderabad", None, version)[0] == rows[0]["timestamp"]
+    assert table.lookup("hyderabad", datetime(2025, 8, 1), version) is None
+    assert table.lookup("hyderabad", None, "another-version") is None
+    assert table.lookup("delhi", None, version) is None
+    assert table.lookup("hyderabad", None, None) is None          # model not loaded
+
+#---- a table made by an unversioned model is never served ----
+def test_unversioned_table_is_a_miss(tmp_path):
+    table = ForecastTable(tmp_path, snapshot=False)
+    forecast = table.refresh("hyderabad", hourly_rows(HOURLY))   # the checked-in model
+    assert forecast.version is None and len(forecast.predictions) == 24
+    assert table.lookup("hyderabad", None, None) is None
+
+#---- an old table is not served ----
+def test_lookup_max_age(tmp_path, versioned_model):
+    now = [1000.0]
+    table = ForecastTable(tmp_path, snapshot=False, timer=lambda: now[0])
+    table.refresh("hyderabad", hourly_rows(HOURLY))
+    version = versioned_model.version("hyderabad")
+    now[0] += 600
+    assert table.lookup("hyderabad", None, version, max_age=600) is not None
+    now[0] += 1
+    assert table.lookup("hyderabad", None, version, max_age=600) is None
+
+#---- snapshots for a starting worker ----
+def test_snapshot_round_trip(tmp_path):
+    made = ForecastTable(tmp_path).refresh("hyderabad", hourly_rows(HOURLY))
+    table = ForecastTable(tmp_path)
+    assert table.load_snapshots(["hyderabad", "delhi"], max_age=60) == ["hyderabad"]
+    assert dict(table._forecasts["hyderabad"].predictions) == dict(made.predictions)
+
+    path = table.snapshot_path("hyderabad")
+    snap = json.loads(path.read_text())
+    path.write_text(json.dumps({**snap, "made_at": snap["made_at"] - 120}))
+    assert ForecastTable(tmp_path).load_snapshots(["hyderabad"], max_age=60) == []
@@ -0,0 +1,31 @@
+import pytest
+from pathlib import Path
+
+from app.locations import (DEFAULT_LOCATION, get_location, load_locations,
+                           location_dir, nearest_location)
+
+def test_default_location_is_registered():
+    loc = get_location(DEFAULT_LOCATION)
+    assert (loc.latitude, loc.longitude) == (17.3850, 78.4867)
+    assert get_location("Hyderabad") == loc
+    assert len(load_locations()) >= 1
+
+def test_nearest_location():
+    assert nearest_location(17.40, 78.50).name == DEFAULT_LOCATION
+    with pytest.raises(KeyError):
+        nearest_location(0.0, 0.0)                  # Gulf of Guinea
+
+def test_unknown_location():
+    with pytest.raises(KeyError):
+        get_location("atlantis")
+
+def test_location_dir_keeps_default_layout():
+    base = Path("model")
+    assert location_dir(base, DEFAULT_LOCATION) == base
+    assert location_dir(base, "delhi") == base / "delhi"
+
+def test_local_time_converts_aware_values_only():
+    from datetime import datetime, timezone
+    loc = get_location(DEFAULT_LOCATION)                     # Asia/Kolkata
+    assert loc.local_time(datetime(2025, 7, 3, 5, tzinfo=timezone.utc)) == datetime(2025, 7, 3, 10, 30)
+    assert loc.local_time(datetime(2025, 7, 3, 5)) == datetime(2025, 7, 3, 5)
@@ -0,0 +1,23 @@
+from app.metrics import Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    reg = Registry()
+    hist = reg.histogram("t_seconds", "test", ["path"], buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 2.0):
+        hist.labels("row").observe(v)
+    text = reg.render()
+    assert 't_seconds_bucket{path="row",le="0.1"} 2' in text      # le is inclusive
+    assert 't_seconds_bucket{path="row",le="1"} 3' in text
+    assert 't_seconds_bucket{path="row",le="+Inf"} 4' in text
+    assert 't_seconds_count{path="row"} 4' in text
+    assert 't_seconds_sum{path="row"} 2.65' in text
+    assert "# TYPE t_seconds histogram" in text
+
+
+def test_counter_and_reregistration():
+    reg = Registry()
+    reg.counter("c_total", "test").inc()
+    reg.counter("c_total", "test").inc(2)          # same metric, not a duplicate
+    assert reg.render().count("# TYPE c_total counter") == 1
+    assert "c_total 3\n" in reg.render()
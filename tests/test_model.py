@@ -0,0 +1,251 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.model import (FeatureBuilder, load_pipeline, predict_row,
+                       predict_row_fast, predict_rows, row_features)
+
+ROWS = [
+    {"timestamp": "2025-07-03T00:00:00", "temperature": 28, "humidity": 70,
+     "pressure": 1010, "wind_speed": 12},
+    {"timestamp": "2024-12-31T23:00", "temperature": 14.5, "humidity": 95,
+     "pressure": 1021.3, "wind_speed": 3.2},
+    {"timestamp": pd.Timestamp("2025-03-09T13:00:00"), "temperature": 35.1,
+     "humidity": 18, "pressure": 1004.8, "wind_speed": 21.7},
+]
+
+#---- pandas-free features match FeatureBuilder ----
+def test_row_features_match_feature_builder():
+    expected = FeatureBuilder().transform(pd.DataFrame(ROWS)).to_numpy(dtype=float)
+    got = np.vstack([row_features(r) for r in ROWS])
+    np.testing.assert_array_equal(got, expected)
+
+#---- fast path matches the full pipeline ----
+@pytest.mark.parametrize("row", ROWS)
+def test_predict_row_fast_parity(row):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")      # no feature-name warnings either
+        fast = predict_row_fast(row)
+    assert fast == pytest.approx(predict_row(row), abs=1e-9)
+
+def test_predict_rows_matches_pipeline():
+    expected = load_pipeline().predict(pd.DataFrame(ROWS))
+    np.testing.assert_allclose(predict_rows(ROWS), expected)
+    assert predict_rows([]) == []
+
+#---- serving does not import sklearn; pickles still find FeatureBuilder ----
+def run_python(code):
+    import subprocess, sys
+    from pathlib import Path
+    return subprocess.run([sys.executable, "-c", code], check=True, text=True,
+                          capture_output=True, cwd=Path(__file__).resolve().parents[1]
+                          ).stdout.strip()
+
+def test_api_import_skips_sklearn():
+    code = ("import sys, app.main; "
+            "print([m for m in ('sklearn', 'joblib', 'pandas') if m in sys.modules])")
+    assert run_python(code) == "[]"
+
+def test_flat_model_without_lags_predicts_without_pandas():
+    code = ("import sys; from app.features import FINAL_COLS; "
+            "from app.model import feature_names, load_estimator, predict_row_fast; "
+            f"row = {ROWS[0]!r}; est = load_estimator(); "
+            "assert feature_names(est) == FINAL_COLS, feature_names(est); "
+            "predict_row_fast(row); "
+            "print([m for m in ('sklearn', 'joblib', 'pandas') if m in sys.modules])")
+    assert run_python(code) == "[]"
+
+def test_feature_builder_pickles_as_app_model():
+    import pickle
+    data = pickle.dumps(FeatureBuilder(lags=(1,)))
+    assert b"app.model" in data and b"app.pipeline" not in data
+    code = (f"import pickle; fb = pickle.loads({data!r}); "
+            "print(type(fb).__name__, fb.lags)")
+    assert run_python(code) == "FeatureBuilder (1,)"
+
+#---- flattened trees match sklearn ----
+@pytest.mark.parametrize("name", ["trees.npz", "trees"])
+def test_flat_ensemble_parity(tmp_path, name):
+    from app.model import FlatEnsemble
+    est = load_pipeline().named_steps["model"]
+    df = pd.read_csv("data/DATA_FRAME.csv").iloc[::50]
+    X = FeatureBuilder().transform(df)
+
+    flat = FlatEnsemble.from_estimator(est)
+    flat.save(tmp_path / name)
+    flat = FlatEnsemble.load(tmp_path / name)
+    if name == "trees":          # compiled tables mapped read-only, not rebuilt
+        assert not flat._leaf_values.flags.writeable
+        assert flat.nbytes == FlatEnsemble.from_estimator(est).nbytes
+
+    np.testing.assert_allclose(flat.predict(X.to_numpy(), block_size=64),
+                               est.predict(X), atol=1e-9)
+
+def test_flat_ensemble_parity_deep_trees():
+    # more than 8 leaves per tree exercises the wide-mask path
+    from sklearn.ensemble import GradientBoostingRegressor
+    from app.model import FlatEnsemble
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 4))
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=500)
+    est = GradientBoostingRegressor(n_estimators=20, max_depth=5,
+                                    random_state=0).fit(X, y)
+    X_test = rng.normal(size=(300, 4))
+    np.testing.assert_allclose(FlatEnsemble.from_estimator(est).predict(X_test),
+                               est.predict(X_test), atol=1e-9)
+
+def test_flat_ensemble_parity_hist_gradient_boosting(tmp_path):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from app.model import FlatEnsemble
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(2000, 5))
+    y = X[:, 0] * 3 + np.sin(X[:, 1] * 4) + rng.normal(scale=0.1, size=2000)
+    est = HistGradientBoostingRegressor(max_iter=50, early_stopping=False,
+                                        random_state=0).fit(X, y)
+    FlatEnsemble.from_estimator(est).save(tmp_path / "trees.npz")
+    flat = FlatEnsemble.load(tmp_path / "trees.npz")
+    assert not flat.float32_inputs
+    X_test = rng.normal(size=(300, 5))
+    np.testing.assert_allclose(flat.predict(X_test), est.predict(X_test), atol=1e-9)
+
+#---- quantile heads stacked into one ensemble ----
+def test_stacked_heads_match_each_ensemble(tmp_path):
+    from sklearn.ensemble import GradientBoostingRegressor
+    from app.model import FlatEnsemble
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4))
+    y = X[:, 0] + rng.normal(scale=0.5, size=300)
+    models = [GradientBoostingRegressor(n_estimators=n, max_depth=d, random_state=0).fit(X, y)
+              for n, d in ((30, 3), (10, 2))]
+    models += [GradientBoostingRegressor(loss="quantile", alpha=q, n_estimators=20,
+                                         random_state=0).fit(X, y) for q in (0.1, 0.9)]
+    stacked = FlatEnsemble.stack([FlatEnsemble.from_estimator(m) for m in models],
+                                 ["mean", "small", "p10", "p90"])
+    expected = np.column_stack([m.predict(X) for m in models])
+    np.testing.assert_allclose(stacked.predict(X), expected[:, 0], atol=1e-9)
+    np.testing.assert_allclose(stacked.predict_heads(X), expected, atol=1e-9)
+
+    stacked.save(tmp_path / "heads")
+    loaded = FlatEnsemble.load(tmp_path / "heads")
+    assert loaded.head_names == ["mean", "small", "p10", "p90"]
+    np.testing.assert_allclose(loaded.predict_heads(X), expected, atol=1e-9)
+    with pytest.raises(ValueError):
+        stacked.save(tmp_path / "heads.npz")
+
+#---- per-location registry ----
+def test_model_registry_lazy_lru_by_bytes():
+    from app.model import ModelRegistry
+    loads = []
+    def loader(location):
+        loads.append(location)
+        return f"model-{location}", 40
+    reg = ModelRegistry(max_bytes=100, loader=loader)
+
+    assert reg.get("a") == "model-a"
+    reg.get("b")
+    reg.get("a")                       # "b" is now least recently used
+    reg.get("c")                       # 120 bytes > 100: evict "b"
+    assert "b" not in reg and "a" in reg and "c" in reg
+    assert reg.nbytes == 80
+    reg.get("a")
+    assert loads == ["a", "b", "c"]
+
+def test_model_registry_publishes_before_dropping_the_load_lock():
+    from app.model import ModelRegistry
+    reg = ModelRegistry(loader=lambda location: (f"model-{location}", 1))
+    seen = []
+
+    class Loading(dict):
+        # a request arriving once the load lock is gone must find the model
+        def pop(self, location, *default):
+            seen.append(location in reg._models)
+            return super().pop(location, *default)
+
+    reg._loading = Loading()
+    reg.get("a")
+    assert seen == [True]
+
+#---- versioned artifacts and hot reload ----
+def publish_model(offset):
+    """Train a tiny pipeline predicting temperature + offset and publish it."""
+    import joblib
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.pipeline import Pipeline
+    from app.model import FlatEnsemble, new_version_dir, publish_version
+    df = pd.DataFrame(ROWS * 20)
+    pipe = Pipeline([("feat", FeatureBuilder()),
+                     ("model", GradientBoostingRegressor(n_estimators=5))])
+    pipe.fit(df, df["temperature"] + offset)
+    version, out = new_version_dir("hyderabad")
+    joblib.dump(pipe, out / "weather_pipeline.pkl")
+    FlatEnsemble.from_estimator(pipe.named_steps["model"]).save(out / "weather_trees")
+    publish_version("hyderabad", version, keep=1)
+    return version
+
+def test_published_version_is_hot_reloaded(tmp_path, monkeypatch):
+    import app.model as model_mod
+    from app.model import ModelRegistry, ModelWatcher, current_version
+    monkeypatch.setattr(model_mod, "MODEL_DIR", tmp_path)
+    reg = ModelRegistry()
+    watcher = ModelWatcher(reg)
+
+    first = publish_model(0)
+    old = reg.get("hyderabad")
+    assert reg.version("hyderabad") == first == current_version("hyderabad")
+    assert watcher.check() == []
+
+    second = publish_model(100)
+    assert (tmp_path / "weather_pipeline.pkl").exists()            # fixed-path copy
+    assert [p.name for p in (tmp_path / "versions").iterdir()] == [second]
+    assert reg.get("hyderabad") is old                 # still serving until swapped
+    assert watcher.check() == ["hyderabad"]
+    new = reg.get("hyderabad")
+    assert reg.version("hyderabad") == second
+    X = row_features(ROWS[0])[None, :]
+    assert new.predict(X)[0] - old.predict(X)[0] > 50
+
+#---- the pipeline path reads CURRENT once per poll interval, not per row ----
+def test_load_pipeline_rechecks_current_per_interval(monkeypatch):
+    import app.model as model_mod
+    reads = []
+    real = model_mod.current_version
+    monkeypatch.setattr(model_mod, "current_version", lambda loc: reads.append(loc) or real(loc))
+    monkeypatch.setattr(model_mod, "_pipeline", None)
+    monkeypatch.setattr(model_mod, "MODEL_POLL_SECONDS", 3600)
+    pipe = load_pipeline()
+    for row in ROWS:
+        predict_row(row)
+    assert len(reads) == 1 and load_pipeline() is pipe
+
+    monkeypatch.setattr(model_mod, "MODEL_POLL_SECONDS", 1e-9)    # interval over
+    assert load_pipeline() is pipe                     # same version: no reload
+    assert len(reads) == 2
+
+#---- prediction cache ----
+def test_prediction_cache_shared_and_invalidated_on_swap(tmp_path, monkeypatch):
+    import app.model as model_mod
+    from app.cache import SqliteCache
+    from app.model import ModelRegistry
+    monkeypatch.setattr(model_mod, "MODEL_DIR", tmp_path)
+    monkeypatch.setattr(model_mod, "registry", ModelRegistry())
+    monkeypatch.setattr(model_mod, "_shared_predictions", SqliteCache(tmp_path / "p.db"))
+    publish_model(0)
+
+    first = predict_row_fast(ROWS[0])
+    est = model_mod.registry.get("hyderabad")
+    assert len(est.prediction_cache) == 1 and len(model_mod._shared_predictions) == 1
+    assert predict_row_fast({**ROWS[0], "timestamp": "2025-07-03T00:30"}) == first
+
+    # another worker: nothing in memory yet, the shared entry is used
+    monkeypatch.setattr(model_mod, "registry", ModelRegistry())
+    other = model_mod.registry.get("hyderabad")
+    other.predict = None                               # would fail if called
+    assert predict_row_fast(ROWS[0]) == first
+
+    # a new version gets its own (empty) cache and a new shared key
+    monkeypatch.setattr(model_mod, "registry", ModelRegistry())
+    predict_row_fast(ROWS[0])
+    publish_model(100)
+    model_mod.registry.reload("hyderabad")
+    assert predict_row_fast(ROWS[0]) - first > 50
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.storage import CsvStore, NpyStore, get_store
+
+def frame(start, periods, tz=None):
+    ts = pd.date_range(start, periods=periods, freq="h", tz=tz)
+    return pd.DataFrame({
+        "timestamp":   ts,
+        "temperature": np.linspace(20, 30, periods),
+        "humidity":    np.arange(periods, dtype=np.int64),
+        "city":        ["hyderabad"] * periods,
+    })
+
+@pytest.mark.parametrize("store_cls", [CsvStore, NpyStore])
+def test_round_trip_append_and_projection(tmp_path, store_cls):
+    store = store_cls(tmp_path)
+    assert not store.exists("t")
+    store.write("t", frame("2025-01-01", 5))
+    store.append("t", frame("2025-01-01 05:00", 3))
+    assert store.exists("t")
+
+    df = store.read("t")
+    expected = pd.concat([frame("2025-01-01", 5), frame("2025-01-01 05:00", 3)],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert df["timestamp"].dtype.kind == "M"
+
+    proj = store.read("t", columns=["timestamp", "temperature"])
+    assert list(proj.columns) == ["timestamp", "temperature"]
+
+def test_npy_keeps_timezone_and_types(tmp_path):
+    store = NpyStore(tmp_path)
+    df = frame("2025-01-01", 4, tz="UTC")
+    store.write("live", df)
+    back = store.read("live")
+    pd.testing.assert_frame_equal(back, df, check_dtype=False)
+    assert str(back["timestamp"].dt.tz) == "UTC"
+    assert back["humidity"].dtype == np.int64
+    # only the projected column files are opened
+    assert list(store.read("live", columns=["humidity"]).columns) == ["humidity"]
+
+def test_npy_rewrite_replaces_parts(tmp_path):
+    store = NpyStore(tmp_path)
+    store.write("t", frame("2025-01-01", 5))
+    store.append("t", frame("2025-01-02", 5))
+    store.write("t", frame("2025-02-01", 2))
+    assert len(store.read("t")) == 2
+    with pytest.raises(ValueError):
+        store.append("t", frame("2025-02-02", 1)[["timestamp"]])
+
+def test_npy_append_mixed_dtypes(tmp_path):
+    store = NpyStore(tmp_path)
+    store.write("t", frame("2025-01-01", 2))
+    more = frame("2025-01-01 02:00", 2)
+    more["humidity"] = [72.0, 73.0]                      # whole numbers: kept exactly
+    more["temperature"] = np.array([21, 22], dtype=np.int32)
+    store.append("t", more)
+    back = store.read("t")
+    assert back["humidity"].tolist() == [0, 1, 72, 73] and back["humidity"].dtype == np.int64
+    assert back["temperature"].tolist()[2:] == [21.0, 22.0]
+
+    for bad in ([72.6, 73.0], [72.0, np.nan]):
+        rows = frame("2025-01-02", 2)
+        rows["humidity"] = bad
+        with pytest.raises(ValueError, match="humidity"):
+            store.append("t", rows)
+    assert len(store.read("t")) == 4                     # nothing half-written
+
+@pytest.mark.parametrize("store_cls", [CsvStore, NpyStore])
+def test_append_checks_columns(tmp_path, store_cls):
+    store = store_cls(tmp_path)
+    store.write("t", frame("2025-01-01", 2))
+    reordered = frame("2025-01-01 02:00", 2)[["timestamp", "humidity", "temperature", "city"]]
+    with pytest.raises(ValueError):
+        store.append("t", reordered)
+    store.append("t", reordered[list(frame("2025-01-01", 1).columns)])
+    assert store.read("t")["humidity"].tolist() == [0, 1, 0, 1]
+
+def test_get_store_backends(tmp_path):
+    assert isinstance(get_store(tmp_path, "csv"), CsvStore)
+    assert isinstance(get_store(tmp_path, "npy"), NpyStore)
+    with pytest.raises(ValueError):
+        get_store(tmp_path, "parquet")
+
+#---- live log ----
+def test_live_log_deduplicates_within_partition(tmp_path):
+    from app.storage import LiveLog
+    log = LiveLog(tmp_path / "live")
+    assert log.append(frame("2025-01-01 22:00", 3, tz="UTC")) == 3   # spans two days
+    assert log.append(frame("2025-01-02 00:00", 2, tz="UTC")) == 1
+    assert [p.stem for p in log.partitions()] == ["2025-01-01", "2025-01-02"]
+
+    df = log.read()
+    assert df["timestamp"].is_unique and len(df) == 4
+    assert len(log.read(since="2025-01-02")) == 2
+
+def test_live_log_concurrent_writers(tmp_path):
+    import threading
+    from app.storage import LiveLog
+    log = LiveLog(tmp_path / "live")
+    rows = frame("2025-01-01", 24, tz="UTC")
+    # every writer tries to log the same day; each hour must land once
+    threads = [threading.Thread(target=log.append, args=(rows.iloc[i::3],))
+               for i in range(3) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    df = log.read()
+    assert len(df) == 24 and df["timestamp"].is_unique
+
+def test_live_log_update_revises_forecast_hours(tmp_path):
+    from app.storage import LiveLog
+    log = LiveLog(tmp_path / "live")
+    first = frame("2025-01-01", 24, tz="UTC")
+    assert log.append(first, update=True) == 24
+    assert log.append(first, update=True) == 0          # nothing changed
+
+    revised = first.iloc[10:].copy()
+    revised.loc[revised.index[:2], "temperature"] = 99.0
+    assert log.append(revised, update=True) == 2
+    df = log.read()
+    assert len(df) == 24 and (df["temperature"] == 99.0).sum() == 2
+
+@pytest.mark.parametrize("store_cls", [CsvStore, NpyStore])
+def test_iter_chunks(tmp_path, store_cls):
+    store = store_cls(tmp_path)
+    store.write("t", frame("2025-01-01", 10))
+    store.append("t", frame("2025-01-01 10:00", 5))
+    chunks = list(store.iter_chunks("t", 4, columns=["timestamp", "temperature"]))
+    assert all(len(c) <= 4 for c in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  store.read("t", columns=["timestamp", "temperature"]))
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from app.training import (backtest_windows, check_max_mae, holdout_split,
+                          retrain_accepted, rows_since)
+
+def history(periods=100):
+    return pd.DataFrame({"timestamp": pd.date_range("2025-01-01", periods=periods, freq="h"),
+                         "temperature": range(periods)})
+
+#---- warm-started retrain ----
+def test_only_rows_after_data_until_are_used():
+    df = history()
+    new = rows_since(df, "2025-01-03 00:00:00")
+    assert new["timestamp"].min() == pd.Timestamp("2025-01-03 01:00")   # strictly after
+    assert len(new) == 100 - 49
+    assert rows_since(df, df["timestamp"].iloc[-1]).empty
+
+def test_newest_fifth_is_held_out():
+    fit, hold = holdout_split(history(50))
+    assert len(fit) == 40 and len(hold) == 10
+    assert fit["timestamp"].max() < hold["timestamp"].min()
+
+def test_gate_rejects_a_worse_model_and_accepts_within_tolerance():
+    assert retrain_accepted(0.50, 0.49)
+    assert retrain_accepted(0.50, 0.50)
+    assert not retrain_accepted(0.50, 0.51)
+    assert retrain_accepted(0.50, 0.51, tolerance=0.05)
+    assert not retrain_accepted(0.50, 0.53, tolerance=0.05)
+
+#---- backtest windows ----
+@pytest.mark.parametrize("expanding", [False, True])
+def test_backtest_windows_never_train_on_their_test_rows(expanding):
+    ts = history(24 * 120)["timestamp"].to_numpy()
+    windows = backtest_windows(ts, train_days=30, test_days=7, step_days=10, expanding=expanding)
+    assert len(windows) == 9                       # origins at day 30, 40, ... 110
+    for lo, mid, hi in windows:
+        assert lo < mid < hi
+        assert ts[mid - 1] < ts[mid]               # all train rows strictly before the origin
+        assert ts[hi - 1] - ts[mid] < pd.Timedelta(days=7)
+        if expanding:
+            assert lo == 0
+        else:
+            assert ts[mid] - ts[lo] == pd.Timedelta(days=30)
+    origins = [ts[mid] for _, mid, _ in windows]
+    assert all(b - a == pd.Timedelta(days=10) for a, b in zip(origins, origins[1:]))
+
+def test_backtest_windows_need_a_full_training_span():
+    ts = history(24 * 20)["timestamp"].to_numpy()
+    assert backtest_windows(ts, train_days=30, test_days=7, step_days=10) == []
+
+def test_max_mae_gate_sets_the_exit_code():
+    import subprocess, sys
+    from pathlib import Path
+    check_max_mae(0.5, 0.6)
+    check_max_mae(0.6, 0.6)
+    with pytest.raises(SystemExit):
+        check_max_mae(0.61, 0.6)
+    run = subprocess.run([sys.executable, "-c",
+                          "from app.training import check_max_mae; check_max_mae(0.61, 0.6)"],
+                         text=True, capture_output=True, cwd=Path(__file__).resolve().parents[1])
+    assert run.returncode == 1
+    assert "performance unacceptable" in run.stderr
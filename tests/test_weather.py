@@ -0,0 +1,144 @@
+import asyncio
+import httpx
+import pytest
+
+from app.cache import TTLCache
+from app.weather import WeatherClient
+
+HOURLY = {
+    "time":                 ["2025-07-03T00:00", "2025-07-03T01:00"],
+    "temperature_2m":       [28, 27.5],
+    "relative_humidity_2m": [70, 72],
+    "pressure_msl":         [1010, 1010.4],
+    "wind_speed_10m":       [12, 11],
+}
+
+def counting_client():
+    calls = []
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)          # keep the fetch in flight
+        return httpx.Response(200, json={"hourly": HOURLY})
+    return WeatherClient(transport=httpx.MockTransport(handler)), calls
+
+#---- concurrent misses share one upstream call ----
+def test_concurrent_requests_are_coalesced():
+    weather, calls = counting_client()
+
+    async def burst():
+        results = await asyncio.gather(*(weather.hourly(17.385, 78.4867)
+                                          for _ in range(20)))
+        await weather.aclose()
+        return results
+
+    results = asyncio.run(burst())
+    assert len(calls) == 1
+    assert all(r == HOURLY for r in results)
+
+#---- later requests in the same hour are served from cache ----
+def test_responses_are_cached_per_location():
+    weather, calls = counting_client()
+
+    async def run():
+        await weather.hourly(17.385, 78.4867)
+        await weather.hourly(17.385, 78.4867)
+        await weather.hourly(28.6139, 77.209)
+        await weather.aclose()
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert calls[0].url.params["latitude"] == "17.385"
+
+def test_upstream_errors_are_not_cached():
+    weather = WeatherClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(500)))
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(weather.hourly(17.385, 78.4867))
+    assert weather.upstream_calls == 2
+
+#---- a client is closed with its event loop, or when replaced on another ----
+def test_client_of_an_old_event_loop_is_closed():
+    import threading
+    weather, calls = counting_client()
+    asyncio.run(weather.hourly(17.385, 78.4867))
+    first = weather._client
+    assert first.is_closed                 # asyncio.run shut its loop down
+
+    other = asyncio.new_event_loop()       # a loop that keeps running elsewhere
+    thread = threading.Thread(target=other.run_forever)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(weather.hourly(28.6139, 77.209), other).result(5)
+        second = weather._client
+        assert second is not first and not second.is_closed
+
+        async def run():
+            await weather.hourly(13.0827, 80.2707)
+            await asyncio.sleep(0.05)      # the old loop closes `second` meanwhile
+            assert second.is_closed
+            await weather.aclose()
+        asyncio.run(run())
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join()
+        other.close()
+    assert len(calls) == 3
+
+#---- TTLCache ----
+def test_ttl_cache_expiry_and_lru():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)                      # evicts least recently used "b"
+    assert cache.get("b") is None and cache.get("a") == 1
+    now[0] = 11
+    assert cache.get("a") is None
+
+def test_sqlite_cache_is_shared_and_expires(tmp_path):
+    from app.cache import SqliteCache
+    now = [0.0]
+    one = SqliteCache(tmp_path / "cache.db", ttl=10, timer=lambda: now[0])
+    two = SqliteCache(tmp_path / "cache.db", ttl=10, timer=lambda: now[0])
+    one.set("a", 1.25)
+    assert two.get("a") == 1.25 and len(two) == 1      # e.g. another worker
+    now[0] = 11
+    assert two.get("a") is None and len(one) == 0
+
+def test_unusable_sqlite_cache_is_a_miss(tmp_path):
+    import os, subprocess, sys
+    from pathlib import Path
+    from app.cache import SqliteCache
+    (tmp_path / "file").write_text("")
+    bad = tmp_path / "file" / "cache.db"                # its directory cannot be made
+    cache = SqliteCache(bad)
+    cache.set("a", 1.25)
+    assert cache.get("a") is None and cache.get("a", 0) == 0
+
+    # the API still imports with the shared prediction cache pointed there
+    run = subprocess.run([sys.executable, "-c", "import app.main"], capture_output=True,
+                         text=True, cwd=Path(__file__).resolve().parents[1],
+                         env={**os.environ, "WEATHER_PREDICTION_CACHE_DB": str(bad)})
+    assert run.returncode == 0, run.stderr
+
+#---- any hour of the cached forecast ----
+def test_observation_serves_every_hour_from_one_fetch():
+    from datetime import datetime
+    from app.weather import ForecastWindowError
+    weather, calls = counting_client()
+
+    async def run():
+        first = await weather.observation(17.385, 78.4867)
+        second = await weather.observation(17.385, 78.4867,
+                                           datetime(2025, 7, 3, 1, 30))
+        with pytest.raises(ForecastWindowError):
+            await weather.observation(17.385, 78.4867, datetime(2025, 7, 4, 0))
+        await weather.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert len(calls) == 1
+    assert first["timestamp"] == datetime(2025, 7, 3, 0)
+    assert second["temperature"] == 27.5